@@ -0,0 +1,299 @@
+# api/alerts.py
+"""
+Alert rules evaluated on every bar close across the whole symbol universe.
+
+On each close the loaded strategy modules run once per symbol. Their signals become a
+(symbols x strategies) int8 matrix, and the last two rows of every indicator column
+become (previous, current) value vectors. Rules are compiled into batches that evaluate
+all rules of one kind against all symbols with a few array operations:
+
+    {"id": "buy-consensus", "when": "consensus", "signal": "BUY", "min": 3}
+    {"id": "rsi-oversold", "when": "cross_below", "value": "RSI_14", "level": 30, "symbols": [...]}
+    {"id": "sma-long", "when": "signal", "strategy": "sma_crossover_strategy", "signal": "BUY"}
+    {"id": "rsi-hot", "when": "above", "value": "RSI_14", "level": 80}
+
+Alerts that fire go to the notifiers (JSON-lines file, webhook) in batches.
+"""
+import os
+import json
+import hashlib
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from api.backtest import SIGNALS, _SIGNAL_CODES
+from api.exchanges import timeframe_to_ms
+from api.params import canonical_json
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+LEVEL_RULES = ("above", "below", "cross_above", "cross_below")
+RULE_KINDS = ("consensus", "signal") + LEVEL_RULES
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "500"))
+# Seconds after the bar boundary before the closed bar is evaluated (exchanges lag a little)
+ALERT_CLOSE_DELAY_S = float(os.getenv("ALERT_CLOSE_DELAY_S", "3"))
+OHLCV = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+class SignalMatrix:
+    """Signals and indicator values of every (symbol, strategy) at one bar close."""
+
+    def __init__(self, symbols: Sequence[str], strategies: Sequence[str], signals: np.ndarray,
+                 values: Dict[str, np.ndarray], timeframe: str, bar_ts: Optional[int] = None):
+        self.symbols, self.strategies = list(symbols), list(strategies)
+        self.signals = signals  # int8 (symbols x strategies), codes as in api.backtest.SIGNALS
+        self.values = values    # column -> float64 (2 x symbols): previous and current bar, NaN if missing
+        self.timeframe, self.bar_ts = timeframe, bar_ts
+
+
+def build_signal_matrix(modules: Dict[str, Any], frames: Dict[str, pd.DataFrame], params: Dict[str, Dict[str, Any]],
+                        timeframe: str, bar_ts: Optional[int] = None) -> SignalMatrix:
+    """Runs every module on every symbol's frame (flat position) and collects signals and indicator values."""
+    symbols, strategies = list(frames), list(modules)
+    signals = np.zeros((len(symbols), len(strategies)), dtype=np.int8)
+    values: Dict[str, np.ndarray] = {}
+    for s, symbol in enumerate(symbols):
+        frame = frames[symbol]
+        if frame is None or len(frame) < 2: continue
+        for k, name in enumerate(strategies):
+            module = modules[name]
+            try:
+                df = module.calculate_strategy_indicators(frame.copy(), params.get(name, {}))
+                signal = module.run_strategy(df, params.get(name, {}), current_position_type=None).get("signal", "HOLD")
+            except Exception as e:
+                print(f"!!! Alert evaluation of {name} on {symbol} failed: {e}")
+                continue
+            signals[s, k] = _SIGNAL_CODES.get(signal, 0)
+            for col in df.columns:
+                if col in OHLCV or (col in values and not np.isnan(values[col][1, s])): continue
+                tail = pd.to_numeric(df[col].iloc[-2:], errors='coerce').to_numpy(np.float64)
+                if len(tail) < 2: continue
+                values.setdefault(col, np.full((2, len(symbols)), np.nan))[:, s] = tail
+    return SignalMatrix(symbols, strategies, signals, values, timeframe, bar_ts)
+
+
+# --- Rule compilation ---
+def _validate(rule: Dict[str, Any]) -> Dict[str, Any]:
+    rule = dict(rule)
+    if "id" not in rule:  # content-derived, so an unnamed rule keeps its id across restarts
+        rule["id"] = "rule-" + hashlib.sha1(canonical_json(rule).encode("utf-8")).hexdigest()[:12]
+    when = rule.get("when")
+    if when not in RULE_KINDS: raise ValueError(f"Alert rule {rule['id']}: 'when' must be one of {RULE_KINDS}")
+    if when in ("consensus", "signal") and str(rule.get("signal", "")).upper() not in _SIGNAL_CODES:
+        raise ValueError(f"Alert rule {rule['id']}: 'signal' must be one of {SIGNALS}")
+    if when == "signal" and not rule.get("strategy"):
+        raise ValueError(f"Alert rule {rule['id']}: 'signal' rules need a 'strategy'")
+    if when in LEVEL_RULES and (not rule.get("value") or rule.get("level") is None):
+        raise ValueError(f"Alert rule {rule['id']}: '{when}' rules need 'value' and 'level'")
+    return rule
+
+
+class _Batch:
+    """Rules of one kind; evaluate() returns (fired rules x symbols bool, per-cell detail value)."""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = rules
+        self._symbol_masks: Dict[Tuple[str, ...], np.ndarray] = {}
+
+    def symbol_mask(self, symbols: List[str]) -> np.ndarray:
+        key = tuple(symbols)
+        mask = self._symbol_masks.get(key)
+        if mask is None:
+            mask = np.ones((len(self.rules), len(symbols)), dtype=bool)
+            for r, rule in enumerate(self.rules):
+                if rule.get("symbols"): mask[r] = np.isin(symbols, rule["symbols"])
+            self._symbol_masks = {key: mask}  # the universe rarely changes; keep only the latest
+        return mask
+
+
+class _ConsensusBatch(_Batch):
+    """'At least `min` of `strategies` (default: all) say `signal`', as a (rules x strategies) @ (strategies x symbols) count."""
+
+    def __init__(self, rules):
+        super().__init__(rules)
+        self.codes = np.array([_SIGNAL_CODES[str(r["signal"]).upper()] for r in rules], dtype=np.int8)
+        self.minimum = np.array([int(r.get("min", 1)) for r in rules], dtype=np.int32)
+        self._strategy_masks: Dict[Tuple[str, ...], np.ndarray] = {}
+
+    def strategy_mask(self, strategies: List[str]) -> np.ndarray:
+        key = tuple(strategies)
+        mask = self._strategy_masks.get(key)
+        if mask is None:
+            mask = np.ones((len(self.rules), len(strategies)), dtype=np.float32)
+            for r, rule in enumerate(self.rules):
+                wanted = rule.get("strategies") or ([rule["strategy"]] if rule.get("strategy") else None)
+                if wanted: mask[r] = np.isin(strategies, wanted)
+            self._strategy_masks = {key: mask}
+        return mask
+
+    def evaluate(self, m: SignalMatrix):
+        strat_mask = self.strategy_mask(m.strategies)
+        counts = np.zeros((len(self.rules), len(m.symbols)), dtype=np.int32)
+        for code in np.unique(self.codes):
+            rows = np.flatnonzero(self.codes == code)
+            hits = (m.signals == code).astype(np.float32)  # symbols x strategies
+            counts[rows] = (strat_mask[rows] @ hits.T).astype(np.int32)
+        fired = (counts >= self.minimum[:, None]) & self.symbol_mask(m.symbols)
+        return fired, counts
+
+
+class _LevelBatch(_Batch):
+    """Threshold and level-cross rules on one indicator column."""
+
+    def __init__(self, column: str, rules):
+        super().__init__(rules)
+        self.column = column
+        self.levels = np.array([float(r["level"]) for r in rules])[:, None]
+        self.kinds = np.array([LEVEL_RULES.index(r["when"]) for r in rules])[:, None]
+
+    def evaluate(self, m: SignalMatrix):
+        vals = m.values.get(self.column)
+        if vals is None:
+            return np.zeros((len(self.rules), len(m.symbols)), dtype=bool), None
+        prev, cur = vals[0][None, :], vals[1][None, :]
+        lv, kind = self.levels, self.kinds
+        above, below = cur > lv, cur < lv
+        fired = np.select([kind == 0, kind == 1, kind == 2, kind == 3],
+                          [above, below, above & (prev <= lv), below & (prev >= lv)], default=False)
+        return fired & self.symbol_mask(m.symbols), np.broadcast_to(cur, fired.shape)
+
+
+class RuleSet:
+    """Compiled alert rules: one consensus batch plus one level batch per indicator column."""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = [_validate(r) for r in rules]
+        consensus = [r for r in self.rules if r["when"] in ("consensus", "signal")]
+        by_column: Dict[str, List[Dict[str, Any]]] = {}
+        for r in self.rules:
+            if r["when"] in LEVEL_RULES: by_column.setdefault(r["value"], []).append(r)
+        self.batches: List[_Batch] = ([_ConsensusBatch(consensus)] if consensus else []) + \
+                                     [_LevelBatch(col, rs) for col, rs in by_column.items()]
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleSet":
+        data = json.loads(Path(path).read_text())
+        return cls(data["rules"] if isinstance(data, dict) else data)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate(self, m: SignalMatrix) -> List[Dict[str, Any]]:
+        alerts = []
+        for batch in self.batches:
+            fired, detail = batch.evaluate(m)
+            for r, s in zip(*np.nonzero(fired)):
+                rule = batch.rules[r]
+                alert = {"rule": rule["id"], "when": rule["when"], "symbol": m.symbols[s],
+                         "timeframe": m.timeframe, "bar_ts": m.bar_ts}
+                if isinstance(batch, _ConsensusBatch):
+                    alert.update(signal=str(rule["signal"]).upper(), strategies=int(detail[r, s]))
+                else:
+                    alert.update(value=batch.column, level=float(rule["level"]), current=round(float(detail[r, s]), 6))
+                alerts.append(alert)
+        return alerts
+
+
+# --- Notifiers ---
+class Notifier:
+    async def send(self, alerts: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class FileNotifier(Notifier):
+    """Appends alerts as JSON lines."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    async def send(self, alerts):
+        text = "".join(json.dumps(a) + "\n" for a in alerts)
+        await asyncio.to_thread(self._append, text)
+
+    def _append(self, text: str):
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(text)
+
+
+class WebhookNotifier(Notifier):
+    """POSTs {"alerts": [...]} to `url`, one request per batch."""
+
+    def __init__(self, url: str, timeout_s: float = 10.0):
+        if not HTTPX_AVAILABLE: raise RuntimeError("httpx is required for webhook alerts")
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout_s)
+
+    async def send(self, alerts):
+        resp = await self._client.post(self.url, json={"alerts": alerts})
+        resp.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class AlertEngine:
+    """Evaluates a RuleSet on each bar close and fans the alerts out to the notifiers in batches."""
+
+    def __init__(self, rules: RuleSet, notifiers: List[Notifier], batch_size: int = ALERT_BATCH_SIZE):
+        self.rules, self.notifiers, self.batch_size = rules, notifiers, batch_size
+        self._last_bar: Dict[str, int] = {}
+        self.stats = {"evaluations": 0, "alerts": 0, "last_eval_ms": None, "last_bar_ts": None, "notify_errors": 0}
+
+    async def on_bar_close(self, m: SignalMatrix) -> List[Dict[str, Any]]:
+        if m.bar_ts is not None and self._last_bar.get(m.timeframe) == m.bar_ts:
+            return []  # this close was already evaluated
+        t0 = time.perf_counter()
+        alerts = self.rules.evaluate(m)
+        self.stats.update(evaluations=self.stats["evaluations"] + 1, alerts=self.stats["alerts"] + len(alerts),
+                          last_eval_ms=round((time.perf_counter() - t0) * 1000, 3), last_bar_ts=m.bar_ts)
+        if m.bar_ts is not None: self._last_bar[m.timeframe] = m.bar_ts
+        for i in range(0, len(alerts), self.batch_size):
+            batch = alerts[i:i + self.batch_size]
+            for notifier, res in zip(self.notifiers, await asyncio.gather(
+                    *(n.send(batch) for n in self.notifiers), return_exceptions=True)):
+                if isinstance(res, Exception):
+                    self.stats["notify_errors"] += 1
+                    print(f"!!! Alert notifier {type(notifier).__name__} failed: {res}")
+        return alerts
+
+    async def close(self):
+        for n in self.notifiers: await n.close()
+
+
+async def alert_loop(engine: AlertEngine, modules: Dict[str, Any], params: Dict[str, Dict[str, Any]],
+                     exchange_id: str, symbols: List[str], timeframe: str, fetch_bars: int):
+    """Waits for each bar boundary, fetches the universe, drops the newly opened bar and evaluates the closed one."""
+    from api.market_data import fetch_ohlcv_df
+    tf_ms = timeframe_to_ms(timeframe)
+    while True:
+        boundary = (int(time.time() * 1000) // tf_ms + 1) * tf_ms
+        await asyncio.sleep(max(0.0, boundary / 1000 - time.time()) + ALERT_CLOSE_DELAY_S)
+        try:
+            dfs = await asyncio.gather(*(fetch_ohlcv_df(exchange_id, s, timeframe, fetch_bars + 1) for s in symbols),
+                                       return_exceptions=True)
+            frames = {}
+            for symbol, df in zip(symbols, dfs):
+                if isinstance(df, Exception):
+                    print(f"!!! Alert fetch for {symbol} failed: {df}"); continue
+                frames[symbol] = df[df['timestamp'] < boundary]
+            bar_ts = max((int(f['timestamp'].iloc[-1]) for f in frames.values() if len(f)), default=None)
+            matrix = await asyncio.to_thread(build_signal_matrix, modules, frames, params, timeframe, bar_ts)
+            alerts = await engine.on_bar_close(matrix)
+            print(f"--- Alerts {timeframe} bar {bar_ts}: {len(symbols)} symbols x {len(modules)} strategies, "
+                  f"{len(engine.rules)} rules, {len(alerts)} fired in {engine.stats['last_eval_ms']}ms")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"!!! Alert evaluation for {timeframe} failed: {e}")
@@ -0,0 +1,210 @@
+# api/backfill.py
+"""
+Historical backfill into the local candle store.
+
+The requested range is first reduced to what the store is missing, then split into
+page-sized chunks that are fetched concurrently under a shared per-exchange request
+budget. Failed calls are retried with full-jitter exponential backoff, overlapping
+candles dedupe through the store's upsert, and each series is re-checked for gaps
+once its chunks are in.
+
+    python -m api.backfill okx 1h 2023-01-01 BTC-USDT-SWAP ETH-USDT-SWAP --concurrency 8
+"""
+import sys
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple
+
+from api.exchanges import get_backend, close_backends, timeframe_to_ms, NetworkError, RateLimitExceeded
+from api.candle_store import CandleStore, DEFAULT_CANDLE_DB
+
+BACKFILL_CONCURRENCY = 8
+BACKFILL_MAX_RETRIES = 6
+BACKOFF_BASE_S = 0.5
+BACKOFF_CAP_S = 30.0
+# Fraction of the exchange's advertised rate limit the backfill may use (leaves room for live traffic)
+RATE_BUDGET_SHARE = 0.8
+DEFAULT_RATE_PER_S = 5.0
+
+
+class RateBudget:
+    """Async token bucket shared by every chunk fetching from one exchange."""
+
+    def __init__(self, rate_per_s: float, burst: Optional[float] = None):
+        self.rate = max(0.01, rate_per_s)
+        self.capacity = burst or max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """Drains the bucket after a 429 so every chunk backs off, not just the one that hit it."""
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class BackfillProgress:
+    __slots__ = ("chunks_total", "chunks_done", "chunks_failed", "candles_written", "requests",
+                 "retries", "started", "gaps")
+
+    def __init__(self):
+        self.chunks_total = self.chunks_done = self.chunks_failed = 0
+        self.candles_written = self.requests = self.retries = 0
+        self.started = time.perf_counter()
+        self.gaps: Dict[str, List[Tuple[int, int]]] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        done = self.chunks_done + self.chunks_failed
+        rate = done / elapsed if elapsed > 0 else 0.0
+        return {"chunks_total": self.chunks_total, "chunks_done": self.chunks_done, "chunks_failed": self.chunks_failed,
+                "candles_written": self.candles_written, "requests": self.requests, "retries": self.retries,
+                "elapsed_s": round(elapsed, 2),
+                "candles_per_s": round(self.candles_written / elapsed, 1) if elapsed > 0 else None,
+                "requests_per_s": round(self.requests / elapsed, 2) if elapsed > 0 else None,
+                "eta_s": round((self.chunks_total - done) / rate, 1) if rate > 0 and done < self.chunks_total else 0.0,
+                "gaps": {k: len(v) for k, v in self.gaps.items()}}
+
+
+class Backfiller:
+    """Fills (exchange, symbol, timeframe) series in the candle store for a time range."""
+
+    def __init__(self, store: CandleStore, exchange_id: str, concurrency: int = BACKFILL_CONCURRENCY,
+                 rate_per_s: Optional[float] = None, max_retries: int = BACKFILL_MAX_RETRIES,
+                 progress_every_s: float = 5.0):
+        self.store = store
+        self.exchange_id = exchange_id.lower()
+        self.backend = get_backend(self.exchange_id)
+        if rate_per_s is None:
+            rate_per_s = (self.backend.rate_limit_per_s or DEFAULT_RATE_PER_S) * RATE_BUDGET_SHARE
+        self.budget = RateBudget(rate_per_s)
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.max_retries = max_retries
+        self.progress_every_s = progress_every_s
+        self.progress = BackfillProgress()
+        self._last_report = 0.0
+
+    def plan(self, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+        """Page-sized [from, to) chunks covering what the store is missing in [start, end)."""
+        tf_ms = timeframe_to_ms(timeframe)
+        span = self.backend.page_limit * tf_ms
+        chunks = []
+        for lo, hi in self.store.missing_ranges(self.exchange_id, symbol, timeframe, start_ms, end_ms, tf_ms):
+            chunks.extend((t, min(t + span, hi)) for t in range(lo, hi, span))
+        return chunks
+
+    async def _fetch_page(self, symbol: str, timeframe: str, since: int, limit: int) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            await self.budget.acquire()
+            self.progress.requests += 1
+            try:
+                return await self.backend.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+            except (NetworkError, RateLimitExceeded) as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.progress.retries += 1
+                delay = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))  # full jitter
+                if isinstance(e, RateLimitExceeded):
+                    self.budget.penalize(delay)
+                await asyncio.sleep(delay)
+        return []
+
+    async def _fetch_chunk(self, symbol: str, timeframe: str, lo: int, hi: int):
+        tf_ms = timeframe_to_ms(timeframe)
+        async with self.semaphore:
+            try:
+                cursor = lo
+                while cursor < hi:
+                    page = await self._fetch_page(symbol, timeframe, cursor, min(self.backend.page_limit, (hi - cursor) // tf_ms or 1))
+                    rows = [r for r in page or [] if lo <= int(r[0]) < hi]
+                    self.progress.candles_written += self.store.write(self.exchange_id, symbol, timeframe, rows)
+                    if not page: break
+                    next_cursor = int(page[-1][0]) + tf_ms
+                    if next_cursor <= cursor: break
+                    cursor = next_cursor
+                self.progress.chunks_done += 1
+            except Exception as e:
+                self.progress.chunks_failed += 1
+                print(f"!!! Backfill chunk {self.exchange_id} {symbol} {timeframe} [{lo}, {hi}) failed: {e}")
+        self._maybe_report()
+
+    def _maybe_report(self):
+        now = time.perf_counter()
+        if self.progress_every_s and now - self._last_report >= self.progress_every_s:
+            self._last_report = now
+            p = self.progress.as_dict()
+            print(f"--- Backfill {self.exchange_id}: {p['chunks_done'] + p['chunks_failed']}/{p['chunks_total']} chunks, "
+                  f"{p['candles_written']} candles, {p['candles_per_s']} candles/s, eta {p['eta_s']}s")
+
+    def verify(self, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+        """Gaps left inside the stored span of the series (bars before the first stored candle are pre-listing)."""
+        first, _, count = self.store.coverage(self.exchange_id, symbol, timeframe)
+        if not count: return []
+        tf_ms = timeframe_to_ms(timeframe)
+        return self.store.missing_ranges(self.exchange_id, symbol, timeframe, max(start_ms, first), end_ms, tf_ms)
+
+    async def run(self, series: List[Tuple[str, str]], start_ms: int, end_ms: Optional[int] = None) -> Dict[str, Any]:
+        """Backfills every (symbol, timeframe) of `series` over [start_ms, end_ms) and returns the progress report."""
+        tasks = []
+        for symbol, timeframe in series:
+            tf_ms = timeframe_to_ms(timeframe)
+            stop = end_ms if end_ms is not None else self.backend.milliseconds()
+            stop -= stop % tf_ms  # the still-open bar is left to the live fetch path
+            for lo, hi in self.plan(symbol, timeframe, start_ms, stop):
+                tasks.append(self._fetch_chunk(symbol, timeframe, lo, hi))
+        self.progress.chunks_total += len(tasks)
+        await asyncio.gather(*tasks)
+        for symbol, timeframe in series:
+            tf_ms = timeframe_to_ms(timeframe)
+            stop = end_ms if end_ms is not None else self.backend.milliseconds()
+            gaps = self.verify(symbol, timeframe, start_ms, stop - stop % tf_ms)
+            if gaps:
+                self.progress.gaps[f"{symbol} {timeframe}"] = gaps
+                print(f"!!! Backfill: {symbol} {timeframe} has {len(gaps)} gap(s) the exchange did not fill, first {gaps[0]}")
+        return self.progress.as_dict()
+
+
+def _parse_ts(value: str) -> int:
+    if value.isdigit(): return int(value)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+async def _main(args) -> Dict[str, Any]:
+    store = CandleStore(args.db)
+    try:
+        backfiller = Backfiller(store, args.exchange, concurrency=args.concurrency, rate_per_s=args.rate)
+        series = [(s, tf) for s in args.symbols for tf in args.timeframe.split(",")]
+        return await backfiller.run(series, _parse_ts(args.start), _parse_ts(args.end) if args.end else None)
+    finally:
+        await close_backends()
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill OHLCV history into the local candle store.")
+    parser.add_argument("exchange")
+    parser.add_argument("timeframe", help="One or more timeframes, comma-separated (e.g. 1h,4h).")
+    parser.add_argument("start", help="ISO date/datetime (UTC) or epoch ms.")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--end", help="ISO date/datetime (UTC) or epoch ms; default now.")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY)
+    parser.add_argument("--rate", type=float, help="Requests/second budget (default: share of the exchange's limit).")
+    parser.add_argument("--db", default=DEFAULT_CANDLE_DB)
+    report = asyncio.run(_main(parser.parse_args()))
+    print(f"--- Backfill finished: {report}")
+    sys.exit(1 if report["chunks_failed"] else 0)
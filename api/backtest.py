@@ -0,0 +1,203 @@
+# api/backtest.py
+"""
+Bar-by-bar backtests of strategy plugins.
+
+Indicators are computed once over the whole series (they are causal, so bar i only sees
+bars <= i), then run_strategy() is called on the trailing SIGNAL_BARS rows of every bar for
+each possible position (flat / LONG / SHORT). Plugins with a vectorized
+get_signal_table(df, params) skip that loop (crossover_table() covers the common shapes).
+The resulting signal table depends only on
+the module and its params, so any number of windows can be simulated from it without
+touching pandas again.
+
+Fills happen at the next bar's open; fees are charged per unit of position change.
+"""
+import math
+from typing import Dict, Any, Optional, Tuple, List
+
+import numpy as np
+import pandas as pd
+
+from api.positions import TRANSITIONS
+from api.exchanges import timeframe_to_ms
+
+SIGNAL_BARS = 2  # run_strategy reads iloc[-1] and iloc[-2]
+POSITION_STATES = (None, "LONG", "SHORT")
+SIGNALS = ("HOLD", "BUY", "SELL", "CLOSE_LONG", "CLOSE_SHORT")
+_SIGNAL_CODES = {s: i for i, s in enumerate(SIGNALS)}
+_POSITION_VALUE = {None: 0, "LONG": 1, "SHORT": -1}
+# (state index, signal code) -> next state index, from the live position book's rules
+_NEXT_STATE = np.array([[POSITION_STATES.index(TRANSITIONS.get((pos, sig), pos)) for sig in SIGNALS]
+                        for pos in POSITION_STATES], dtype=np.int8)
+DEFAULT_FEE_BPS = 5.0
+
+
+class SignalTableError(RuntimeError):
+    """run_strategy raised while building a signal table; `failures` calls failed, the first at row `bar`."""
+
+    def __init__(self, message: str, failures: int, bar: int, error: BaseException):
+        super().__init__(message)
+        self.failures, self.bar, self.error = failures, bar, error
+
+
+def compute_signal_table(module, df: pd.DataFrame, params: Dict[str, Any]) -> np.ndarray:
+    """
+    int8 array (bars x 3): the signal code run_strategy returns at each bar when flat,
+    LONG or SHORT. `df` must already carry the module's indicator columns. Modules with a
+    vectorized get_signal_table(df, params) (e.g. the rule DSL plugin) provide it directly.
+    """
+    if hasattr(module, 'get_signal_table'):
+        return np.asarray(module.get_signal_table(df, params), dtype=np.int8)
+    return signal_table_by_bar(module, df, params)
+
+
+def signal_table_by_bar(module, df: pd.DataFrame, params: Dict[str, Any]) -> np.ndarray:
+    """
+    compute_signal_table() by calling run_strategy on every bar (3 calls per bar); the
+    reference every get_signal_table must reproduce. Raises SignalTableError if
+    run_strategy raised on any bar (rather than reading it as HOLD).
+    """
+    n = len(df)
+    table = np.zeros((n, len(POSITION_STATES)), dtype=np.int8)
+    failures, first = 0, None
+    for i in range(SIGNAL_BARS - 1, n):
+        window = df.iloc[i - SIGNAL_BARS + 1:i + 1]
+        for s, pos in enumerate(POSITION_STATES):
+            try:
+                signal = module.run_strategy(window, params, current_position_type=pos).get("signal", "HOLD")
+            except Exception as e:
+                failures += 1
+                if first is None: first = (i, pos, e)
+                continue
+            table[i, s] = _SIGNAL_CODES.get(signal, 0)
+    if first is not None:
+        i, pos, e = first
+        raise SignalTableError(f"run_strategy failed {failures} time(s) over {n} bars; first at bar {i} ({df.index[i]}, "
+                               f"position {pos or 'flat'}): {type(e).__name__}: {e}", failures, i, e) from e
+    return table
+
+
+def indicator_values(df: pd.DataFrame, column: str) -> np.ndarray:
+    """float64 values of an indicator column (NaN where missing; all NaN if the column is absent)."""
+    if column not in df.columns: return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(np.float64)
+
+
+def previous(values: np.ndarray) -> np.ndarray:
+    """values shifted one bar (NaN first), i.e. what run_strategy reads as iloc[-2]."""
+    return np.concatenate([[np.nan], values[:-1]])
+
+
+def crossover_table(buy: np.ndarray, sell: np.ndarray, exits: bool = True) -> np.ndarray:
+    """
+    Signal table for a run_strategy that, when flat, says BUY on `buy` and SELL on `sell`. With
+    `exits` a LONG gets CLOSE_LONG on `sell` and a SHORT CLOSE_SHORT on `buy` (HOLD otherwise);
+    without, the signal ignores the position. Row 0 is HOLD, as run_strategy needs two bars.
+    """
+    buy, sell = np.asarray(buy, dtype=bool), np.asarray(sell, dtype=bool)
+    flat = np.where(buy, _SIGNAL_CODES["BUY"], np.where(sell, _SIGNAL_CODES["SELL"], _SIGNAL_CODES["HOLD"]))
+    table = np.empty((len(buy), len(POSITION_STATES)), dtype=np.int8)
+    table[:, 0] = flat
+    if exits:
+        table[:, 1] = np.where(sell, _SIGNAL_CODES["CLOSE_LONG"], _SIGNAL_CODES["HOLD"])
+        table[:, 2] = np.where(buy, _SIGNAL_CODES["CLOSE_SHORT"], _SIGNAL_CODES["HOLD"])
+    else:
+        table[:, 1] = table[:, 2] = flat
+    table[:SIGNAL_BARS - 1] = _SIGNAL_CODES["HOLD"]
+    return table
+
+
+def step_positions(table: np.ndarray, start: int, end: int, state: int = 0) -> Tuple[np.ndarray, int]:
+    """
+    Runs the position state machine over bars [start, end) from `state` (index into
+    POSITION_STATES). Returns (position held from each bar's open, state after `end - 1`).
+    """
+    held = np.zeros(end - start, dtype=np.int8)
+    for j in range(start, end):
+        held[j - start] = _POSITION_VALUE[POSITION_STATES[state]]
+        state = _NEXT_STATE[state, table[j, state]]
+    return held, int(state)
+
+
+def bar_returns(held: np.ndarray, open_: np.ndarray, close: np.ndarray, prev_held: int, prev_close: float,
+                fee_bps: float = DEFAULT_FEE_BPS) -> np.ndarray:
+    """Per-bar strategy returns for positions `held` over bars with these open/close prices."""
+    prev_held_arr = np.concatenate([[prev_held], held[:-1]])
+    prev_closes = np.concatenate([[prev_close], close[:-1]])
+    gap = open_ / prev_closes - 1.0           # previous close -> this open, old position
+    intrabar = close / open_ - 1.0            # this open -> this close, new position
+    changes = np.abs(held - prev_held_arr)
+    return (1 + prev_held_arr * gap) * (1 + held * intrabar) - 1 - changes * fee_bps / 10000.0
+
+
+def simulate(table: np.ndarray, open_: np.ndarray, close: np.ndarray, start: int, end: int,
+             fee_bps: float = DEFAULT_FEE_BPS) -> Tuple[np.ndarray, int]:
+    """
+    Runs the position state machine from flat over bars [start, end) and returns
+    (per-bar strategy returns for those bars, number of position changes).
+    A signal at bar i's close is filled at bar i+1's open.
+    """
+    held, _ = step_positions(table, start, end)
+    prev_close = close[start - 1] if start > 0 else open_[start]
+    returns = bar_returns(held, open_[start:end], close[start:end], 0, prev_close, fee_bps)
+    return returns, int(np.count_nonzero(np.diff(held, prepend=0)))
+
+
+def performance(returns: np.ndarray, timeframe: str, trades: int = 0, chunk_bars: int = 1_000_000) -> Dict[str, Any]:
+    """
+    Summary metrics of per-bar returns. Works chunk by chunk (so `returns` can be a memmap
+    of any length) and gives the same numbers whatever the chunking: equity is carried
+    through cumprod, and mean/std use math.fsum (correctly rounded, order independent).
+    """
+    n = len(returns)
+    if n == 0:
+        return {"bars": 0, "total_return": 0.0, "sharpe": 0.0, "max_drawdown": 0.0, "trades": trades}
+    equity, peak, max_dd = 1.0, 1.0, 0.0
+    for lo in range(0, n, chunk_bars):
+        growth = 1.0 + np.asarray(returns[lo:lo + chunk_bars], dtype=np.float64)
+        growth[0] *= equity
+        curve = np.cumprod(growth)
+        peaks = np.maximum(np.maximum.accumulate(curve), peak)
+        max_dd = min(max_dd, float((curve / peaks - 1).min()))
+        equity, peak = float(curve[-1]), float(peaks[-1])
+
+    def values():
+        for lo in range(0, n, chunk_bars):
+            yield from np.asarray(returns[lo:lo + chunk_bars], dtype=np.float64).tolist()
+
+    mean = math.fsum(values()) / n
+    std = math.sqrt(math.fsum((v - mean) ** 2 for v in values()) / n)
+    bars_per_year = 365 * 86400 * 1000 / timeframe_to_ms(timeframe)
+    sharpe = mean / std * math.sqrt(bars_per_year) if std > 0 else 0.0
+    return {"bars": int(n), "total_return": round(equity - 1, 6), "sharpe": round(sharpe, 4),
+            "max_drawdown": round(max_dd, 6), "trades": trades}
+
+
+def prepare(module, df: pd.DataFrame, params: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(signal table, open, close) for `module` with `params` over `df`."""
+    df_ind = module.calculate_strategy_indicators(df.copy(), params)
+    table = compute_signal_table(module, df_ind, params)
+    return table, df['open'].to_numpy(np.float64), df['close'].to_numpy(np.float64)
+
+
+def prepare_many(module, df: pd.DataFrame, params_list: List[Dict[str, Any]]
+                 ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    prepare() for several param sets. Modules with get_sweep_columns(df, params_list) compute
+    each indicator for all the lengths involved in one pass (api/indicators.py *_many).
+    """
+    if hasattr(module, 'get_sweep_columns') and len(params_list) > 1:
+        frames = [df.assign(**cols) for cols in module.get_sweep_columns(df, params_list)]
+    else:
+        frames = [module.calculate_strategy_indicators(df.copy(), p) for p in params_list]
+    open_, close = df['open'].to_numpy(np.float64), df['close'].to_numpy(np.float64)
+    return [(compute_signal_table(module, f, p), open_, close) for f, p in zip(frames, params_list)]
+
+
+def run_backtest(module, df: pd.DataFrame, params: Dict[str, Any], timeframe: str, start: int = 0,
+                 end: Optional[int] = None, fee_bps: float = DEFAULT_FEE_BPS) -> Dict[str, Any]:
+    """Single backtest over bars [start, end) of `df` (indicators still see the bars before `start`)."""
+    table, open_, close = prepare(module, df, params)
+    end = len(df) if end is None else end
+    returns, trades = simulate(table, open_, close, start, end, fee_bps)
+    return performance(returns, timeframe, trades)
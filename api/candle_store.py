@@ -0,0 +1,112 @@
+# api/candle_store.py
+"""
+Local OHLCV store (SQLite, WAL mode).
+
+One row per (exchange, symbol, timeframe, ts); writes are upserts, so overlapping
+backfill chunks and re-fetched live bars dedupe themselves. Used by the backfill engine
+and as a local source of history for the fetch layer.
+"""
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+import numpy as np
+
+from api.candles import CandleArray
+
+DEFAULT_CANDLE_DB = os.getenv("CANDLE_STORE_DB", str(Path(__file__).resolve().parent.parent / "data" / "candles.db"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS candles (
+    exchange   TEXT    NOT NULL,
+    symbol     TEXT    NOT NULL,
+    timeframe  TEXT    NOT NULL,
+    ts         INTEGER NOT NULL,
+    open       REAL    NOT NULL,
+    high       REAL    NOT NULL,
+    low        REAL    NOT NULL,
+    close      REAL    NOT NULL,
+    volume     REAL    NOT NULL,
+    PRIMARY KEY (exchange, symbol, timeframe, ts)
+) WITHOUT ROWID;
+"""
+
+
+class CandleStore:
+    """SQLite-backed candle store keyed by (exchange, symbol, timeframe, ts)."""
+
+    def __init__(self, db_path: str = DEFAULT_CANDLE_DB):
+        self.db_path = str(db_path)
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def write(self, exchange: str, symbol: str, timeframe: str, rows: List[List[float]]) -> int:
+        """Upserts ccxt-style [ts, o, h, l, c, v] rows. Returns the number of rows written."""
+        if not rows: return 0
+        data = [(exchange, symbol, timeframe, int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]),
+                 float(r[5] or 0.0)) for r in rows]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO candles VALUES (?,?,?,?,?,?,?,?,?)", data)
+            self._conn.commit()
+        return len(data)
+
+    def read(self, exchange: str, symbol: str, timeframe: str, since: Optional[int] = None,
+             until: Optional[int] = None, limit: Optional[int] = None) -> List[List[float]]:
+        """Rows with since <= ts < until, oldest first. With only `limit`, the latest `limit` rows."""
+        where, args = ["exchange=? AND symbol=? AND timeframe=?"], [exchange, symbol, timeframe]
+        if since is not None: where.append("ts >= ?"); args.append(int(since))
+        if until is not None: where.append("ts < ?"); args.append(int(until))
+        order = "ASC" if since is not None or limit is None else "DESC"
+        sql = f"SELECT ts, open, high, low, close, volume FROM candles WHERE {' AND '.join(where)} ORDER BY ts {order}"
+        if limit is not None: sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = [list(r) for r in self._conn.execute(sql, args).fetchall()]
+        return rows if order == "ASC" else rows[::-1]
+
+    def read_array(self, exchange: str, symbol: str, timeframe: str, since: Optional[int] = None,
+                   until: Optional[int] = None, limit: Optional[int] = None, dtype=np.float64) -> CandleArray:
+        return CandleArray.from_rows(self.read(exchange, symbol, timeframe, since, until, limit), dtype=dtype)
+
+    def timestamps(self, exchange: str, symbol: str, timeframe: str, since: Optional[int] = None,
+                   until: Optional[int] = None) -> np.ndarray:
+        where, args = ["exchange=? AND symbol=? AND timeframe=?"], [exchange, symbol, timeframe]
+        if since is not None: where.append("ts >= ?"); args.append(int(since))
+        if until is not None: where.append("ts < ?"); args.append(int(until))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT ts FROM candles WHERE {' AND '.join(where)} ORDER BY ts", args).fetchall()
+        return np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    def coverage(self, exchange: str, symbol: str, timeframe: str) -> Tuple[Optional[int], Optional[int], int]:
+        """(first ts, last ts, row count) of a series."""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(ts), MAX(ts), COUNT(*) FROM candles WHERE exchange=? AND symbol=? AND timeframe=?",
+                                     (exchange, symbol, timeframe)).fetchone()
+        return row[0], row[1], row[2]
+
+    def missing_ranges(self, exchange: str, symbol: str, timeframe: str, start: int, end: int,
+                       tf_ms: int) -> List[Tuple[int, int]]:
+        """Half-open [from, to) ranges of bar-aligned timestamps in [start, end) that are not stored."""
+        start = start - start % tf_ms
+        ts = self.timestamps(exchange, symbol, timeframe, since=start, until=end)
+        bounds = np.concatenate([[start - tf_ms], ts, [end + (-end) % tf_ms]])
+        steps = np.diff(bounds)
+        gap_idx = np.nonzero(steps > tf_ms)[0]
+        return [(int(bounds[i] + tf_ms), int(min(bounds[i + 1], end))) for i in gap_idx if bounds[i] + tf_ms < end]
+
+    def series(self) -> List[Tuple[str, str, str, int]]:
+        """Every stored (exchange, symbol, timeframe, row count)."""
+        with self._lock:
+            return [tuple(r) for r in self._conn.execute(
+                "SELECT exchange, symbol, timeframe, COUNT(*) FROM candles GROUP BY exchange, symbol, timeframe").fetchall()]
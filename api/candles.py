@@ -0,0 +1,206 @@
+# api/candles.py
+"""
+Compact candle container.
+
+CandleArray keeps OHLCV as a struct of arrays: int64 ms timestamps plus float64 (default)
+or float32 price/volume columns. float32 is an opt-in for compact in-memory caches: it keeps
+~7 significant digits, so it must not be written back over exact data. Slices are numpy
+views, and to_dataframe() wraps the same buffers in a DataFrame (timestamp column +
+DatetimeIndex) for pandas_ta without copying them. At float32 a market costs 28 bytes/bar, against 56 for the float64
+DataFrame with its timestamp column and index.
+
+On disk (save/load) prices are stored as integer tick counts, delta-encoded and
+downcast to the narrowest integer type that fits, then compressed. For out-of-core work,
+write_memmap/open_memmap keep one raw column file per field, so any slice of years of 1m
+history can be read without loading the rest.
+"""
+import json
+from pathlib import Path
+from typing import Optional, List, Union
+
+import numpy as np
+import pandas as pd
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+FIELDS = PRICE_FIELDS + ('volume',)
+
+
+def _narrowest_int(values: np.ndarray) -> np.ndarray:
+    if values.size == 0: return values.astype(np.int8)
+    lo, hi = int(values.min()), int(values.max())
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+
+def _delta_encode(values: np.ndarray) -> np.ndarray:
+    return _narrowest_int(np.diff(values, prepend=np.int64(0)))
+
+
+def _delta_decode(deltas: np.ndarray) -> np.ndarray:
+    return np.cumsum(deltas.astype(np.int64))
+
+
+class CandleArray:
+    """Struct-of-arrays OHLCV series, sorted by timestamp with unique bars."""
+    __slots__ = ('timestamp',) + FIELDS
+
+    def __init__(self, timestamp: np.ndarray, open: np.ndarray, high: np.ndarray, low: np.ndarray,
+                 close: np.ndarray, volume: np.ndarray):
+        self.timestamp = timestamp
+        self.open, self.high, self.low, self.close, self.volume = open, high, low, close, volume
+
+    @classmethod
+    def empty(cls, dtype=np.float64) -> "CandleArray":
+        return cls(np.empty(0, np.int64), *(np.empty(0, dtype) for _ in FIELDS))
+
+    @classmethod
+    def from_rows(cls, rows: List[List[float]], dtype=np.float64) -> "CandleArray":
+        """ccxt [ts, o, h, l, c, v] rows -> CandleArray (sorted, last duplicate wins)."""
+        if not rows: return cls.empty(dtype)
+        data = np.asarray(rows, dtype=np.float64)
+        ts = data[:, 0].astype(np.int64)
+        order = np.argsort(ts, kind='stable')
+        ts, data = ts[order], data[order]
+        keep = np.append(ts[1:] != ts[:-1], True)  # last occurrence of each ts
+        data = data[keep]
+        return cls(ts[keep], *(np.ascontiguousarray(data[:, i + 1], dtype=dtype) for i in range(len(FIELDS))))
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, dtype=np.float64) -> "CandleArray":
+        if 'timestamp' in df.columns:
+            ts = df['timestamp'].to_numpy(np.int64)
+        else:
+            ts = df.index.to_numpy('datetime64[ms]').view(np.int64)
+        return cls(ts, *(df[f].to_numpy(dtype) for f in FIELDS))
+
+    @property
+    def dtype(self):
+        return self.close.dtype
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, f).nbytes for f in self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __getitem__(self, key: Union[slice, int]) -> "CandleArray":
+        """Slicing returns views (no copy); an int returns a one-bar view."""
+        if isinstance(key, int):
+            key = slice(key, key + 1 if key != -1 else None)
+        if not isinstance(key, slice):
+            raise TypeError("CandleArray only supports slicing")
+        return CandleArray(*(getattr(self, f)[key] for f in self.__slots__))
+
+    def tail(self, n: int) -> "CandleArray":
+        return self[-n:] if n < len(self) else self
+
+    def between(self, since: Optional[int] = None, until: Optional[int] = None) -> "CandleArray":
+        """View of bars with since <= ts < until."""
+        lo = 0 if since is None else int(np.searchsorted(self.timestamp, since, side='left'))
+        hi = len(self) if until is None else int(np.searchsorted(self.timestamp, until, side='left'))
+        return self[lo:hi]
+
+    def astype(self, dtype) -> "CandleArray":
+        if np.dtype(dtype) == self.dtype: return self
+        return CandleArray(self.timestamp, *(getattr(self, f).astype(dtype) for f in FIELDS))
+
+    def merge(self, other: "CandleArray") -> "CandleArray":
+        """New array with `other`'s bars added; on equal timestamps `other` wins (e.g. the refreshed open bar)."""
+        if not len(other): return self
+        if not len(self): return other.astype(self.dtype)
+        if other.timestamp[0] > self.timestamp[-1]:
+            return CandleArray(*(np.concatenate([getattr(self, f), getattr(other, f).astype(getattr(self, f).dtype)])
+                                 for f in self.__slots__))
+        ts = np.concatenate([self.timestamp, other.timestamp])
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+        keep = np.append(ts[1:] != ts[:-1], True)
+        cols = [np.concatenate([getattr(self, f), getattr(other, f).astype(self.dtype)])[order][keep] for f in FIELDS]
+        return CandleArray(ts[keep], *cols)
+
+    def to_rows(self) -> List[List[float]]:
+        return [[int(t), *map(float, vals)] for t, *vals in zip(self.timestamp, *(getattr(self, f) for f in FIELDS))]
+
+    def to_dataframe(self, dtype=None) -> pd.DataFrame:
+        """
+        DataFrame over the same buffers ('timestamp' column + DatetimeIndex named 'datetime').
+        Pass dtype=np.float64 to upcast for indicator maths (that one does copy).
+        """
+        arr = self.astype(dtype) if dtype is not None else self
+        df = pd.DataFrame({'timestamp': arr.timestamp, **{f: getattr(arr, f) for f in FIELDS}},
+                          index=pd.DatetimeIndex(arr.timestamp.view('datetime64[ms]'), name='datetime'), copy=False)
+        return df
+
+    # --- Quantized on-disk encoding ---
+    def save(self, path: Union[str, Path], tick_size: float, volume_step: Optional[float] = None):
+        """
+        Writes a compressed .npz with prices as integer tick counts (delta-encoded) and
+        timestamps delta-encoded. Volume is quantized to `volume_step` if given, else kept as float32.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {'timestamp': _delta_encode(self.timestamp),
+                  'meta': np.array([tick_size, volume_step or 0.0], dtype=np.float64)}
+        for f in PRICE_FIELDS:
+            ticks = np.rint(getattr(self, f).astype(np.float64) / tick_size).astype(np.int64)
+            arrays[f] = _delta_encode(ticks)
+        if volume_step:
+            arrays['volume'] = _delta_encode(np.rint(self.volume.astype(np.float64) / volume_step).astype(np.int64))
+        else:
+            arrays['volume'] = self.volume.astype(np.float32)
+        with open(path, 'wb') as fh:
+            np.savez_compressed(fh, **arrays)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], dtype=np.float64) -> "CandleArray":
+        with np.load(path) as data:
+            tick_size, volume_step = (float(x) for x in data['meta'])
+            ts = _delta_decode(data['timestamp'])
+            prices = [(_delta_decode(data[f]) * tick_size).astype(dtype) for f in PRICE_FIELDS]
+            volume = (_delta_decode(data['volume']) * volume_step).astype(dtype) if volume_step else data['volume'].astype(dtype)
+        return cls(ts, *prices, volume)
+
+
+def write_memmap(directory: Union[str, Path], candles: "CandleArray", append: bool = False):
+    """Writes (or appends) raw column files <field>.bin plus meta.json under `directory`."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    meta_path = directory / "meta.json"
+    meta = json.loads(meta_path.read_text()) if append and meta_path.exists() else None
+    dtype = np.dtype(meta["dtype"]) if meta else candles.dtype
+    if meta and len(candles) and candles.timestamp[0] <= meta["last_ts"]:
+        raise ValueError("write_memmap(append=True) needs candles newer than the last stored bar")
+    mode = "ab" if meta else "wb"
+    with open(directory / "timestamp.bin", mode) as fh:
+        fh.write(np.ascontiguousarray(candles.timestamp, dtype=np.int64).tobytes())
+    for f in FIELDS:
+        with open(directory / f"{f}.bin", mode) as fh:
+            fh.write(np.ascontiguousarray(getattr(candles, f), dtype=dtype).tobytes())
+    length = (meta["length"] if meta else 0) + len(candles)
+    last_ts = int(candles.timestamp[-1]) if len(candles) else (meta["last_ts"] if meta else None)
+    meta_path.write_text(json.dumps({"length": length, "dtype": dtype.name, "last_ts": last_ts}))
+
+
+def open_memmap(directory: Union[str, Path]) -> "CandleArray":
+    """Read-only CandleArray over the column files in `directory` (pages are loaded on access)."""
+    directory = Path(directory)
+    meta = json.loads((directory / "meta.json").read_text())
+    n, dtype = meta["length"], np.dtype(meta["dtype"])
+    if n == 0: return CandleArray.empty(dtype)
+    ts = np.memmap(directory / "timestamp.bin", dtype=np.int64, mode="r", shape=(n,))
+    return CandleArray(ts, *(np.memmap(directory / f"{f}.bin", dtype=dtype, mode="r", shape=(n,)) for f in FIELDS))
+
+
+def infer_tick_size(prices: np.ndarray, max_decimals: int = 10) -> float:
+    """Smallest power-of-ten step that represents every price exactly (a fallback when the market's tick is unknown)."""
+    values = np.asarray(prices, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    for decimals in range(max_decimals + 1):
+        scaled = values * 10 ** decimals
+        if np.allclose(scaled, np.rint(scaled), rtol=0, atol=1e-6):
+            return 10.0 ** -decimals
+    return 10.0 ** -max_decimals
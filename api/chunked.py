@@ -0,0 +1,135 @@
+# api/chunked.py
+"""
+Out-of-core backtests over memory-mapped candle files.
+
+Candles are read from write_memmap() column files (see api/candles.py) one chunk at a time.
+Indicator columns come from the plugin's get_streaming_indicators(params), whose state
+carries across chunk boundaries (api/indicators.py). The position state, previous close
+and the last SIGNAL_BARS-1 indicator rows carry over too. Per-bar returns go to a memmap
+and the summary is computed from it in chunks, so peak memory depends on chunk_bars and
+not on the length of the history. The result is identical to a single-chunk run.
+
+    python -m api.chunked export okx BTC-USDT-SWAP 1m data/mm/okx_BTC-USDT-SWAP_1m
+    python -m api.chunked run ema_simple_crossover data/mm/okx_BTC-USDT-SWAP_1m 1m --chunk-bars 500000
+"""
+import os
+import sys
+import json
+import tempfile
+import argparse
+from pathlib import Path
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from api.candles import CandleArray, FIELDS, write_memmap, open_memmap
+from api.backtest import SIGNAL_BARS, DEFAULT_FEE_BPS, compute_signal_table, step_positions, bar_returns, performance
+
+DEFAULT_CHUNK_BARS = 250_000
+STRATEGY_DIR = Path(__file__).resolve().parent / "strategies"
+
+
+def store_to_memmap(store, exchange: str, symbol: str, timeframe: str, directory: str,
+                    page_bars: int = 200_000, dtype=np.float64) -> int:
+    """Streams a candle-store series into memmap column files, page by page. Returns the bar count."""
+    cursor, total = 0, 0
+    while True:
+        rows = store.read(exchange, symbol, timeframe, since=cursor, limit=page_bars)
+        if not rows: break
+        write_memmap(directory, CandleArray.from_rows(rows, dtype), append=total > 0)
+        total += len(rows)
+        cursor = int(rows[-1][0]) + 1
+        if len(rows) < page_bars: break
+    return total
+
+
+def iter_indicator_chunks(candles: CandleArray, indicators: Dict[str, Any], chunk_bars: int = DEFAULT_CHUNK_BARS
+                          ) -> Iterator[Tuple[int, Dict[str, np.ndarray], Dict[str, np.ndarray]]]:
+    """Yields (offset, float64 OHLCV chunk with 'timestamp', indicator columns) for consecutive chunks."""
+    for lo in range(0, len(candles), max(1, chunk_bars)):
+        part = candles[lo:lo + chunk_bars]
+        chunk = {f: np.asarray(getattr(part, f), dtype=np.float64) for f in FIELDS}
+        chunk['timestamp'] = np.asarray(part.timestamp, dtype=np.int64)
+        yield lo, chunk, {name: ind(chunk) for name, ind in indicators.items()}
+
+
+def chunked_backtest(module, params: Dict[str, Any], candles: CandleArray, timeframe: str,
+                     chunk_bars: int = DEFAULT_CHUNK_BARS, fee_bps: float = DEFAULT_FEE_BPS,
+                     returns_path: Optional[str] = None) -> Dict[str, Any]:
+    """Backtests `module` over `candles` (typically open_memmap(...)) `chunk_bars` at a time."""
+    if not hasattr(module, 'get_streaming_indicators'):
+        raise ValueError(f"{getattr(module, 'STRATEGY_NAME', module)} has no get_streaming_indicators(); "
+                         "it can only be backtested in memory (api.backtest).")
+    indicators = module.get_streaming_indicators(params)
+    n = len(candles)
+    if n == 0: return performance(np.empty(0), timeframe)
+    tmp_dir = None
+    if returns_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        returns_path = os.path.join(tmp_dir.name, "returns.f64")
+    returns = np.memmap(returns_path, dtype=np.float64, mode="w+", shape=(n,))
+    try:
+        tail: Optional[pd.DataFrame] = None
+        state, prev_held, prev_close, trades = 0, 0, None, 0
+        for lo, chunk, columns in iter_indicator_chunks(candles, indicators, chunk_bars):
+            frame = pd.DataFrame({**chunk, **columns})
+            offset = 0
+            if tail is not None:
+                offset = len(tail)
+                frame = pd.concat([tail, frame], ignore_index=True)
+            table = compute_signal_table(module, frame, params)[offset:]
+            held, state = step_positions(table, 0, len(table), state)
+            open_, close = chunk['open'], chunk['close']
+            returns[lo:lo + len(held)] = bar_returns(held, open_, close, prev_held,
+                                                     open_[0] if prev_close is None else prev_close, fee_bps)
+            trades += int(np.count_nonzero(np.diff(held, prepend=prev_held)))
+            prev_held, prev_close = int(held[-1]), float(close[-1])
+            tail = frame.iloc[-(SIGNAL_BARS - 1):] if SIGNAL_BARS > 1 else None
+        returns.flush()
+        report = performance(returns, timeframe, trades, chunk_bars=max(1, chunk_bars))
+    finally:
+        del returns
+        if tmp_dir is not None: tmp_dir.cleanup()
+    report["chunk_bars"] = chunk_bars
+    return report
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked backtests over memory-mapped candle files.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="Copy a candle-store series into memmap column files.")
+    exp.add_argument("exchange"); exp.add_argument("symbol"); exp.add_argument("timeframe"); exp.add_argument("directory")
+    exp.add_argument("--db")
+    run = sub.add_parser("run", help="Backtest a strategy over a memmap directory.")
+    run.add_argument("strategy"); run.add_argument("directory"); run.add_argument("timeframe")
+    run.add_argument("--params", default="{}", help="JSON params (normalized against STRATEGY_PARAMS_UI).")
+    run.add_argument("--chunk-bars", type=int, default=DEFAULT_CHUNK_BARS)
+    run.add_argument("--fee-bps", type=float, default=DEFAULT_FEE_BPS)
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        from api.candle_store import CandleStore, DEFAULT_CANDLE_DB
+        store = CandleStore(args.db or DEFAULT_CANDLE_DB)
+        try:
+            print(f"--- Exported {store_to_memmap(store, args.exchange, args.symbol, args.timeframe, args.directory)} bars")
+        finally:
+            store.close()
+    else:
+        from api.plugins import load_strategy_module
+        from api.params import normalize_params
+        mod = load_strategy_module(args.strategy, str(STRATEGY_DIR / f"{args.strategy}.py"))
+        if mod is None: sys.exit(f"!!! Could not load strategy {args.strategy}")
+        result = chunked_backtest(mod, normalize_params(mod, json.loads(args.params)), open_memmap(args.directory),
+                                  args.timeframe, chunk_bars=args.chunk_bars, fee_bps=args.fee_bps)
+        result["peak_rss_mb"] = _peak_rss_mb()
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,135 @@
+# api/downsample.py
+"""
+Resolution-aware chart payloads.
+
+A chart a few hundred pixels wide can't show more than about one candle per pixel. For long
+histories the bars are grouped into `width` buckets of consecutive bars and aggregated OHLC
+preserving (first open, max high, min low, last close, summed volume, first timestamp). Each
+overlay line keeps one point per bucket, chosen with Largest-Triangle-Three-Buckets (LTTB):
+the point forming the largest triangle with the point kept in the previous bucket and the mean
+of the next one. That keeps peaks and troughs that a plain stride would skip. Overlay points
+take the timestamp of their candle bucket, so lines and candles share the same time slots.
+
+The last bar is never aggregated. It stays its own bucket so that polled updates of the
+still-open bar (/api/chart/delta) replace it in place. Everything before it is cached per
+zoom level in LODCache.
+"""
+import math
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple, Hashable, Optional
+
+import numpy as np
+
+MIN_LEVEL = 64  # requested widths are rounded up to a power of two, at least this
+
+
+def bucket_edges(n: int, buckets: int) -> np.ndarray:
+    """Start index of each of `buckets` near-equal groups of n consecutive bars."""
+    return np.unique(np.linspace(0, n, max(1, min(buckets, n)) + 1).astype(np.int64)[:-1])
+
+
+def aggregate_ohlcv(ts, open_, high, low, close, volume, edges: np.ndarray) -> Dict[str, np.ndarray]:
+    """OHLC-preserving aggregation of the bars into the groups starting at `edges`."""
+    last = np.concatenate([edges[1:], [len(ts)]]) - 1
+    return {"timestamp": np.asarray(ts)[edges], "open": np.asarray(open_)[edges],
+            "high": np.maximum.reduceat(np.asarray(high, dtype=np.float64), edges),
+            "low": np.minimum.reduceat(np.asarray(low, dtype=np.float64), edges),
+            "close": np.asarray(close)[last], "volume": np.add.reduceat(np.asarray(volume, dtype=np.float64), edges)}
+
+
+def lttb(x: np.ndarray, y: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    LTTB over precomputed buckets: `groups` is the non-decreasing bucket id of every point.
+    Returns the index of the one point kept per non-empty bucket (first and last points always kept).
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n == 0: return np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], np.diff(groups) != 0]))
+    m = len(starts)
+    if m <= 2: return np.unique(np.array([0, n - 1], dtype=np.int64)) if m == 2 else np.array([0])
+    counts = np.diff(np.concatenate([starts, [n]]))
+    mean_x, mean_y = np.add.reduceat(x, starts) / counts, np.add.reduceat(y, starts) / counts
+    mean_x[-1], mean_y[-1] = x[-1], y[-1]  # the last bucket is represented by the last point
+    # Candidates of every bucket as rows of a padded matrix (padding repeats the bucket's last point)
+    width = int(counts.max())
+    cand = starts[:, None] + np.minimum(np.arange(width)[None, :], counts[:, None] - 1)
+    cx, cy = x[cand], y[cand]
+    keep = np.empty(m, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    ax, ay = x[0], y[0]
+    for j in range(1, m - 1):
+        nx, ny = mean_x[j + 1], mean_y[j + 1]
+        area = np.abs((ax - nx) * (cy[j] - ay) - (ax - cx[j]) * (ny - ay))
+        k = int(cand[j, int(np.argmax(area))])
+        keep[j], ax, ay = k, x[k], y[k]
+    return keep
+
+
+def _is_line(series) -> bool:
+    return isinstance(series, list) and all(isinstance(p, dict) and "time" in p and "value" in p for p in series)
+
+
+def downsample_chart(candles: List[Dict[str, Any]], overlays: Dict[str, Any], width: int
+                     ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """(candle records, overlay lines) with at most ~width candles and one overlay point per candle."""
+    n = len(candles)
+    if n <= width or width < 2: return candles, overlays
+    cols = {k: np.array([c[k] for c in candles], dtype=np.int64 if k == "timestamp" else np.float64)
+            for k in ("timestamp", "open", "high", "low", "close", "volume")}
+    edges = np.concatenate([bucket_edges(n - 1, width - 1), [n - 1]])  # the last bar stays on its own
+    agg = aggregate_ohlcv(cols["timestamp"], cols["open"], cols["high"], cols["low"], cols["close"], cols["volume"], edges)
+    bucket_ts = agg["timestamp"]
+    out_candles = [{"timestamp": int(t), "open": float(o), "high": float(h), "low": float(l), "close": float(c), "volume": float(v)}
+                   for t, o, h, l, c, v in zip(bucket_ts, agg["open"], agg["high"], agg["low"], agg["close"], agg["volume"])]
+    out_overlays = {}
+    for key, series in (overlays or {}).items():
+        if not _is_line(series) or len(series) <= 2:
+            out_overlays[key] = series
+            continue
+        t = np.array([p["time"] for p in series], dtype=np.int64)
+        v = np.array([p["value"] for p in series], dtype=np.float64)
+        groups = np.maximum(np.searchsorted(bucket_ts, t, side="right") - 1, 0)
+        keep = lttb(t.astype(np.float64), v, groups)
+        out_overlays[key] = [{"time": int(bucket_ts[groups[i]]), "value": float(v[i])} for i in keep]
+    return out_candles, out_overlays
+
+
+def zoom_level(width: int) -> int:
+    """Requested pixel width rounded up to a power of two (the cached zoom levels)."""
+    return max(MIN_LEVEL, 1 << math.ceil(math.log2(max(1, width))))
+
+
+class LODCache:
+    """LRU of downsampled chart prefixes (everything before the last bar) per (chart, zoom level)."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[List[Dict[str, Any]], Dict[str, Any]]]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, chart_key: Hashable, candles: List[Dict[str, Any]], overlays: Dict[str, Any], width: int
+            ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Optional[int]]:
+        """(candles, overlays, zoom level or None if nothing was downsampled) for the given width."""
+        level = zoom_level(width)
+        if len(candles) <= level: return candles, overlays, None
+        last_ts = candles[-1]["timestamp"]
+        key = (chart_key, len(candles), candles[0]["timestamp"], candles[-2]["timestamp"], level)
+        prefix = self._entries.get(key)
+        if prefix is None:
+            self.misses += 1
+            head = {k: [p for p in s if p["time"] < last_ts] if _is_line(s) else s for k, s in (overlays or {}).items()}
+            prefix = downsample_chart(candles[:-1], head, level - 1)
+            self._entries[key] = prefix
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        head_candles, head_overlays = prefix
+        out = {}
+        for k, s in (overlays or {}).items():
+            out[k] = head_overlays.get(k, []) + [p for p in s if p["time"] >= last_ts] if _is_line(s) else s
+        return head_candles + [candles[-1]], out, level
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
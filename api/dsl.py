@@ -0,0 +1,238 @@
+# api/dsl.py
+"""
+Signal expression language, compiled to vectorized NumPy.
+
+    cross_above(ema(close, 12), ema(close, 26)) & rsi(close, 14) < 70
+
+A rule is parsed with Python's ast module (after turning & | ~ into and/or/not, so they
+bind looser than comparisons, as they read). Only whitelisted nodes, names and
+functions are accepted. Evaluation runs over whole arrays, so the same compiled rule
+serves the live last bar and a full-history backtest. Identical sub-expressions (the
+ema(close, 12) used twice above) are computed once per evaluation.
+
+Series:     open high low close volume
+Functions:  sma ema rma rsi atr(n) highest lowest stdev change prev
+            cross_above cross_below abs min max
+Operators:  + - * /  < <= > >= == !=  & | ~ (and/or/not)
+"""
+import io
+import ast
+import tokenize
+from functools import lru_cache
+from typing import Dict, Callable, Mapping, Tuple, List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from api import indicators as ind
+
+SERIES = ("open", "high", "low", "close", "volume")
+MAX_RULE_CHARS = 2000
+MAX_LENGTH = 5000
+
+
+class DSLError(ValueError):
+    pass
+
+
+def _shift(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if n < len(x): out[n:] = x[:len(x) - n]
+    return out
+
+
+def _stdev(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if n > 1 and len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n).std(axis=1, ddof=1)  # sample stdev, like pandas_ta
+    return out
+
+
+def _smooth(cls, x, n):
+    return cls(n, source="x")({"x": x})
+
+
+def _cross(a, b, above: bool):
+    pa, pb = _shift(a, 1), _shift(b, 1)
+    with np.errstate(invalid="ignore"):
+        return (a > b) & (pa <= pb) if above else (a < b) & (pa >= pb)
+
+
+# name -> (number of series args, has a length arg, lookback kind, implementation)
+FUNCTIONS: Dict[str, Tuple[int, bool, str, Callable]] = {
+    "sma": (1, True, "window", lambda d, x, n: ind.sma_many(x, [n])[0]),
+    "highest": (1, True, "window", lambda d, x, n: ind.rolling_max_many(x, [n])[0]),
+    "lowest": (1, True, "window", lambda d, x, n: ind.rolling_min_many(x, [n])[0]),
+    "stdev": (1, True, "window", lambda d, x, n: _stdev(x, n)),
+    "change": (1, True, "window", lambda d, x, n: x - _shift(x, n)),
+    "prev": (1, True, "window", lambda d, x, n: _shift(x, n)),
+    "ema": (1, True, "recursive", lambda d, x, n: _smooth(ind.EMA, x, n)),
+    "rma": (1, True, "recursive", lambda d, x, n: _smooth(ind.RMA, x, n)),
+    "rsi": (1, True, "recursive", lambda d, x, n: ind.RSI(n, source="x")({"x": x})),
+    "atr": (0, True, "recursive", lambda d, n: ind.ATR(n)(d)),
+    "cross_above": (2, False, "window", lambda d, a, b: _cross(a, b, True)),
+    "cross_below": (2, False, "window", lambda d, a, b: _cross(a, b, False)),
+    "abs": (1, False, None, lambda d, x: np.abs(x)),
+    "min": (2, False, None, lambda d, a, b: np.fmin(a, b)),
+    "max": (2, False, None, lambda d, a, b: np.fmax(a, b)),
+}
+# Optional-length functions default to 1 (change(close) == change(close, 1))
+_DEFAULT_LENGTH = {"change": 1, "prev": 1}
+
+_BINOPS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_CMPOPS = {ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+           ast.Eq: np.equal, ast.NotEq: np.not_equal}
+PRICE_LEVEL = ("sma", "ema", "rma", "highest", "lowest")
+
+
+def _to_python_logic(text: str) -> str:
+    """& | ~ -> and / or / not at the token level (strings and names are left alone)."""
+    out = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(text).readline):
+            if tok.type == tokenize.OP and tok.string in ("&", "|", "~"):
+                out.append((tokenize.NAME, {"&": "and", "|": "or", "~": "not"}[tok.string]))
+            else:
+                out.append((tok.type, tok.string))
+    except (tokenize.TokenError, IndentationError) as e:
+        raise DSLError(f"Cannot tokenize rule: {e}")
+    return tokenize.untokenize(out)
+
+
+class Rule:
+    """A compiled rule: evaluate(data) -> float or bool array over all bars of `data`."""
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        if not self.text: raise DSLError("Empty rule")
+        if len(self.text) > MAX_RULE_CHARS: raise DSLError(f"Rule longer than {MAX_RULE_CHARS} characters")
+        try:
+            tree = ast.parse(_to_python_logic(self.text), mode="eval")
+        except SyntaxError as e:
+            raise DSLError(f"Syntax error in rule: {e.msg}")
+        self.price_terms: List[str] = []
+        self._fn, self.lookback = self._compile(tree.body)
+
+    def evaluate(self, data: Mapping[str, np.ndarray]) -> np.ndarray:
+        arrays = {k: np.asarray(data[k], dtype=np.float64) for k in SERIES if k in data}
+        n = len(arrays["close"])
+        out = self._fn(arrays, {})
+        return np.broadcast_to(np.asarray(out), (n,)) if np.ndim(out) == 0 else out
+
+    # --- compilation ---
+    def _compile(self, node) -> Tuple[Callable, Dict[str, int]]:
+        """Returns (fn(data, cache) -> array or scalar, {"window": .., "recursive": ..})."""
+        key = ast.dump(node)
+        zero = {"window": 0, "recursive": 0}
+
+        def cached(compute):
+            def fn(data, cache):
+                if key not in cache: cache[key] = compute(data, cache)
+                return cache[key]
+            return fn
+
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = float(node.value)
+            return (lambda data, cache: value), zero
+        if isinstance(node, ast.Name):
+            if node.id not in SERIES: raise DSLError(f"Unknown name '{node.id}' (series are {', '.join(SERIES)})")
+            name = node.id
+            return (lambda data, cache: data[name]), zero
+        if isinstance(node, ast.UnaryOp):
+            inner, lb = self._compile(node.operand)
+            if isinstance(node.op, ast.USub): return cached(lambda d, c: -inner(d, c)), lb
+            if isinstance(node.op, ast.Not): return cached(lambda d, c: ~_truth(inner(d, c))), lb
+            raise DSLError(f"Operator {type(node.op).__name__} not allowed")
+        if isinstance(node, ast.BinOp):
+            op = _BINOPS.get(type(node.op))
+            if op is None: raise DSLError(f"Operator {type(node.op).__name__} not allowed")
+            (lf, llb), (rf, rlb) = self._compile(node.left), self._compile(node.right)
+
+            def binop(d, c):
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    return op(lf(d, c), rf(d, c))
+            return cached(binop), _merge(llb, rlb)
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(v) for v in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            fns = [f for f, _ in parts]
+
+            def boolop(d, c):
+                out = _truth(fns[0](d, c))
+                for f in fns[1:]: out = combine(out, _truth(f(d, c)))
+                return out
+            return cached(boolop), _merge(*[lb for _, lb in parts])
+        if isinstance(node, ast.Compare):
+            operands = [self._compile(node.left)] + [self._compile(c) for c in node.comparators]
+            ops = []
+            for op in node.ops:
+                if type(op) not in _CMPOPS: raise DSLError(f"Comparison {type(op).__name__} not allowed")
+                ops.append(_CMPOPS[type(op)])
+
+            def compare(d, c):  # a < b < c == (a < b) & (b < c); NaN compares False
+                vals = [f(d, c) for f, _ in operands]
+                with np.errstate(invalid="ignore"):
+                    out = ops[0](vals[0], vals[1])
+                    for i in range(1, len(ops)): out = out & ops[i](vals[i], vals[i + 1])
+                return out
+            return cached(compare), _merge(*[lb for _, lb in operands])
+        if isinstance(node, ast.Call):
+            return self._compile_call(node, cached)
+        raise DSLError(f"'{type(node).__name__}' is not allowed in rules")
+
+    def _compile_call(self, node: ast.Call, cached):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise DSLError(f"Unknown function '{ast.unparse(node.func)}' (available: {', '.join(FUNCTIONS)})")
+        if node.keywords: raise DSLError("Keyword arguments are not supported")
+        name = node.func.id
+        n_series, has_length, kind, impl = FUNCTIONS[name]
+        args = list(node.args)
+        length = None
+        if has_length:
+            if len(args) == n_series and name in _DEFAULT_LENGTH:
+                length = _DEFAULT_LENGTH[name]
+            elif len(args) == n_series + 1:
+                length_node = args.pop()
+                if not (isinstance(length_node, ast.Constant) and isinstance(length_node.value, int)
+                        and not isinstance(length_node.value, bool)):
+                    raise DSLError(f"{name}(): the length must be an integer constant")
+                length = length_node.value
+                if not 1 <= length <= MAX_LENGTH: raise DSLError(f"{name}(): length must be 1..{MAX_LENGTH}")
+        if len(args) != n_series or (has_length and length is None):
+            raise DSLError(f"{name}() takes {n_series} series" + (" and a length" if has_length else ""))
+        parts = [self._compile(a) for a in args]
+        lookback = _merge(*[lb for _, lb in parts]) if parts else {"window": 0, "recursive": 0}
+        if kind == "window": lookback = {**lookback, "window": lookback["window"] + (length or 1)}
+        elif kind == "recursive": lookback = {**lookback, "recursive": lookback["recursive"] + length}
+        if name == "atr": lookback["window"] += 1
+        if name in PRICE_LEVEL and args and isinstance(args[0], ast.Name) and args[0].id in ("open", "high", "low", "close"):
+            term = ast.unparse(node)
+            if term not in self.price_terms: self.price_terms.append(term)
+        fns = [f for f, _ in parts]
+        extra = (length,) if has_length else ()
+
+        def call(d, c):
+            vals = [np.broadcast_to(np.asarray(f(d, c), dtype=np.float64), (len(d["close"]),)) for f in fns]
+            return impl(d, *vals, *extra)
+        return cached(call), lookback
+
+
+def _truth(x) -> np.ndarray:
+    x = np.asarray(x)
+    if x.dtype == bool: return x
+    return np.nan_to_num(x, nan=0.0) != 0
+
+
+def _merge(*lookbacks: Dict[str, int]) -> Dict[str, int]:
+    return {"window": max(lb["window"] for lb in lookbacks), "recursive": max(lb["recursive"] for lb in lookbacks)}
+
+
+@lru_cache(maxsize=256)
+def compile_rule(text: str) -> Rule:
+    """Parsed rule for `text` (cached: strategies call this on every bar)."""
+    return Rule(text)
+
+
+def evaluate_bool(text: str, data: Mapping[str, np.ndarray]) -> np.ndarray:
+    """Rule result as a bool array (NaN and 0 are False)."""
+    return _truth(compile_rule(text).evaluate(data))
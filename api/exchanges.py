@@ -0,0 +1,452 @@
+# api/exchanges.py
+"""
+Pluggable exchange backends for the fetch layer.
+
+- CcxtBackend:   live exchange through ccxt.async_support (the default).
+- ReplayBackend: local fake exchange serving recorded candle files, with configurable
+                 latency (plus an optional slow tail), a token-bucket rate limit and random
+                 error injection, so the API, scans and backtests can be load-tested offline
+                 and reproducibly.
+- HedgedBackend: wraps the backend of one exchange and its mirrors (EXCHANGE_MIRRORS). If
+                 a call hasn't answered within the p95 of recent latencies, a duplicate goes
+                 to the next mirror and the first answer wins. Each endpoint has a circuit
+                 breaker: after EXCHANGE_BREAKER_FAILURES consecutive network errors it fails
+                 fast for EXCHANGE_BREAKER_RESET_S, then lets a single probe call through.
+
+Select with EXCHANGE_BACKEND=ccxt|replay (see get_backend()). Mirrors are ccxt config
+overrides (e.g. another hostname) or, for replay, ReplayBackend options:
+    EXCHANGE_MIRRORS='{"okx": [{"hostname": "aws.okx.com"}]}'
+    EXCHANGE_MIRRORS='{"okx": [{"latency_ms": "20,40"}]}'      # with EXCHANGE_BACKEND=replay
+Record files with: python -m api.exchanges record okx BTC-USDT-SWAP 1h 5000
+"""
+import os
+import sys
+import csv
+import time
+import json
+import random
+import asyncio
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+
+try:
+    import ccxt
+    import ccxt.async_support as ccxt_async
+    CCXT_AVAILABLE = True
+    NetworkError, RateLimitExceeded = ccxt.NetworkError, ccxt.RateLimitExceeded
+except ImportError:
+    CCXT_AVAILABLE = False
+
+    class NetworkError(Exception):
+        pass
+
+    class RateLimitExceeded(NetworkError):
+        pass
+
+EXCHANGE_BACKEND = os.getenv("EXCHANGE_BACKEND", "ccxt").lower()
+REPLAY_DATA_DIR = os.getenv("REPLAY_DATA_DIR", str(Path(__file__).resolve().parent.parent / "data" / "replay"))
+REPLAY_LATENCY_MS = os.getenv("REPLAY_LATENCY_MS", "0,0")        # "min,max" uniform per call
+REPLAY_RATE_LIMIT = float(os.getenv("REPLAY_RATE_LIMIT", "0"))   # calls/second, 0 = unlimited
+REPLAY_ERROR_RATE = float(os.getenv("REPLAY_ERROR_RATE", "0"))   # probability of an injected NetworkError
+REPLAY_SEED = os.getenv("REPLAY_SEED")
+REPLAY_TAIL = os.getenv("REPLAY_TAIL", "0,0")                     # "probability,ms": calls that take this much longer
+# Hedging and circuit breakers around every backend (see HedgedBackend)
+EXCHANGE_RESILIENCE = os.getenv("EXCHANGE_RESILIENCE", "1").lower() in ("1", "true", "yes")
+EXCHANGE_MIRRORS = os.getenv("EXCHANGE_MIRRORS", "")
+# The hedge fires after this quantile of the endpoint's recent latencies, clamped to [min, max]
+EXCHANGE_HEDGE_QUANTILE = float(os.getenv("EXCHANGE_HEDGE_QUANTILE", "0.95"))
+EXCHANGE_HEDGE_MIN_MS = float(os.getenv("EXCHANGE_HEDGE_MIN_MS", "50"))
+EXCHANGE_HEDGE_MAX_MS = float(os.getenv("EXCHANGE_HEDGE_MAX_MS", "3000"))
+EXCHANGE_HEDGE_DEFAULT_MS = float(os.getenv("EXCHANGE_HEDGE_DEFAULT_MS", "1000"))  # until enough samples
+EXCHANGE_BREAKER_FAILURES = int(os.getenv("EXCHANGE_BREAKER_FAILURES", "5"))
+EXCHANGE_BREAKER_RESET_S = float(os.getenv("EXCHANGE_BREAKER_RESET_S", "30"))
+
+TIMEFRAME_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'M': 2592000}
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    return int(timeframe[:-1]) * TIMEFRAME_SECONDS[timeframe[-1]] * 1000
+
+
+def symbol_to_filename(symbol: str) -> str:
+    return symbol.replace('/', '_').replace(':', '_')
+
+
+class ExchangeBackend:
+    """Minimal async surface the fetch layer needs from an exchange."""
+    id = "base"
+    page_limit = 300
+    rate_limit_per_s: Optional[float] = None  # the exchange's request budget, if known
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str, since: Optional[int] = None,
+                          limit: Optional[int] = None) -> List[List[float]]:
+        raise NotImplementedError
+
+    def milliseconds(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> int:
+        """The backend's notion of "now" (the replay clock for ReplayBackend)."""
+        return int(time.time() * 1000)
+
+    async def close(self):
+        pass
+
+
+class CcxtBackend(ExchangeBackend):
+    def __init__(self, exchange_id: str, config: Optional[Dict[str, Any]] = None):
+        if not CCXT_AVAILABLE:
+            raise RuntimeError("ccxt is not installed.")
+        if not hasattr(ccxt_async, exchange_id):
+            raise ValueError(f"Unknown exchange '{exchange_id}'.")
+        self.id = exchange_id
+        self.client = getattr(ccxt_async, exchange_id)({'enableRateLimit': True, **(config or {})})
+        if getattr(self.client, 'rateLimit', None): self.rate_limit_per_s = 1000.0 / self.client.rateLimit
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        return await self.client.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    async def close(self):
+        await self.client.close()
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class ReplayBackend(ExchangeBackend):
+    """
+    Serves <data_dir>/<exchange>/<symbol>/<timeframe>.csv (timestamp,open,high,low,close,volume).
+    Candles are loaded once into numpy arrays and sliced with searchsorted, so a call costs
+    microseconds plus whatever latency is configured.
+    """
+    page_limit = 1000
+
+    def __init__(self, exchange_id: str, data_dir: str = REPLAY_DATA_DIR, latency_ms: Tuple[float, float] = (0.0, 0.0),
+                 rate_limit: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None,
+                 now_ms: Optional[int] = None, tail: Tuple[float, float] = (0.0, 0.0)):
+        self.id = exchange_id
+        self.data_dir = Path(data_dir)
+        self.latency_ms = latency_ms
+        self.tail = tail  # (probability, extra ms) of a slow call
+        self.error_rate = error_rate
+        self.bucket = _TokenBucket(rate_limit) if rate_limit > 0 else None
+        self.rate_limit_per_s = rate_limit if rate_limit > 0 else None
+        self.rng = random.Random(seed)
+        self.now_ms = now_ms  # None: "now" is the end of each recorded file
+        self._series: Dict[Tuple[str, str], np.ndarray] = {}
+        self.stats = {"calls": 0, "rate_limited": 0, "errors_injected": 0, "candles_served": 0}
+
+    def path_for(self, symbol: str, timeframe: str) -> Path:
+        return self.data_dir / self.id / symbol_to_filename(symbol) / f"{timeframe}.csv"
+
+    def _load(self, symbol: str, timeframe: str) -> np.ndarray:
+        key = (symbol, timeframe)
+        if key not in self._series:
+            path = self.path_for(symbol, timeframe)
+            if not path.exists():
+                raise NetworkError(f"replay: no recorded data at {path}")
+            data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+            data = data[np.argsort(data[:, 0], kind='stable')]
+            self._series[key] = data
+        return self._series[key]
+
+    def milliseconds(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> int:
+        """The fixed replay clock if set, else just past the last recorded candle of the series."""
+        if self.now_ms is not None: return int(self.now_ms)
+        if symbol and timeframe:
+            data = self._load(symbol, timeframe)
+            if len(data): return int(data[-1, 0]) + 1
+        return int(time.time() * 1000)
+
+    def advance(self, ms: int):
+        """Moves the replay clock forward (only meaningful when now_ms was set)."""
+        if self.now_ms is not None: self.now_ms += ms
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        self.stats["calls"] += 1
+        lo, hi = self.latency_ms
+        delay = self.rng.uniform(lo, hi) if hi > 0 else 0.0
+        if self.tail[0] > 0 and self.rng.random() < self.tail[0]: delay += self.tail[1]
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        if self.bucket is not None and not self.bucket.take():
+            self.stats["rate_limited"] += 1
+            raise RateLimitExceeded(f"replay: {self.id} rate limit exceeded")
+        if self.error_rate > 0 and self.rng.random() < self.error_rate:
+            self.stats["errors_injected"] += 1
+            raise NetworkError(f"replay: injected error for {symbol} {timeframe}")
+
+        data = self._load(symbol, timeframe)
+        limit = min(int(limit or self.page_limit), self.page_limit)
+        end = len(data)
+        if self.now_ms is not None:
+            end = int(np.searchsorted(data[:, 0], self.now_ms, side='right'))
+        if since is None:
+            start = max(0, end - limit)
+        else:
+            start = int(np.searchsorted(data[:, 0], since, side='left'))
+        rows = data[start:min(end, start + limit)]
+        self.stats["candles_served"] += len(rows)
+        return [[int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5])] for r in rows]
+
+
+class CircuitOpen(NetworkError):
+    """Raised without calling the exchange while every endpoint's breaker is open."""
+
+
+class CircuitBreaker:
+    """closed -> open after `failures` consecutive failures; after reset_s one probe call (half-open) decides."""
+
+    def __init__(self, failures: int = EXCHANGE_BREAKER_FAILURES, reset_s: float = EXCHANGE_BREAKER_RESET_S):
+        self.threshold, self.reset_s = max(1, failures), reset_s
+        self.state, self.failures, self.trips = "closed", 0, 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed": return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_s:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open": self.trips += 1
+            self.state, self.opened_at = "open", time.monotonic()
+
+    def release(self):
+        """The call ended without a verdict (cancelled, rate limited): let another probe through."""
+        self._probing = False
+
+
+class _Endpoint:
+    __slots__ = ("backend", "name", "breaker", "latencies", "calls", "wins", "errors")
+
+    def __init__(self, backend: ExchangeBackend, name: str):
+        self.backend, self.name = backend, name
+        self.breaker = CircuitBreaker()
+        self.latencies: "deque[float]" = deque(maxlen=200)  # ms of recent successful calls
+        self.calls = self.wins = self.errors = 0
+
+    def hedge_delay_ms(self) -> float:
+        if len(self.latencies) < 20: return EXCHANGE_HEDGE_DEFAULT_MS
+        ordered = sorted(self.latencies)
+        q = ordered[min(len(ordered) - 1, int(EXCHANGE_HEDGE_QUANTILE * len(ordered)))]
+        return min(EXCHANGE_HEDGE_MAX_MS, max(EXCHANGE_HEDGE_MIN_MS, q))
+
+
+class HedgedBackend(ExchangeBackend):
+    """
+    One exchange behind a primary backend and optional mirrors. A call goes to the first endpoint
+    whose breaker allows it; if that hasn't answered after its adaptive hedge delay (or fails), the
+    next endpoint gets the same call, and the first result wins (the others are cancelled).
+    Attributes it doesn't define (stats, advance, client, ...) are the primary's.
+    """
+
+    def __init__(self, primary: ExchangeBackend, mirrors: Optional[List[ExchangeBackend]] = None):
+        self.primary = primary
+        self.id = primary.id
+        self.endpoints = [_Endpoint(primary, primary.id)] + [
+            _Endpoint(m, f"{m.id}~mirror{i + 1}") for i, m in enumerate(mirrors or [])]
+        self.page_limit = min(e.backend.page_limit for e in self.endpoints)
+        self.rate_limit_per_s = primary.rate_limit_per_s
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "rejected": 0}
+
+    def __getattr__(self, name):
+        if name == "primary": raise AttributeError(name)
+        return getattr(self.primary, name)
+
+    def milliseconds(self, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> int:
+        return self.primary.milliseconds(symbol, timeframe)
+
+    async def _call(self, endpoint: _Endpoint, symbol, timeframe, since, limit):
+        endpoint.calls += 1
+        t0 = time.perf_counter()
+        try:
+            rows = await endpoint.backend.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+        except (asyncio.CancelledError, RateLimitExceeded):
+            endpoint.breaker.release()
+            raise
+        except (NetworkError, asyncio.TimeoutError, OSError):
+            endpoint.errors += 1
+            endpoint.breaker.record_failure()
+            raise
+        except Exception:
+            endpoint.breaker.release()  # bad symbol etc.: not the endpoint's health
+            raise
+        endpoint.latencies.append((time.perf_counter() - t0) * 1000.0)
+        endpoint.breaker.record_success()
+        return rows
+
+    async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+        pending: Dict["asyncio.Future", _Endpoint] = {}
+        spare, error = list(self.endpoints), None
+
+        def launch() -> Optional[_Endpoint]:
+            # Ask a breaker only when its endpoint actually gets the call: allow() on a half-open
+            # breaker takes its single probe slot, which only the call's own outcome gives back.
+            while spare:
+                endpoint = spare.pop(0)
+                if endpoint.breaker.allow():
+                    pending[asyncio.ensure_future(self._call(endpoint, symbol, timeframe, since, limit))] = endpoint
+                    return endpoint
+            return None
+
+        first = launch()
+        if first is None:
+            self.counters["rejected"] += 1
+            raise CircuitOpen(f"{self.id}: circuit open on every endpoint")
+        self.counters["calls"] += 1
+        delay_ms = first.hedge_delay_ms()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(list(pending), timeout=delay_ms / 1000.0 if spare else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:  # slow answer: hedge to the next endpoint
+                    if launch(): self.counters["hedged"] += 1
+                    continue
+                for fut in done:
+                    endpoint = pending.pop(fut)
+                    if fut.exception() is None:
+                        endpoint.wins += 1
+                        if endpoint is not first: self.counters["hedge_wins"] += 1
+                        return fut.result()
+                    error = fut.exception()
+                if spare and (not pending or isinstance(error, (NetworkError, asyncio.TimeoutError, OSError))):
+                    if launch(): self.counters["failovers"] += 1
+            raise error
+        finally:
+            for fut in pending: fut.cancel()
+
+    def health(self) -> Dict[str, Any]:
+        return {**self.counters, "endpoints": [
+            {"name": e.name, "breaker": e.breaker.state, "consecutive_failures": e.breaker.failures, "trips": e.breaker.trips,
+             "calls": e.calls, "wins": e.wins, "errors": e.errors, "hedge_delay_ms": round(e.hedge_delay_ms(), 1)}
+            for e in self.endpoints]}
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.backend.close()
+
+
+def write_replay_file(path: Path, rows: List[List[float]]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        for r in rows:
+            writer.writerow([int(r[0]), *r[1:6]])
+
+
+# --- Registry used by the fetch layer ---
+_BACKENDS: Dict[str, ExchangeBackend] = {}
+
+
+def _parse_latency(spec: str) -> Tuple[float, float]:
+    parts = [float(p) for p in spec.split(',') if p.strip()]
+    return (parts[0], parts[-1]) if parts else (0.0, 0.0)
+
+
+def _create_single(exchange_id: str, kind: str, config: Optional[Dict[str, Any]] = None) -> ExchangeBackend:
+    if kind == "replay":
+        opts = {"latency_ms": REPLAY_LATENCY_MS, "rate_limit": REPLAY_RATE_LIMIT, "error_rate": REPLAY_ERROR_RATE,
+                "seed": int(REPLAY_SEED) if REPLAY_SEED else None, "tail": REPLAY_TAIL, **(config or {})}
+        for key in ("latency_ms", "tail"):
+            if isinstance(opts[key], str): opts[key] = _parse_latency(opts[key])
+        return ReplayBackend(exchange_id, REPLAY_DATA_DIR, **opts)
+    if kind == "ccxt":
+        return CcxtBackend(exchange_id, config)
+    raise ValueError(f"Unknown EXCHANGE_BACKEND '{kind}'.")
+
+
+def _mirror_configs(exchange_id: str) -> List[Dict[str, Any]]:
+    if not EXCHANGE_MIRRORS: return []
+    try:
+        return list(json.loads(EXCHANGE_MIRRORS).get(exchange_id, []))
+    except (ValueError, AttributeError) as e:
+        print(f"!!! EXCHANGE_MIRRORS is not a JSON object of lists: {e}")
+        return []
+
+
+def create_backend(exchange_id: str, kind: Optional[str] = None) -> ExchangeBackend:
+    kind = (kind or os.getenv("EXCHANGE_BACKEND", EXCHANGE_BACKEND)).lower()
+    primary = _create_single(exchange_id, kind)
+    if not EXCHANGE_RESILIENCE: return primary
+    return HedgedBackend(primary, [_create_single(exchange_id, kind, cfg) for cfg in _mirror_configs(exchange_id)])
+
+
+def get_backend(exchange_id: str) -> ExchangeBackend:
+    exchange_id = exchange_id.lower()
+    if exchange_id not in _BACKENDS:
+        _BACKENDS[exchange_id] = create_backend(exchange_id)
+    return _BACKENDS[exchange_id]
+
+
+def set_backend(exchange_id: str, backend: ExchangeBackend):
+    """Installs a backend instance explicitly (load tests, benchmarks)."""
+    _BACKENDS[exchange_id.lower()] = backend
+
+
+def backend_health() -> Dict[str, Any]:
+    """Breaker state, hedging counters and hedge delays of every hedged backend in use."""
+    return {name: b.health() for name, b in _BACKENDS.items() if isinstance(b, HedgedBackend)}
+
+
+async def close_backends():
+    for backend in list(_BACKENDS.values()):
+        try:
+            await backend.close()
+        except Exception as e:
+            print(f"!!! Error closing exchange backend {backend.id}: {e}")
+    _BACKENDS.clear()
+
+
+async def record(exchange_id: str, symbol: str, timeframe: str, bars: int, data_dir: str = REPLAY_DATA_DIR) -> Path:
+    """Records the last `bars` candles from the live exchange into a replay file."""
+    backend = CcxtBackend(exchange_id)
+    tf_ms = timeframe_to_ms(timeframe)
+    cursor = backend.client.milliseconds() - bars * tf_ms
+    rows: Dict[int, List[float]] = {}
+    try:
+        while len(rows) < bars:
+            page = await backend.fetch_ohlcv(symbol, timeframe, since=cursor, limit=backend.page_limit)
+            if not page: break
+            for r in page: rows[int(r[0])] = r
+            next_cursor = int(page[-1][0]) + tf_ms
+            if next_cursor <= cursor: break
+            cursor = next_cursor
+    finally:
+        await backend.close()
+    path = ReplayBackend(exchange_id, data_dir).path_for(symbol, timeframe)
+    write_replay_file(path, [rows[k] for k in sorted(rows)])
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 5 and sys.argv[1] == "record":
+        out = asyncio.run(record(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]) if len(sys.argv) > 5 else 1000))
+        print(f"Recorded {out}")
+    else:
+        print("usage: python -m api.exchanges record <exchange> <symbol> <timeframe> [bars]")
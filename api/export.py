@@ -0,0 +1,178 @@
+# api/export.py
+"""
+Bulk export of candles plus strategy indicator columns as Arrow IPC or Parquet.
+
+The history is read in chunks of chunk_bars candles (from the local candle store, or one
+fetched frame), every requested strategy adds its indicator columns to the chunk, and each
+chunk goes out as one Arrow record batch or Parquet row group before the next is read. Server
+memory therefore depends on chunk_bars and not on the length of the history.
+
+Columns carry the names the strategies use (SMA_20, MACD_12_26_9, SUPERTd_10_3.0, ...).
+Modules with get_streaming_indicators() carry their state across chunks, so their values are
+identical to a single pass. The others recompute on their required lookback plus the chunk;
+that warm-up is the same one live signals use. A column produced by several modules is kept once.
+
+    python -m api.export okx BTC-USDT-SWAP 1h btc_1h.parquet --strategies sma_crossover_strategy,macd_trend_strategy
+
+pyarrow is optional; without it the export is unavailable.
+"""
+import io
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Dict, Any, Optional, Iterator, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+from api.market_data import OHLCV_COLUMNS, ohlcv_to_dataframe, required_bars
+
+DEFAULT_EXPORT_CHUNK_BARS = 100_000
+FORMATS = {"arrow": "application/vnd.apache.arrow.stream", "parquet": "application/vnd.apache.parquet"}
+STRATEGY_DIR = Path(__file__).resolve().parent / "strategies"
+
+
+def iter_store_chunks(store, exchange: str, symbol: str, timeframe: str, since: Optional[int] = None,
+                      until: Optional[int] = None, chunk_bars: int = DEFAULT_EXPORT_CHUNK_BARS) -> Iterator[pd.DataFrame]:
+    """Consecutive candle frames of at most chunk_bars rows, oldest first."""
+    cursor = since or 0
+    while True:
+        rows = store.read(exchange, symbol, timeframe, since=cursor, until=until, limit=chunk_bars)
+        if not rows: return
+        yield ohlcv_to_dataframe(rows)
+        if len(rows) < chunk_bars: return
+        cursor = int(rows[-1][0]) + 1
+
+
+def iter_frame_chunks(df: pd.DataFrame, chunk_bars: int = DEFAULT_EXPORT_CHUNK_BARS) -> Iterator[pd.DataFrame]:
+    for lo in range(0, len(df), max(1, chunk_bars)):
+        yield df.iloc[lo:lo + chunk_bars]
+
+
+class _ModuleColumns:
+    """Indicator columns of one module, chunk after chunk."""
+
+    def __init__(self, module, params: Dict[str, Any], timeframe: str):
+        self.module, self.params = module, params
+        self.streaming = None
+        if hasattr(module, 'get_streaming_indicators'):
+            try:
+                self.streaming = module.get_streaming_indicators(params)
+            except ValueError:  # no streaming form for these params
+                pass
+        self.warmup = 0 if self.streaming is not None else required_bars(module, params, timeframe=timeframe)
+        self._tail: Optional[pd.DataFrame] = None
+
+    def columns(self, chunk: pd.DataFrame) -> Dict[str, np.ndarray]:
+        if self.streaming is not None:
+            data = {c: chunk[c].to_numpy(np.float64) for c in OHLCV_COLUMNS[1:]}
+            data['timestamp'] = chunk['timestamp'].to_numpy(np.int64)
+            return {name: ind(data) for name, ind in self.streaming.items()}
+        frame = chunk[OHLCV_COLUMNS] if self._tail is None else pd.concat([self._tail, chunk[OHLCV_COLUMNS]])
+        offset = 0 if self._tail is None else len(self._tail)
+        self._tail = frame.iloc[-self.warmup:] if self.warmup else None
+        out = self.module.calculate_strategy_indicators(frame.copy(), self.params)
+        return {c: out[c].to_numpy()[offset:] for c in out.columns if c not in OHLCV_COLUMNS}
+
+
+def iter_indicator_frames(modules: Dict[str, Tuple[Any, Dict[str, Any]]], chunks: Iterable[pd.DataFrame],
+                          timeframe: str) -> Iterator[pd.DataFrame]:
+    """Candle chunks with the indicator columns of every (module, params) added; the columns are fixed by the first chunk."""
+    producers = [_ModuleColumns(module, params, timeframe) for module, params in modules.values()]
+    names: Optional[List[str]] = None
+    for chunk in chunks:
+        if chunk.empty: continue
+        cols: Dict[str, np.ndarray] = {'timestamp': chunk['timestamp'].to_numpy(np.int64)}
+        cols.update({c: chunk[c].to_numpy(np.float64) for c in OHLCV_COLUMNS[1:]})
+        for producer in producers:
+            for name, values in producer.columns(chunk).items():
+                if name in cols: continue
+                values = np.asarray(values)
+                if values.dtype.kind in "biuf": cols[name] = values.astype(np.float64)
+        if names is None: names = list(cols)
+        yield pd.DataFrame({n: cols.get(n, np.full(len(chunk), np.nan)) for n in names})
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands written bytes to the response instead of keeping them."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def stream_export(frames: Iterable[pd.DataFrame], fmt: str = "arrow") -> Iterator[bytes]:
+    """Arrow IPC stream (one record batch per frame) or Parquet file (one row group per frame), as byte chunks."""
+    if not PYARROW_AVAILABLE: raise RuntimeError("pyarrow is not installed")
+    if fmt not in FORMATS: raise ValueError(f"format must be one of {list(FORMATS)}")
+    sink, writer, schema = _Sink(), None, None
+    for frame in frames:
+        batch = pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False)
+        if writer is None:
+            schema = batch.schema
+            writer = pa.ipc.new_stream(sink, schema) if fmt == "arrow" else pq.ParquetWriter(sink, schema)
+        if fmt == "arrow": writer.write_batch(batch)
+        else: writer.write_table(pa.Table.from_batches([batch]))
+        yield sink.drain()
+    if writer is None:  # no candles: still a valid, empty file
+        schema = pa.schema([('timestamp', pa.int64())] + [(c, pa.float64()) for c in OHLCV_COLUMNS[1:]])
+        writer = pa.ipc.new_stream(sink, schema) if fmt == "arrow" else pq.ParquetWriter(sink, schema)
+    writer.close()
+    yield sink.drain()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export candles + strategy indicator columns from the candle store.")
+    parser.add_argument("exchange"); parser.add_argument("symbol"); parser.add_argument("timeframe"); parser.add_argument("output")
+    parser.add_argument("--strategies", default="", help="Comma separated strategy modules.")
+    parser.add_argument("--params", default="{}", help='JSON {"module": {params}} (normalized against STRATEGY_PARAMS_UI).')
+    parser.add_argument("--format", choices=list(FORMATS), help="Default: from the output suffix.")
+    parser.add_argument("--since", type=int); parser.add_argument("--until", type=int)
+    parser.add_argument("--chunk-bars", type=int, default=DEFAULT_EXPORT_CHUNK_BARS)
+    parser.add_argument("--db")
+    args = parser.parse_args()
+
+    from api.plugins import load_strategy_module
+    from api.params import normalize_params
+    from api.candle_store import CandleStore, DEFAULT_CANDLE_DB
+    raw_params = json.loads(args.params)
+    modules = {}
+    for name in filter(None, (s.strip() for s in args.strategies.split(","))):
+        mod = load_strategy_module(name, str(STRATEGY_DIR / f"{name}.py"))
+        if mod is None: sys.exit(f"!!! Could not load strategy {name}")
+        modules[name] = (mod, normalize_params(mod, raw_params.get(name)))
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "arrow")
+    store = CandleStore(args.db or DEFAULT_CANDLE_DB)
+    try:
+        chunks = iter_store_chunks(store, args.exchange, args.symbol, args.timeframe, args.since, args.until, args.chunk_bars)
+        with open(args.output, "wb") as f:
+            for part in stream_export(iter_indicator_frames(modules, chunks, args.timeframe), fmt):
+                f.write(part)
+    finally:
+        store.close()
+    print(f"--- Wrote {args.output} ({fmt})")
@@ -0,0 +1,369 @@
+# api/indicators.py
+"""
+Stateful (streaming) indicators for chunked processing.
+
+Each indicator consumes a chunk as a mapping of float64 arrays ('open', 'high', 'low',
+'close', 'volume') and returns one output array for it. Whatever the next chunk needs is
+kept on the instance: EMA seeds and last values, RMA weight sums, the tail of a rolling window, the
+previous close, Supertrend bands and direction. Feeding a series in any number of chunks
+gives bit-identical output to feeding it at once.
+
+Recursive indicators step through the values in Python, in order. Rolling windows are
+reduced per window over a sliding view, so each output depends only on its own window.
+
+Strategy plugins expose these through an optional get_streaming_indicators(params) that
+returns {column name: indicator}, mirroring the columns calculate_strategy_indicators adds.
+
+For parameter sweeps, sma_many/rolling_max_many/rolling_min_many/ema_many compute one
+indicator for a whole vector of lengths in one pass and return a (lengths x bars)
+matrix. Plugins expose them through an optional get_sweep_columns(df, params_list).
+"""
+import math
+from typing import Dict, Optional, Mapping, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+Chunk = Mapping[str, np.ndarray]
+
+
+class Indicator:
+    """Base class: __call__ memoizes the output for the current chunk so derived indicators can share inputs."""
+    source = "close"
+
+    def __init__(self):
+        self._chunk = None
+        self._out = None
+
+    def __call__(self, chunk: Chunk) -> np.ndarray:
+        if chunk is not self._chunk:
+            self._out = self.update(chunk)
+            self._chunk = chunk
+        return self._out
+
+    def update(self, chunk: Chunk) -> np.ndarray:
+        raise NotImplementedError
+
+    def _input(self, chunk: Chunk) -> np.ndarray:
+        src = self.source
+        return src(chunk) if isinstance(src, Indicator) else np.asarray(chunk[src], dtype=np.float64)
+
+
+class _Smoothing(Indicator):
+    """Exponential smoothing seeded with the SMA of the first `length` valid inputs (pandas_ta presma style)."""
+
+    def __init__(self, length: int, alpha: float, source="close"):
+        super().__init__()
+        self.length, self.alpha, self.source = int(length), alpha, source
+        self._seen = 0
+        self._seed_sum = 0.0
+        self._last = math.nan
+
+    def update(self, chunk):
+        x = self._input(chunk)
+        out = np.full(len(x), np.nan)
+        a, b, n = self.alpha, 1.0 - self.alpha, self.length
+        seen, seed_sum, last = self._seen, self._seed_sum, self._last
+        for i, v in enumerate(x.tolist()):
+            if v != v:  # NaN input (e.g. the first change of RSI) does not count towards the seed
+                continue
+            if seen < n:
+                seed_sum += v
+                seen += 1
+                if seen == n:
+                    last = seed_sum / n
+                    out[i] = last
+                continue
+            last = a * v + b * last
+            out[i] = last
+        self._seen, self._seed_sum, self._last = seen, seed_sum, last
+        return out
+
+
+class EMA(_Smoothing):
+    def __init__(self, length: int, source="close"):
+        super().__init__(length, 2.0 / (int(length) + 1), source)
+
+
+class RMA(Indicator):
+    """Wilder's moving average as pandas_ta computes it: ewm(alpha=1/length, adjust=True, min_periods=length).
+
+    Not SMA-seeded; every input since the first keeps a (decaying) weight, so the running
+    weighted mean and its weight sum are carried across chunks, step for step with pandas' ewm.
+    """
+
+    def __init__(self, length: int, source="close"):
+        super().__init__()
+        self.length, self.alpha, self.source = int(length), 1.0 / int(length), source
+        self._mean = math.nan
+        self._weight = 1.0
+        self._seen = 0
+
+    def update(self, chunk):
+        x = self._input(chunk)
+        out = np.full(len(x), np.nan)
+        b, n = 1.0 - self.alpha, self.length
+        mean, weight, seen = self._mean, self._weight, self._seen
+        for i, v in enumerate(x.tolist()):
+            valid = v == v
+            if mean == mean:
+                weight *= b  # NaN inputs still decay the old weight (ignore_na=False)
+                if valid:
+                    if mean != v: mean = (weight * mean + v) / (weight + 1.0)
+                    weight += 1.0
+            elif valid:
+                mean = v
+            seen += valid
+            if seen >= n: out[i] = mean
+        self._mean, self._weight, self._seen = mean, weight, seen
+        return out
+
+
+class Rolling(Indicator):
+    """Rolling mean/max/min/std over `length` bars; carries the last length-1 inputs."""
+    _REDUCERS = {"mean": lambda w: w.mean(axis=1), "max": lambda w: w.max(axis=1),
+                 "min": lambda w: w.min(axis=1), "std": lambda w: w.std(axis=1), "sum": lambda w: w.sum(axis=1)}
+
+    def __init__(self, length: int, how: str = "mean", source="close"):
+        super().__init__()
+        if how not in self._REDUCERS: raise ValueError(f"Unknown rolling reducer '{how}'")
+        self.length, self.how, self.source = int(length), how, source
+        self._tail = np.empty(0)
+
+    def update(self, chunk):
+        x = self._input(chunk)
+        buf = np.concatenate([self._tail, x])
+        out = np.full(len(x), np.nan)
+        if len(buf) >= self.length:
+            res = self._REDUCERS[self.how](sliding_window_view(buf, self.length))
+            first = self.length - 1 - len(self._tail)  # chunk index of the first complete window
+            out[max(first, 0):] = res[max(-first, 0):]
+        self._tail = buf[-(self.length - 1):] if self.length > 1 else np.empty(0)
+        return out
+
+
+SMA = Rolling
+
+
+class Change(Indicator):
+    """close[i] - close[i-1] (NaN for the very first bar)."""
+
+    def __init__(self, source="close"):
+        super().__init__()
+        self.source = source
+        self._prev = math.nan
+
+    def update(self, chunk):
+        x = self._input(chunk)
+        prev = np.concatenate([[self._prev], x[:-1]])
+        if len(x): self._prev = float(x[-1])
+        return x - prev
+
+
+class TrueRange(Indicator):
+    """max(high - low, |high - prev close|, |prev close - low|); NaN for the very first bar, like pandas_ta."""
+
+    def __init__(self):
+        super().__init__()
+        self._prev_close = math.nan
+        self._started = False
+
+    def update(self, chunk):
+        high, low, close = (np.asarray(chunk[k], dtype=np.float64) for k in ("high", "low", "close"))
+        prev_close = np.concatenate([[self._prev_close], close[:-1]])
+        if len(close): self._prev_close = float(close[-1])
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        if len(tr) and not self._started:
+            tr[0] = np.nan
+            self._started = True
+        return tr
+
+
+class ATR(RMA):
+    def __init__(self, length: int):
+        super().__init__(length, source=TrueRange())
+
+
+class _Clip(Indicator):
+    def __init__(self, source: Indicator, sign: float):
+        super().__init__()
+        self.source, self.sign = source, sign
+
+    def update(self, chunk):
+        x = self._input(chunk) * self.sign
+        return np.where(np.isnan(x), np.nan, np.maximum(x, 0.0))
+
+
+class RSI(Indicator):
+    def __init__(self, length: int, source="close"):
+        super().__init__()
+        change = Change(source)
+        self.gain, self.loss = RMA(length, _Clip(change, 1.0)), RMA(length, _Clip(change, -1.0))
+
+    def update(self, chunk):
+        gain, loss = self.gain(chunk), self.loss(chunk)
+        total = gain + loss
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return 100.0 * gain / total  # NaN while both averages are 0, as in pandas_ta
+
+
+class Supertrend(Indicator):
+    """Supertrend line; .direction is a view onto the matching +1/-1 direction series.
+
+    Follows pandas_ta's loop: direction starts at +1 (also through the ATR warm-up), flips when
+    the close crosses the previous bar's band, and otherwise keeps ratcheting the active band.
+    The line is 0 on the very first bar and NaN until the ATR is valid.
+    """
+
+    def __init__(self, length: int, multiplier: float):
+        super().__init__()
+        self.atr, self.multiplier = ATR(length), float(multiplier)
+        self._upper = self._lower = math.nan
+        self._dir = 1
+        self._started = False
+        self._direction = np.empty(0)
+        self.direction = _View(self, "_direction")
+
+    def update(self, chunk):
+        high, low, close = (np.asarray(chunk[k], dtype=np.float64) for k in ("high", "low", "close"))
+        atr = self.multiplier * self.atr(chunk)
+        hl2 = (high + low) / 2.0
+        basic_upper, basic_lower = (hl2 + atr).tolist(), (hl2 - atr).tolist()
+        trend, direction = np.full(len(close), np.nan), np.ones(len(close))
+        upper, lower, d = self._upper, self._lower, self._dir
+        for i, c in enumerate(close.tolist()):
+            bu, bl = basic_upper[i], basic_lower[i]
+            if not self._started:
+                self._started = True
+                trend[i], upper, lower = 0.0, bu, bl
+                continue
+            if c > upper: d = 1
+            elif c < lower: d = -1
+            else:
+                if d > 0 and bl < lower: bl = lower
+                if d < 0 and bu > upper: bu = upper
+            trend[i] = bl if d > 0 else bu
+            direction[i] = d
+            upper, lower = bu, bl
+        self._upper, self._lower, self._dir = upper, lower, d
+        self._direction = direction
+        return trend
+
+
+class _View(Indicator):
+    """Secondary output of a multi-output indicator."""
+
+    def __init__(self, parent: Indicator, attr: str):
+        super().__init__()
+        self.parent, self.attr = parent, attr
+
+    def update(self, chunk):
+        self.parent(chunk)
+        return getattr(self.parent, self.attr)
+
+
+class Midpoint(Indicator):
+    def __init__(self, a: Indicator, b: Indicator):
+        super().__init__()
+        self.a, self.b = a, b
+
+    def update(self, chunk):
+        return (self.a(chunk) + self.b(chunk)) / 2.0
+
+
+def run_once(indicators: Dict[str, Indicator], chunk: Chunk) -> Dict[str, np.ndarray]:
+    """Evaluates every indicator on one chunk (the in-memory case is a single chunk)."""
+    return {name: ind(chunk) for name, ind in indicators.items()}
+
+
+# --- Many lengths in one pass (parameter sweeps) ---
+def _lengths(lengths: Sequence[int]) -> np.ndarray:
+    out = np.asarray(lengths, dtype=np.int64).ravel()
+    if out.size and out.min() < 1: raise ValueError("lengths must be >= 1")
+    return out
+
+
+def sma_many(x: np.ndarray, lengths: Sequence[int]) -> np.ndarray:
+    """Rolling means for every length from a single cumulative sum (NaN for windows with a NaN, like pandas)."""
+    x = np.asarray(x, dtype=np.float64)
+    lengths = _lengths(lengths)
+    n = len(x)
+    out = np.full((len(lengths), n), np.nan)
+    if n == 0: return out
+    nan = np.isnan(x)
+    offset = float(x[~nan][0]) if (~nan).any() else 0.0  # keeps the running sum small for large prices
+    csum = np.concatenate([[0.0], np.cumsum(np.where(nan, 0.0, x - offset))])
+    nans = np.concatenate([[0], np.cumsum(nan)])
+    for r, length in enumerate(lengths.tolist()):
+        if length > n: continue
+        window = (csum[length:] - csum[:-length]) / length + offset
+        out[r, length - 1:] = np.where(nans[length:] - nans[:-length] > 0, np.nan, window)
+    return out
+
+
+def _rolling_extreme_many(x: np.ndarray, lengths: Sequence[int], op) -> np.ndarray:
+    """Sparse table: level k holds op over windows of 2**k, so any window is op of two overlapping levels."""
+    x = np.asarray(x, dtype=np.float64)
+    lengths = _lengths(lengths)
+    n = len(x)
+    out = np.full((len(lengths), n), np.nan)
+    if n == 0 or not lengths.size: return out
+    nans = np.concatenate([[0], np.cumsum(np.isnan(x))])
+    levels = [x]
+    top = int(np.log2(max(1, min(int(lengths.max()), n))))
+    for k in range(1, top + 1):
+        prev, half = levels[-1], 1 << (k - 1)
+        levels.append(op(prev[:-half], prev[half:]))  # windows [i, i + 2**k)
+    for r, length in enumerate(lengths.tolist()):
+        if length > n: continue
+        k = int(np.log2(length))
+        level, span = levels[k], 1 << k
+        starts = np.arange(n - length + 1)
+        window = op(level[starts], level[starts + length - span])
+        out[r, length - 1:] = np.where(nans[length:] - nans[:-length] > 0, np.nan, window)
+    return out
+
+
+def rolling_max_many(x: np.ndarray, lengths: Sequence[int]) -> np.ndarray:
+    return _rolling_extreme_many(x, lengths, np.maximum)
+
+
+def rolling_min_many(x: np.ndarray, lengths: Sequence[int]) -> np.ndarray:
+    return _rolling_extreme_many(x, lengths, np.minimum)
+
+
+def ema_many(x: np.ndarray, lengths: Sequence[int], block: int = 32) -> np.ndarray:
+    """
+    SMA-seeded EMAs (as EMA above / pandas_ta) for every length, fused over the lengths.
+    The recursion y[t] = b*y[t-1] + a*x[t] is solved inside every `block`-bar block at once
+    as one batched matrix product (powers of b up to `block` only, so it stays stable);
+    only the block-end values are then carried forward bar block by bar block. The seed
+    enters as the input of its own bar. Inputs are expected without gaps (NaN).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    lengths = _lengths(lengths)
+    n, m = len(x), len(lengths)
+    out = np.full((m, n), np.nan)
+    if n == 0 or m == 0: return out
+    alpha = 2.0 / (lengths + 1.0)
+    beta = 1.0 - alpha
+    start = lengths - 1
+    valid = np.flatnonzero(start < n)
+    nb = -(-n // block)
+    u = np.zeros((m, nb * block))
+    u[:, :n] = x
+    u[:, :n][np.arange(n)[None, :] < start[:, None]] = 0.0
+    u[valid, start[valid]] = sma_many(x, lengths[valid])[np.arange(len(valid)), start[valid]] / alpha[valid]
+    k = np.arange(block)
+    diff = k[:, None] - k[None, :]
+    # transfer[l, j, i] = a * b**(i - j) for i >= j: input j of a block -> output i of the same block
+    transfer = np.where(diff.T >= 0, beta[:, None, None] ** np.clip(diff.T, 0, None), 0.0) * alpha[:, None, None]
+    local = np.matmul(u.reshape(m, nb, block), transfer)  # (m, nb, block), blocks started from zero
+    carried = np.zeros((m, nb))                             # y just before each block
+    decay = beta ** block
+    for j in range(1, nb):
+        carried[:, j] = local[:, j - 1, -1] + decay * carried[:, j - 1]
+    y = local + (beta[:, None] ** (k[None, :] + 1))[:, None, :] * carried[:, :, None]
+    out[:] = y.reshape(m, nb * block)[:, :n]
+    out[np.arange(n)[None, :] < start[:, None]] = np.nan
+    return out
@@ -0,0 +1,402 @@
+# api/jobs.py
+"""
+Persistent batch jobs: universe scans, parameter sweeps and backtests too long for one request.
+
+A job is a batch of tasks, each one (exchange, symbol, timeframe, strategy, params) plus a kind:
+    signal    indicators + run_strategy on the required lookback -> the signal on the last bar
+    backtest  api.backtest.run_backtest over the last `bars` candles -> performance summary
+Jobs and tasks live in SQLite (WAL), so a restart loses nothing. Workers claim tasks with a
+lease (owner, expiry) inside one write transaction. A task whose worker died goes back to the
+queue when its lease expires, and failed tasks are retried up to JOB_MAX_ATTEMPTS times. Every
+finished task gets the job's next finish_order, so results can be paged or followed as a stream
+with an "after" cursor.
+
+Workers claim a batch (prefetch) and renew the leases of what they hold with a heartbeat, so a
+lease can be short and still cover a long task. A task counts as an attempt only once its
+worker starts it. Until then it can be stolen: a worker that finds the queue empty takes
+unstarted tasks leased to other workers, newest first. That keeps a big prefetch on a slow or
+busy worker from idling the others.
+
+JobRunner is the worker pool used both by the API (in-process) and by worker.py (separate
+processes or machines sharing the database). Candles are fetched on the event loop and the
+computation runs in a thread.
+"""
+import os
+import json
+import math
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Tuple
+
+DEFAULT_JOBS_DB = os.getenv("JOBS_DB", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "jobs.db"))
+# Lease length; holders renew every third of it, so a task returns to the queue about this long after its worker died
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_BACKTEST_BARS = int(os.getenv("JOB_BACKTEST_BARS", "2000"))
+TASK_KINDS = ("signal", "backtest")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT    PRIMARY KEY,
+    status       TEXT    NOT NULL,
+    total        INTEGER NOT NULL,
+    done         INTEGER NOT NULL DEFAULT 0,
+    failed       INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL    NOT NULL,
+    started_at   REAL,
+    finished_at  REAL,
+    meta         TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id        TEXT    NOT NULL,
+    seq           INTEGER NOT NULL,
+    payload       TEXT    NOT NULL,
+    status        TEXT    NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    error         TEXT,
+    finish_order  INTEGER,
+    finished_at   REAL,
+    started_at    REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_claim ON tasks (status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks (job_id, finish_order);
+"""
+
+
+def _clean(obj):
+    """NaN/inf -> None, recursively, so results are valid JSON."""
+    if isinstance(obj, float): return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict): return {k: _clean(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)): return [_clean(v) for v in obj]
+    if hasattr(obj, 'item'): return _clean(obj.item())  # numpy scalars
+    return obj
+
+
+def new_owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """SQLite-backed job and task queue; safe to share between processes (each opens its own connection)."""
+
+    def __init__(self, db_path: str = DEFAULT_JOBS_DB, lease_s: float = JOB_LEASE_S, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.db_path, self.lease_s, self.max_attempts = str(db_path), lease_s, max_attempts
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if "started_at" not in {r[1] for r in self._conn.execute("PRAGMA table_info(tasks)")}:  # db from before work stealing
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN started_at REAL")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, fn):
+        """Runs fn(conn) in one IMMEDIATE transaction (serialized against other processes)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return out
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # --- producer side ---
+    def submit(self, tasks: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> str:
+        job_id = uuid.uuid4().hex[:16]
+        now = time.time()
+
+        def fn(conn):
+            conn.execute("INSERT INTO jobs (id, status, total, created_at, meta) VALUES (?,?,?,?,?)",
+                         (job_id, "queued" if tasks else "done", len(tasks), now, json.dumps(meta or {})))
+            conn.executemany("INSERT INTO tasks (job_id, seq, payload, status) VALUES (?,?,?,'queued')",
+                             [(job_id, i, json.dumps(t)) for i, t in enumerate(tasks)])
+        self._write(fn)
+        return job_id
+
+    def cancel(self, job_id: str) -> int:
+        """Drops the job's queued tasks (leased ones finish). Returns how many were dropped."""
+        def fn(conn):
+            n = conn.execute("UPDATE tasks SET status='cancelled' WHERE job_id=? AND status='queued'", (job_id,)).rowcount
+            conn.execute("UPDATE jobs SET status='cancelled', finished_at=? WHERE id=? AND status IN ('queued','running')",
+                         (time.time(), job_id))
+            return n
+        return self._write(fn)
+
+    # --- worker side ---
+    def claim(self, owner: str, n: int = 1) -> List[Tuple[int, Dict[str, Any]]]:
+        """Leases up to n queued (or lease-expired) tasks to `owner`: [(task id, payload)]. Call start() before running one."""
+        now = time.time()
+
+        def fn(conn):
+            # A task whose worker died on its last attempt (e.g. it crashes the process) fails here
+            # instead of being leased out again forever.
+            for r in conn.execute("SELECT id, attempts FROM tasks WHERE status='leased' AND lease_expires < ? "
+                                  "AND attempts >= ?", (now, self.max_attempts)).fetchall():
+                self._finish(conn, r["id"], "failed", None, f"lease expired after {r['attempts']} attempt(s); worker lost")
+            rows = conn.execute("SELECT id, job_id, payload FROM tasks WHERE status='queued' "
+                                "OR (status='leased' AND lease_expires < ?) ORDER BY id LIMIT ?", (now, n)).fetchall()
+            if not rows: return []
+            ids = [r["id"] for r in rows]
+            marks = ",".join("?" * len(ids))
+            conn.execute(f"UPDATE tasks SET status='leased', lease_owner=?, lease_expires=?, started_at=NULL "
+                         f"WHERE id IN ({marks})", [owner, now + self.lease_s, *ids])
+            jobs = sorted({r["job_id"] for r in rows})
+            conn.execute(f"UPDATE jobs SET status='running', started_at=COALESCE(started_at, ?) "
+                         f"WHERE status='queued' AND id IN ({','.join('?' * len(jobs))})", [now, *jobs])
+            return [(r["id"], json.loads(r["payload"])) for r in rows]
+        return self._write(fn)
+
+    def steal(self, owner: str, n: int = 1) -> List[Tuple[int, Dict[str, Any]]]:
+        """Takes up to n tasks leased to other workers but not started yet (the newest, i.e. the tail of their batches)."""
+        now = time.time()
+
+        def fn(conn):
+            rows = conn.execute("SELECT id, payload FROM tasks WHERE status='leased' AND started_at IS NULL "
+                                "AND lease_owner != ? ORDER BY id DESC LIMIT ?", (owner, n)).fetchall()
+            if not rows: return []
+            ids = [r["id"] for r in rows]
+            conn.execute(f"UPDATE tasks SET lease_owner=?, lease_expires=? WHERE id IN ({','.join('?' * len(ids))})",
+                         [owner, now + self.lease_s, *ids])
+            return [(r["id"], json.loads(r["payload"])) for r in rows]
+        return self._write(fn)
+
+    def start(self, task_id: int, owner: str) -> bool:
+        """Marks a leased task as running (one attempt). False if `owner` no longer holds it (stolen or expired)."""
+        now = time.time()
+        return self._write(lambda conn: conn.execute(
+            "UPDATE tasks SET started_at=?, lease_expires=?, attempts=attempts+1 WHERE id=? AND status='leased' "
+            "AND lease_owner=?", (now, now + self.lease_s, task_id, owner)).rowcount == 1)
+
+    def renew(self, owner: str, task_ids: List[int]) -> List[int]:
+        """Heartbeat: extends the leases `owner` still holds among task_ids and returns those ids."""
+        if not task_ids: return []
+        now = time.time()
+
+        def fn(conn):
+            marks = ",".join("?" * len(task_ids))
+            conn.execute(f"UPDATE tasks SET lease_expires=? WHERE status='leased' AND lease_owner=? AND id IN ({marks})",
+                         [now + self.lease_s, owner, *task_ids])
+            return [r["id"] for r in conn.execute(f"SELECT id FROM tasks WHERE status='leased' AND lease_owner=? "
+                                                  f"AND id IN ({marks})", [owner, *task_ids])]
+        return self._write(fn)
+
+    def release(self, owner: str, task_ids: List[int]) -> int:
+        """Returns unstarted tasks held by `owner` to the queue (worker shutdown)."""
+        if not task_ids: return 0
+        marks = ",".join("?" * len(task_ids))
+        return self._write(lambda conn: conn.execute(
+            f"UPDATE tasks SET status='queued', lease_owner=NULL, lease_expires=NULL WHERE status='leased' "
+            f"AND started_at IS NULL AND lease_owner=? AND id IN ({marks})", [owner, *task_ids]).rowcount)
+
+    def _finish(self, conn, task_id: int, status: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> bool:
+        row = conn.execute("SELECT job_id, status FROM tasks WHERE id=?", (task_id,)).fetchone()
+        if row is None or row["status"] in ("done", "failed", "cancelled"): return False  # someone else finished it
+        job_id, now = row["job_id"], time.time()
+        job = conn.execute("SELECT done, failed, total FROM jobs WHERE id=?", (job_id,)).fetchone()
+        order = job["done"] + job["failed"] + 1
+        conn.execute("UPDATE tasks SET status=?, result=?, error=?, finish_order=?, finished_at=?, lease_owner=NULL, "
+                     "lease_expires=NULL WHERE id=?",
+                     (status, json.dumps(_clean(result)) if result is not None else None, error, order, now, task_id))
+        column = "done" if status == "done" else "failed"
+        conn.execute(f"UPDATE jobs SET {column}={column}+1 WHERE id=?", (job_id,))
+        if order >= job["total"]:
+            conn.execute("UPDATE jobs SET status=?, finished_at=? WHERE id=? AND status='running'",
+                         ("done" if job["failed"] + (status == "failed") == 0 else "finished_with_errors", now, job_id))
+        return True
+
+    def complete(self, task_id: int, result: Dict[str, Any]) -> bool:
+        return self._write(lambda conn: self._finish(conn, task_id, "done", result, None))
+
+    def fail(self, task_id: int, owner: str, error: str) -> bool:
+        """Requeues the task while it has attempts left, else records the failure (only while `owner` holds the lease)."""
+        def fn(conn):
+            row = conn.execute("SELECT attempts FROM tasks WHERE id=? AND status='leased' AND lease_owner=?",
+                               (task_id, owner)).fetchone()
+            if row is None: return False  # the lease expired and the task was claimed again
+            if row["attempts"] < self.max_attempts:
+                conn.execute("UPDATE tasks SET status='queued', error=?, lease_owner=NULL, lease_expires=NULL, "
+                             "started_at=NULL WHERE id=?",
+                             (error, task_id))
+                return True
+            return self._finish(conn, task_id, "failed", None, error)
+        return self._write(fn)
+
+    # --- readers ---
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None: return None
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM tasks WHERE job_id=? GROUP BY status",
+                                             (job_id,)).fetchall())
+        return self._progress(dict(row), counts)
+
+    def jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._progress(dict(r)) for r in rows]
+
+    @staticmethod
+    def _progress(job: Dict[str, Any], counts: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        finished = job["done"] + job["failed"]
+        end = job["finished_at"] or time.time()
+        elapsed = end - job["started_at"] if job["started_at"] else 0.0
+        rate = finished / elapsed if elapsed > 0 else None
+        out = {"job_id": job["id"], "status": job["status"], "total": job["total"], "done": job["done"],
+               "failed": job["failed"], "progress": round(finished / job["total"], 4) if job["total"] else 1.0,
+               "created_at": job["created_at"], "started_at": job["started_at"], "finished_at": job["finished_at"],
+               "elapsed_s": round(elapsed, 3), "tasks_per_s": round(rate, 3) if rate else None,
+               "eta_s": round((job["total"] - finished) / rate, 1) if rate and job["status"] == "running" else None,
+               "meta": json.loads(job["meta"] or "{}")}
+        if counts is not None: out["tasks"] = counts
+        return out
+
+    def results(self, job_id: str, after: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Finished tasks in completion order, after the `after` cursor (a finish_order)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, payload, status, result, error, attempts, finish_order FROM tasks "
+                "WHERE job_id=? AND finish_order > ? ORDER BY finish_order LIMIT ?", (job_id, after, limit)).fetchall()
+        return [{"cursor": r["finish_order"], "seq": r["seq"], "task": json.loads(r["payload"]), "status": r["status"],
+                 "attempts": r["attempts"], "result": json.loads(r["result"]) if r["result"] else None,
+                 "error": r["error"]} for r in rows]
+
+
+def task_bars(module, task: Dict[str, Any]) -> int:
+    """Candles a task needs: the strategy's lookback for a signal, `bars` for a backtest."""
+    from api.market_data import required_bars, MAX_HISTORY_BARS
+    if task.get("kind", "signal") == "backtest":
+        return min(int(task.get("bars") or JOB_BACKTEST_BARS), MAX_HISTORY_BARS)
+    return required_bars(module, task["params"], timeframe=task["timeframe"])
+
+
+def execute_task(module, task: Dict[str, Any], df) -> Dict[str, Any]:
+    """Runs one task on its candles (CPU only; no I/O)."""
+    kind, params = task.get("kind", "signal"), task["params"]
+    if df is None or df.empty: raise ValueError(f"No candles for {task['symbol']} {task['timeframe']}")
+    if kind == "signal":
+        out = module.calculate_strategy_indicators(df.copy(), params)
+        result = module.run_strategy(out, params, current_position_type=task.get("position"))
+        return {"bar_ts": int(df['timestamp'].iloc[-1]), "bars": len(df), **result}
+    if kind == "backtest":
+        from api.backtest import run_backtest, DEFAULT_FEE_BPS
+        return {"bars": len(df), **run_backtest(module, df, params, task["timeframe"],
+                                                fee_bps=float(task.get("fee_bps", DEFAULT_FEE_BPS)))}
+    raise ValueError(f"Unknown task kind '{kind}' (one of {TASK_KINDS})")
+
+
+class JobRunner:
+    """
+    `workers` coroutines running tasks from a JobQueue: fetch on the loop, compute in a thread.
+    Tasks are claimed `prefetch` at a time into a local buffer; a heartbeat renews the leases of
+    everything held (buffered or running), and an empty queue makes the runner steal from others.
+    """
+
+    def __init__(self, queue: JobQueue, modules: Dict[str, Any],
+                 fetch: Callable[[str, str, str, int], Awaitable[Any]], workers: int = 2,
+                 owner: Optional[str] = None, idle_s: float = 0.5, prefetch: Optional[int] = None, steal: bool = True):
+        self.queue, self.modules, self.fetch = queue, modules, fetch
+        self.workers, self.idle_s = max(1, workers), idle_s
+        self.prefetch, self.steal = max(1, prefetch or self.workers), steal
+        self.owner = owner or new_owner_id()
+        self._tasks: List[asyncio.Task] = []
+        self._buffer: "deque[Tuple[int, Dict[str, Any]]]" = deque()
+        self._held: set = set()
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self.completed = self.errors = self.stolen = self.lost = 0
+        self.idle_since: Optional[float] = None  # set while the queue had nothing to claim or steal
+
+    def start(self):
+        self._claim_lock = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks: task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        unstarted = [task_id for task_id, _ in self._buffer]
+        self._buffer.clear()
+        self._held.difference_update(unstarted)
+        if unstarted: await asyncio.to_thread(self.queue.release, self.owner, unstarted)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"owner": self.owner, "workers": self.workers, "prefetch": self.prefetch, "held": len(self._held),
+                "completed": self.completed, "errors": self.errors, "stolen": self.stolen, "lost": self.lost}
+
+    async def run_one(self, task_id: int, task: Dict[str, Any]):
+        try:
+            if not await asyncio.to_thread(self.queue.start, task_id, self.owner):
+                self.lost += 1  # stolen by an idle worker or the lease ran out
+                return
+            module = self.modules.get(task["strategy"])
+            if module is None: raise ValueError(f"Strategy '{task['strategy']}' not loaded")
+            df = await self.fetch(task.get("exchange", "okx"), task["symbol"], task["timeframe"], task_bars(module, task))
+            result = await asyncio.to_thread(execute_task, module, task, df)
+            await asyncio.to_thread(self.queue.complete, task_id, result)
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            await asyncio.to_thread(self.queue.fail, task_id, self.owner, f"{type(e).__name__}: {e}")
+        finally:
+            self._held.discard(task_id)
+
+    async def _next(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        async with self._claim_lock:
+            if not self._buffer:
+                try:
+                    claimed = await asyncio.to_thread(self.queue.claim, self.owner, self.prefetch)
+                    if not claimed and self.steal:
+                        claimed = await asyncio.to_thread(self.queue.steal, self.owner, self.workers)
+                        self.stolen += len(claimed)
+                except sqlite3.Error as e:
+                    print(f"!!! Job queue claim failed: {e}")
+                    claimed = []
+                self._buffer.extend(claimed)
+                self._held.update(task_id for task_id, _ in claimed)
+            if not self._buffer:
+                self.idle_since = self.idle_since or time.time()
+                return None
+            self.idle_since = None
+            return self._buffer.popleft()
+
+    async def _worker(self):
+        while True:
+            item = await self._next()
+            if item is None:
+                await asyncio.sleep(self.idle_s)
+                continue
+            await self.run_one(*item)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(max(0.05, self.queue.lease_s / 3))
+            held = list(self._held)
+            if not held: continue
+            try:
+                kept = set(await asyncio.to_thread(self.queue.renew, self.owner, held))
+            except sqlite3.Error as e:
+                print(f"!!! Job lease renewal failed: {e}")
+                continue
+            gone = (set(held) - kept) & self._held
+            if gone:  # stolen from the buffer meanwhile: don't run them
+                self._buffer = deque(item for item in self._buffer if item[0] not in gone)
+                self._held -= gone
@@ -0,0 +1,287 @@
+# api/loadtest.py
+"""
+Load generator for the API.
+
+Fires a weighted mix of /ui, /analyze_ui_with_strategy and /api/signal requests with random
+strategies and params (drawn from each STRATEGY_PARAMS_UI) and reports p50/p95/p99 latency,
+throughput and error rate per route and per STRATEGY_SLUG.
+
+In-process (default): drives main_api.app through httpx's ASGI transport against the replay
+exchange, so numbers are reproducible and exchange-independent. Everything the app writes
+(signal log, position snapshot, job and candle databases, alert file) goes to a temporary
+directory, and in-process job workers are off (JOB_WORKERS=0):
+
+    python -m api.loadtest --requests 2000 --concurrency 50 --generate-replay 3000
+    python -m api.loadtest --baseline data/loadtest_baseline.json          # compare, exit 1 on regression
+    python -m api.loadtest --save-baseline data/loadtest_baseline.json
+
+Against a running server (e.g. uvicorn as started by start.sh): --url http://localhost:8000
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+
+from api.exchanges import write_replay_file, timeframe_to_ms, ReplayBackend
+
+DEFAULT_ROUTE_WEIGHTS = {"/api/signal": 6, "/analyze_ui_with_strategy": 3, "/ui": 1}
+DEFAULT_SYMBOLS = ["BTC-USDT-SWAP", "ETH-USDT-SWAP"]
+DEFAULT_TIMEFRAMES = ["1h", "4h"]
+# Share of requests that use the strategy defaults (what the UI sends most of the time)
+DEFAULT_PARAMS_SHARE = 0.5
+# Regression thresholds when comparing against a baseline
+P95_TOLERANCE = 0.20
+THROUGHPUT_TOLERANCE = 0.20
+ERROR_RATE_TOLERANCE = 0.01
+
+
+def generate_synthetic_replay(data_dir: str, exchange: str, symbols: List[str], timeframes: List[str],
+                              bars: int, seed: int = 7, end_ms: int = 1_750_000_000_000):
+    """Writes random-walk candle files for the replay exchange (skips series that already exist)."""
+    rng = np.random.default_rng(seed)
+    for symbol in symbols:
+        for timeframe in timeframes:
+            path = ReplayBackend(exchange, data_dir).path_for(symbol, timeframe)
+            if path.exists(): continue
+            tf_ms = timeframe_to_ms(timeframe)
+            ts = end_ms - end_ms % tf_ms - np.arange(bars)[::-1] * tf_ms
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+            open_ = np.concatenate([[close[0]], close[:-1]])
+            spread = np.abs(rng.normal(0, 0.005, bars)) * close
+            high, low = np.maximum(open_, close) + spread, np.minimum(open_, close) - spread
+            volume = rng.lognormal(3, 1, bars)
+            write_replay_file(path, [[int(t), o, h, l, c, v] for t, o, h, l, c, v in zip(ts, open_, high, low, close, volume)])
+            print(f"--- Wrote synthetic replay series {path}")
+
+
+def random_params(params_ui: Dict[str, Dict[str, Any]], rng: random.Random) -> Dict[str, Any]:
+    """One random point of a strategy's param space (on the min/max/step grid)."""
+    out = {}
+    for name, cfg in params_ui.items():
+        if cfg.get("options"):
+            out[name] = rng.choice(cfg["options"])
+        elif cfg.get("type", "number") == "number" and cfg.get("min") is not None and cfg.get("max") is not None:
+            step = cfg.get("step") or 1
+            steps = int((cfg["max"] - cfg["min"]) / step)
+            out[name] = cfg["min"] + rng.randint(0, max(0, steps)) * step
+        else:
+            out[name] = cfg.get("default")
+    return out
+
+
+class Sample:
+    __slots__ = ("route", "strategy", "status", "latency", "error")
+
+    def __init__(self, route, strategy, status, latency, error=None):
+        self.route, self.strategy, self.status, self.latency, self.error = route, strategy, status, latency, error
+
+
+def _percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values: return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))] * 1000, 2)
+
+
+def summarize(samples: List[Sample], wall_s: float) -> Dict[str, Any]:
+    def group(items: List[Sample]) -> Dict[str, Any]:
+        lat = sorted(s.latency for s in items)
+        errors = sum(1 for s in items if s.error is not None or s.status >= 400)
+        return {"requests": len(items), "errors": errors, "error_rate": round(errors / len(items), 4) if items else 0.0,
+                "throughput_rps": round(len(items) / wall_s, 1) if wall_s > 0 else None,
+                "p50_ms": _percentile(lat, 0.50), "p95_ms": _percentile(lat, 0.95), "p99_ms": _percentile(lat, 0.99)}
+
+    by_route: Dict[str, List[Sample]] = {}
+    by_strategy: Dict[str, List[Sample]] = {}
+    for s in samples:
+        by_route.setdefault(s.route, []).append(s)
+        if s.strategy: by_strategy.setdefault(s.strategy, []).append(s)
+    errors: Dict[str, int] = {}
+    for s in samples:
+        if s.error is not None or s.status >= 400:
+            key = s.error or f"HTTP {s.status}"
+            errors[key] = errors.get(key, 0) + 1
+    return {"wall_s": round(wall_s, 2), "total": group(samples),
+            "routes": {k: group(v) for k, v in sorted(by_route.items())},
+            "strategies": {k: group(v) for k, v in sorted(by_strategy.items())},
+            "top_errors": dict(sorted(errors.items(), key=lambda kv: -kv[1])[:10])}
+
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], p95_tol: float = P95_TOLERANCE,
+                        throughput_tol: float = THROUGHPUT_TOLERANCE, error_tol: float = ERROR_RATE_TOLERANCE) -> List[str]:
+    """Returns a list of human-readable regressions (empty if within tolerance)."""
+    problems = []
+    sections = [("total", {"total": report["total"]}, {"total": baseline.get("total", {})})]
+    sections += [("route", report["routes"], baseline.get("routes", {})),
+                 ("strategy", report["strategies"], baseline.get("strategies", {}))]
+    for label, current, base in sections:
+        for key, cur in current.items():
+            ref = base.get(key)
+            if not ref: continue
+            if ref.get("p95_ms") and cur.get("p95_ms") and cur["p95_ms"] > ref["p95_ms"] * (1 + p95_tol):
+                problems.append(f"{label} {key}: p95 {cur['p95_ms']}ms > baseline {ref['p95_ms']}ms (+{p95_tol:.0%})")
+            if cur["error_rate"] > ref.get("error_rate", 0) + error_tol:
+                problems.append(f"{label} {key}: error rate {cur['error_rate']} > baseline {ref.get('error_rate', 0)}")
+    cur_rps, ref_rps = report["total"].get("throughput_rps"), baseline.get("total", {}).get("throughput_rps")
+    if cur_rps and ref_rps and cur_rps < ref_rps * (1 - throughput_tol):
+        problems.append(f"throughput {cur_rps} rps < baseline {ref_rps} rps (-{throughput_tol:.0%})")
+    return problems
+
+
+class LoadTest:
+    def __init__(self, client, strategies: Dict[str, Tuple[str, Dict[str, Any]]], exchange: str, symbols: List[str],
+                 timeframes: List[str], route_weights: Dict[str, float], seed: int = 1,
+                 default_params_share: float = DEFAULT_PARAMS_SHARE, chart_limit: int = 300):
+        self.client = client
+        self.strategies = strategies  # module name -> (slug, STRATEGY_PARAMS_UI)
+        self.exchange, self.symbols, self.timeframes = exchange, symbols, timeframes
+        self.routes, self.weights = list(route_weights), list(route_weights.values())
+        self.rng = random.Random(seed)
+        self.default_params_share = default_params_share
+        self.chart_limit = chart_limit
+        self.samples: List[Sample] = []
+
+    def next_request(self) -> Tuple[str, Optional[str], Dict[str, Any]]:
+        route = self.rng.choices(self.routes, weights=self.weights)[0]
+        if route == "/ui":
+            return route, None, {}
+        module_name = self.rng.choice(sorted(self.strategies))
+        slug, params_ui = self.strategies[module_name]
+        query = {"strategy_module_name": module_name, "exchange": self.exchange,
+                 "symbol": self.rng.choice(self.symbols), "timeframe": self.rng.choice(self.timeframes)}
+        if self.rng.random() >= self.default_params_share:
+            query.update(random_params(params_ui, self.rng))
+        if route == "/analyze_ui_with_strategy":
+            query["limit"] = self.chart_limit
+        return route, slug, query
+
+    async def _one(self, route: str, slug: Optional[str], query: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            resp = await self.client.get(route, params=query)
+            self.samples.append(Sample(route, slug, resp.status_code, time.perf_counter() - started))
+        except Exception as e:
+            self.samples.append(Sample(route, slug, 0, time.perf_counter() - started, type(e).__name__))
+
+    async def run(self, total_requests: int, concurrency: int, duration_s: Optional[float] = None) -> Dict[str, Any]:
+        remaining = [total_requests]
+        deadline = time.perf_counter() + duration_s if duration_s else None
+
+        async def worker():
+            while remaining[0] > 0 and (deadline is None or time.perf_counter() < deadline):
+                remaining[0] -= 1
+                await self._one(*self.next_request())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        return summarize(self.samples, time.perf_counter() - started)
+
+
+def _load_local_strategies(names: Optional[List[str]]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    from api.plugins import load_strategy_module, strategy_slug
+    strategy_dir = Path(__file__).resolve().parent / "strategies"
+    out = {}
+    for path in sorted(strategy_dir.glob("*.py")):
+        name = path.stem
+        if name.startswith("_") or (names and name not in names): continue
+        try:
+            module = load_strategy_module(name, str(path))
+        except Exception as e:
+            print(f"!!! Load test: skipping {name}: {e}")
+            continue
+        if module is not None:
+            out[name] = (strategy_slug(module, name), module.STRATEGY_PARAMS_UI)
+    return out
+
+
+def _isolate_state(directory: str):
+    """Points every file main_api writes at `directory`; must run before main_api is imported."""
+    if "main_api" in sys.modules:
+        print("!!! Load test: main_api is already imported; its data paths can no longer be redirected.")
+    os.environ.update({
+        "DATA_DIR": directory,
+        "SIGNAL_HISTORY_DB": os.path.join(directory, "signal_history.db"),
+        "POSITIONS_SNAPSHOT": os.path.join(directory, "positions.json"),
+        "JOBS_DB": os.path.join(directory, "jobs.db"),
+        "CANDLE_STORE_DB": os.path.join(directory, "candles.db"),
+        "ALERT_FILE": os.path.join(directory, "alerts.jsonl"),
+        "JOB_WORKERS": "0",
+    })
+
+
+async def _run(args) -> Dict[str, Any]:
+    import httpx
+    weights = json.loads(args.route_weights) if args.route_weights else DEFAULT_ROUTE_WEIGHTS
+    names = args.strategies.split(",") if args.strategies else None
+    if args.url:
+        strategies = _load_local_strategies(names)
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            test = LoadTest(client, strategies, args.exchange, args.symbols, args.timeframes, weights, args.seed, chart_limit=args.chart_limit)
+            return await test.run(args.requests, args.concurrency, args.duration)
+
+    import main_api
+    async with main_api.lifespan(main_api.app):
+        strategies = {name: (getattr(m, "STRATEGY_SLUG", name), m.STRATEGY_PARAMS_UI)
+                      for name, m in main_api._INTERNAL_STRATEGY_MODULES.items() if not names or name in names}
+        transport = httpx.ASGITransport(app=main_api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout) as client:
+            test = LoadTest(client, strategies, args.exchange, args.symbols, args.timeframes, weights, args.seed, chart_limit=args.chart_limit)
+            return await test.run(args.requests, args.concurrency, args.duration)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the strategy API.")
+    parser.add_argument("--url", help="Base URL of a running server; omit to drive the app in-process.")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds even if requests remain.")
+    parser.add_argument("--exchange", default="okx")
+    parser.add_argument("--symbols", nargs="+", default=DEFAULT_SYMBOLS)
+    parser.add_argument("--timeframes", nargs="+", default=DEFAULT_TIMEFRAMES)
+    parser.add_argument("--strategies", help="Comma-separated module names (default: all loaded).")
+    parser.add_argument("--route-weights", help='JSON, e.g. {"/api/signal": 1}')
+    parser.add_argument("--chart-limit", type=int, default=300)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--generate-replay", type=int, metavar="BARS", help="Write synthetic replay series first.")
+    parser.add_argument("--baseline", help="Compare against this report; exit 1 on regression.")
+    parser.add_argument("--save-baseline", help="Write this run's report as the new baseline.")
+    parser.add_argument("--output", help="Write the JSON report here.")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        os.environ.setdefault("EXCHANGE_BACKEND", "replay")
+    if args.generate_replay:
+        from api.exchanges import REPLAY_DATA_DIR
+        generate_synthetic_replay(os.getenv("REPLAY_DATA_DIR", REPLAY_DATA_DIR), args.exchange, args.symbols,
+                                  args.timeframes, args.generate_replay, seed=args.seed)
+
+    state_dir = None if args.url else tempfile.mkdtemp(prefix="loadtest-")
+    try:
+        if state_dir: _isolate_state(state_dir)
+        report = asyncio.run(_run(args))
+    finally:
+        if state_dir: shutil.rmtree(state_dir, ignore_errors=True)
+    report["config"] = {k: getattr(args, k) for k in ("url", "requests", "concurrency", "exchange", "symbols",
+                                                      "timeframes", "strategies", "seed", "chart_limit")}
+    print(json.dumps(report, indent=2))
+    for path in filter(None, [args.output, args.save_baseline]):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        problems = compare_to_baseline(report, json.loads(Path(args.baseline).read_text()))
+        for p in problems: print(f"!!! Regression: {p}")
+        if problems: return 1
+        print("--- Within baseline tolerances.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
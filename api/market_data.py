@@ -0,0 +1,366 @@
+# api/market_data.py
+"""
+Fetch layer: pulls OHLCV candles through the configured exchange backend (ccxt or the
+local replay exchange, see api/exchanges.py) and sizes every request to what the strategy
+actually needs (its indicator warm-up plus the last two signal bars).
+
+Fetches are single-flight: an identical (exchange, symbol, timeframe, since, limit) request
+that is already in flight shares its future. Requests for the same market that arrive within
+FETCH_COALESCE_MS of each other are batched; overlapping ranges are merged into one exchange
+fetch and each caller gets its own slice (as a copy, since strategies add columns to it).
+
+Fetched candles travel through the fetch layer as CandleArrays (api/candles.py), exact float64
+from the exchange and the candle store. FETCH_CANDLE_DTYPE=float32 opts in to a compact
+in-memory form for the shared results (rounded to ~7 significant digits); it is never written
+back to the store. The float64 DataFrame strategies compute on is built once per caller, in
+fetch_ohlcv_df(), from that caller's slice only.
+
+Closed candles of every successful fetch are also written to the local candle store
+(api/candle_store.py). When a fetch fails (exchange down, every circuit breaker open), the
+callers are served the stored candles instead, marked with df.attrs["stale"] and the age of
+the last stored bar. A background revalidation keeps retrying the exchange and refreshes the
+store (stale-while-revalidate).
+"""
+import os
+import math
+import time
+import sqlite3
+import asyncio
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from api.exchanges import get_backend, close_backends, backend_health, timeframe_to_ms
+from api.candles import CandleArray, FIELDS
+from api.candle_store import CandleStore, DEFAULT_CANDLE_DB
+
+# Bars a signal needs on top of the warm-up (run_strategy reads iloc[-1] and iloc[-2])
+SIGNAL_BARS = 2
+# EMA/RMA-type recursions never fully "finish" warming up: (1 - 2/(L+1))**(factor*L) ~ e**(-2*factor).
+# A factor of 4 leaves < 0.05% of the seed's influence in the value.
+EMA_CONVERGENCE_FACTOR = float(os.getenv("LOOKBACK_EMA_FACTOR", "4"))
+LOOKBACK_MARGIN = int(os.getenv("LOOKBACK_MARGIN", "10"))
+# Used for modules that don't implement get_required_lookback()
+DEFAULT_HISTORY_BARS = int(os.getenv("DEFAULT_HISTORY_BARS", "1000"))
+MAX_HISTORY_BARS = int(os.getenv("MAX_HISTORY_BARS", "5000"))
+FETCH_PAGE_LIMIT = int(os.getenv("FETCH_PAGE_LIMIT", "300"))
+# How long the first request for a market waits for others to join its batch (0 = same loop tick only)
+FETCH_COALESCE_MS = float(os.getenv("FETCH_COALESCE_MS", "2"))
+# Keep fetched candles in the candle store and serve them when the exchange fails (stale-while-revalidate)
+FETCH_STALE_FALLBACK = os.getenv("FETCH_STALE_FALLBACK", "1").lower() in ("1", "true", "yes")
+# Stored candles whose last bar is older than this are not served
+FETCH_STALE_MAX_S = float(os.getenv("FETCH_STALE_MAX_S", "86400"))
+FETCH_REVALIDATE_RETRIES = int(os.getenv("FETCH_REVALIDATE_RETRIES", "5"))
+# In-memory dtype of fetched candles until each caller's float64 frame is built (float32 halves it, lossy)
+FETCH_CANDLE_DTYPE = np.dtype(os.getenv("FETCH_CANDLE_DTYPE", "float64"))
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def required_bars(module, params: Dict[str, Any], margin: Optional[int] = None,
+                  ema_factor: Optional[float] = None, timeframe: Optional[str] = None) -> int:
+    """
+    Number of bars to fetch/compute so the last SIGNAL_BARS rows of every indicator the module
+    uses are fully warmed up. Modules report {"window": ..., "recursive": ...} from
+    get_required_lookback(params); recursive lengths are scaled by the EMA convergence factor.
+    An optional "span_ms" (history measured in time, e.g. a VWAP session) needs `timeframe`.
+    """
+    if not hasattr(module, 'get_required_lookback'):
+        return DEFAULT_HISTORY_BARS
+    lookback = module.get_required_lookback(params) or {}
+    margin = LOOKBACK_MARGIN if margin is None else margin
+    ema_factor = EMA_CONVERGENCE_FACTOR if ema_factor is None else ema_factor
+    bars = int(lookback.get('window', 0)) + math.ceil(ema_factor * int(lookback.get('recursive', 0)))
+    if lookback.get('span_ms'):
+        bars += math.ceil(int(lookback['span_ms']) / timeframe_to_ms(timeframe)) if timeframe else DEFAULT_HISTORY_BARS
+    return min(bars + SIGNAL_BARS + margin, MAX_HISTORY_BARS)
+
+
+def trim_to_lookback(df: pd.DataFrame, bars: int) -> pd.DataFrame:
+    """Keeps only the last `bars` rows (as a copy, so indicator columns don't touch the caller's frame)."""
+    if bars <= 0 or len(df) <= bars:
+        return df
+    return df.iloc[-bars:].copy()
+
+
+def ohlcv_to_dataframe(rows: List[List[float]]) -> pd.DataFrame:
+    """ccxt OHLCV rows -> float64 DataFrame with a 'timestamp' (ms) column and a DatetimeIndex."""
+    if not rows:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    return CandleArray.from_rows(rows, dtype=np.float64).to_dataframe()
+
+
+def candles_to_frame(candles: CandleArray) -> pd.DataFrame:
+    """float64 DataFrame for the strategy side; copies every buffer, so the caller owns it."""
+    return CandleArray(candles.timestamp.copy(), *(getattr(candles, f).astype(np.float64) for f in FIELDS)).to_dataframe()
+
+
+def get_exchange(exchange_id: str):
+    return get_backend(exchange_id)
+
+
+async def close_exchanges():
+    global _STORE
+    for task in list(_BACKGROUND):
+        if task in _REVALIDATING.values(): task.cancel()
+    await asyncio.gather(*_BACKGROUND, return_exceptions=True)
+    await close_backends()
+    if _STORE is not None:
+        _STORE.close()
+        _STORE = None
+
+
+async def _fetch_range(exchange_id: str, symbol: str, timeframe: str, limit: int,
+                       since: Optional[int] = None) -> CandleArray:
+    """One paginated exchange fetch of the latest `limit` candles (or `limit` candles from `since`), exact float64."""
+    exchange = get_exchange(exchange_id)
+    tf_ms = timeframe_to_ms(timeframe)
+    page_limit = min(FETCH_PAGE_LIMIT, exchange.page_limit)
+    now = exchange.milliseconds(symbol, timeframe)
+    cursor = since if since is not None else now - limit * tf_ms
+    rows: List[List[float]] = []
+    while len(rows) < limit:
+        page = await exchange.fetch_ohlcv(symbol, timeframe, since=cursor, limit=min(page_limit, limit - len(rows)))
+        FETCH_STATS["exchange_calls"] += 1
+        if not page:
+            break
+        rows.extend(page)
+        next_cursor = int(page[-1][0]) + tf_ms
+        if next_cursor <= cursor or next_cursor > now:
+            break
+        cursor = next_cursor
+    candles = CandleArray.from_rows(rows, dtype=np.float64)
+    return candles.tail(limit) if since is None else candles[:limit]
+
+
+# --- Stale-while-revalidate over the candle store ---
+_STORE: Optional[CandleStore] = None
+_STORE_FAILED = False
+_CACHED_SPAN: Dict[Tuple[str, str, str], Tuple[int, int]] = {}  # (first, last) ts written per market this process
+_REVALIDATING: Dict[Tuple[str, str, str], "asyncio.Task"] = {}
+_BACKGROUND: set = set()
+
+
+def _candle_cache() -> Optional[CandleStore]:
+    global _STORE, _STORE_FAILED
+    if _STORE is None and FETCH_STALE_FALLBACK and not _STORE_FAILED:
+        try:
+            _STORE = CandleStore(DEFAULT_CANDLE_DB)
+        except (sqlite3.Error, OSError) as e:
+            _STORE_FAILED = True
+            print(f"!!! Candle store unavailable, no stale fallback: {e}")
+    return _STORE
+
+
+def _spawn(coro) -> "asyncio.Task":
+    task = asyncio.ensure_future(coro)
+    _BACKGROUND.add(task)
+    task.add_done_callback(_BACKGROUND.discard)
+    return task
+
+
+def _remember(key: "MarketKey", candles: CandleArray, now: int, tf_ms: int):
+    """
+    Writes the closed candles of a fetch the store doesn't have from this process yet (in a thread).
+    Only exact float64 candles are written: the store replaces rows, so rounded prices would overwrite precise ones.
+    """
+    store = _candle_cache()
+    if store is None or not len(candles) or candles.dtype != np.float64: return
+    ts = candles.timestamp
+    first, last = _CACHED_SPAN.get(key, (None, None))
+    keep = ts + tf_ms <= now  # not the still-open bar
+    if first is not None: keep &= (ts < first) | (ts > last)
+    if not keep.any(): return
+    rows = [[int(t), *vals] for t, *vals in zip(ts[keep], *(getattr(candles, f)[keep].tolist() for f in FIELDS))]
+    closed = ts[ts + tf_ms <= now]
+    _CACHED_SPAN[key] = (int(closed[0]) if first is None else min(first, int(closed[0])),
+                         int(closed[-1]) if last is None else max(last, int(closed[-1])))
+
+    async def write():
+        try:
+            FETCH_STATS["cached_candles"] += await asyncio.to_thread(store.write, *key, rows)
+        except sqlite3.Error as e:
+            _CACHED_SPAN.pop(key, None)
+            print(f"!!! Candle store write failed for {key}: {e}")
+    _spawn(write())
+
+
+async def _stale_candles(key: "MarketKey", limit: int, since: Optional[int], now: int,
+                         tf_ms: int) -> Optional[Tuple[CandleArray, int]]:
+    """The stored candles for a failed fetch and the age of the last one, or None if there are none recent enough."""
+    store = _candle_cache()
+    if store is None: return None
+    try:
+        candles = await asyncio.to_thread(store.read_array, *key, since, None, limit, FETCH_CANDLE_DTYPE)
+    except sqlite3.Error:
+        return None
+    if not len(candles): return None
+    age = now - (int(candles.timestamp[-1]) + tf_ms)
+    return None if age > FETCH_STALE_MAX_S * 1000 else (candles, max(0, age))
+
+
+def _revalidate(key: "MarketKey", limit: int, since: Optional[int]):
+    """Keeps retrying a failed fetch in the background (exponential backoff) so the store catches up."""
+    if key in _REVALIDATING: return
+
+    async def run():
+        try:
+            for attempt in range(FETCH_REVALIDATE_RETRIES):
+                await asyncio.sleep(min(60.0, 2.0 ** attempt))
+                try:
+                    candles = await _fetch_range(*key, limit, since)
+                except Exception:
+                    continue
+                exchange = get_exchange(key[0])
+                _remember(key, candles, exchange.milliseconds(key[1], key[2]), timeframe_to_ms(key[2]))
+                FETCH_STATS["revalidated"] += 1
+                return
+        finally:
+            _REVALIDATING.pop(key, None)
+    _REVALIDATING[key] = _spawn(run())
+
+
+# --- Single-flight / coalescing ---
+MarketKey = Tuple[str, str, str]
+_Waiter = Tuple[Optional[int], int, "asyncio.Future"]
+
+_IN_FLIGHT: Dict[Tuple[str, str, str, Optional[int], int], "asyncio.Future"] = {}
+_PENDING: Dict[MarketKey, List[_Waiter]] = {}
+FETCH_STATS = {"requests": 0, "shared": 0, "coalesced": 0, "fetches": 0, "exchange_calls": 0, "errors": 0,
+               "stale_served": 0, "revalidated": 0, "cached_candles": 0}
+
+
+def fetch_stats() -> Dict[str, Any]:
+    """
+    Counters of the single-flight layer (caller requests vs. merged fetches vs. exchange page calls),
+    the stale fallback, and each exchange's breakers and hedging.
+    """
+    stats = dict(FETCH_STATS)
+    stats["saved_fetches"] = stats["requests"] - stats["fetches"]
+    stats["in_flight"] = len(_IN_FLIGHT)
+    stats["revalidating"] = len(_REVALIDATING)
+    stats["exchanges"] = backend_health()
+    return stats
+
+
+def _clusters(waiters: List[_Waiter], now: int, tf_ms: int) -> List[List[_Waiter]]:
+    """Groups waiters whose [start, end) ranges overlap or touch; a latest-bars request ends at now."""
+    spans = []
+    for w in waiters:
+        since, limit, _ = w
+        start = since if since is not None else now - limit * tf_ms
+        end = since + limit * tf_ms if since is not None else now + tf_ms
+        spans.append((start, end, w))
+    spans.sort(key=lambda s: s[0])
+    clusters, cur_end = [], None
+    for start, end, w in spans:
+        if cur_end is not None and start <= cur_end:
+            clusters[-1].append(w)
+            cur_end = max(cur_end, end)
+        else:
+            clusters.append([w])
+            cur_end = end
+    return clusters
+
+
+async def _fetch_cluster(key: MarketKey, cluster: List[_Waiter], now: int, tf_ms: int):
+    exchange_id, symbol, timeframe = key
+    if all(since is None for since, _, _ in cluster):
+        jobs = [(None, max(limit for _, limit, _ in cluster), cluster)]
+    else:
+        start = min(since if since is not None else now - limit * tf_ms for since, limit, _ in cluster)
+        end = max(since + limit * tf_ms if since is not None else now + tf_ms for since, limit, _ in cluster)
+        span = math.ceil((end - start) / tf_ms)
+        if span <= MAX_HISTORY_BARS:
+            jobs = [(start, span, cluster)]
+        else:  # merged range would exceed the cap: fetch each caller on its own
+            jobs = [(w[0], w[1], [w]) for w in cluster]
+    for since, limit, group in jobs:
+        FETCH_STATS["fetches"] += 1
+        stale_age = None
+        try:
+            candles = await _fetch_range(exchange_id, symbol, timeframe, limit, since)
+            _remember(key, candles, now, tf_ms)
+            candles = candles.astype(FETCH_CANDLE_DTYPE)
+        except Exception as e:
+            FETCH_STATS["errors"] += 1
+            stale = await _stale_candles(key, limit, since, now, tf_ms)
+            if stale is None:
+                for _, _, fut in group:
+                    if not fut.done(): fut.set_exception(e)
+                continue
+            candles, stale_age = stale
+            print(f"!!! Fetch of {symbol} {timeframe} on {exchange_id} failed ({e}); serving stored candles "
+                  f"{stale_age // 1000}s old")
+            FETCH_STATS["stale_served"] += len(group)
+            _revalidate(key, limit, since)
+        for w_since, w_limit, fut in group:
+            if fut.done(): continue
+            part = candles.tail(w_limit) if w_since is None else candles.between(w_since)[:w_limit]
+            fut.set_result((part, stale_age))
+
+
+async def _run_batch(key: MarketKey):
+    waiters = _PENDING.pop(key, [])
+    try:
+        if not waiters: return
+        if len(waiters) > 1: FETCH_STATS["coalesced"] += len(waiters) - 1
+        try:
+            tf_ms = timeframe_to_ms(key[2])
+            now = get_exchange(key[0]).milliseconds(key[1], key[2])
+            clusters = _clusters(waiters, now, tf_ms)
+        except Exception as e:
+            for _, _, fut in waiters:
+                if not fut.done(): fut.set_exception(e)
+            return
+        await asyncio.gather(*(_fetch_cluster(key, c, now, tf_ms) for c in clusters))
+    finally:
+        for since, limit, fut in waiters:
+            ident = key + (since, limit)
+            if _IN_FLIGHT.get(ident) is fut: del _IN_FLIGHT[ident]
+            if not fut.done(): fut.cancel()
+
+
+def _schedule_batch(key: MarketKey):
+    loop = asyncio.get_running_loop()
+    start = lambda: asyncio.ensure_future(_run_batch(key))
+    if FETCH_COALESCE_MS > 0:
+        loop.call_later(FETCH_COALESCE_MS / 1000.0, start)
+    else:
+        loop.call_soon(start)
+
+
+async def fetch_ohlcv_df(exchange_id: str, symbol: str, timeframe: str, limit: int,
+                         since: Optional[int] = None) -> pd.DataFrame:
+    """
+    Fetches the most recent `limit` candles (or `limit` candles from `since`), paginating in
+    FETCH_PAGE_LIMIT-sized calls. Includes the still-open bar, as the exchange returns it.
+    Concurrent requests for the same market share exchange fetches (see the module docstring).
+    """
+    limit = max(1, min(int(limit), MAX_HISTORY_BARS))
+    key: MarketKey = (exchange_id.lower(), symbol, timeframe)
+    ident = key + (since, limit)
+    FETCH_STATS["requests"] += 1
+    fut = _IN_FLIGHT.get(ident)
+    if fut is not None:
+        FETCH_STATS["shared"] += 1
+    else:
+        fut = asyncio.get_running_loop().create_future()
+        _IN_FLIGHT[ident] = fut
+        if key not in _PENDING:
+            _PENDING[key] = []
+            _schedule_batch(key)
+        _PENDING[key].append((since, limit, fut))
+    # shield: one caller being cancelled must not cancel the fetch for everyone else
+    candles, stale_age = await asyncio.shield(fut)
+    df = candles_to_frame(candles)
+    if stale_age is not None:
+        df.attrs["stale"] = True
+        df.attrs["stale_age_ms"] = stale_age
+    return df
+
+
+async def fetch_for_strategy(module, params: Dict[str, Any], exchange_id: str, symbol: str, timeframe: str,
+                             min_bars: int = 0) -> pd.DataFrame:
+    """Fetches just enough history for `module` with `params` (or `min_bars`, if larger, e.g. for charts)."""
+    return await fetch_ohlcv_df(exchange_id, symbol, timeframe, max(required_bars(module, params, timeframe=timeframe), min_bars))
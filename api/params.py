@@ -0,0 +1,119 @@
+# api/params.py
+"""
+Typed params schema derived from a strategy module's STRATEGY_PARAMS_UI.
+
+Query strings hand us "2", 2 and 2.0 for the same logical value, and column names are
+built with f-strings of whatever arrived (e.g. SUPERT_10_3 vs SUPERT_10_3.0). Normalizing
+once, up front, gives every strategy the same typed values and one canonical hash to use
+for column names, cache keys and signal-log keys.
+"""
+import json
+import math
+import hashlib
+from decimal import Decimal
+from typing import Dict, Any, Optional, List
+
+
+class ParamSpec:
+    """One entry of STRATEGY_PARAMS_UI with its coercion rules."""
+    __slots__ = ("name", "kind", "default", "min", "max", "step", "options")
+
+    def __init__(self, name: str, cfg: Dict[str, Any]):
+        self.name = name
+        self.min = cfg.get("min")
+        self.max = cfg.get("max")
+        self.step = cfg.get("step")
+        self.options: Optional[List[Any]] = cfg.get("options")
+        ui_type = cfg.get("type", "number")
+        if ui_type == "select" or self.options:
+            self.kind = "select"
+        elif ui_type == "number":
+            # A spec is float-valued if any of its bounds/default/step is written as a float
+            numbers = [cfg.get(k) for k in ("default", "min", "max", "step")]
+            self.kind = "float" if any(isinstance(v, float) for v in numbers) else "int"
+        else:
+            self.kind = "str"
+        self.default = cfg.get("default")
+        if self.default is not None and self.kind != "select":
+            self.default = self.coerce(self.default)
+
+    def coerce(self, value: Any) -> Any:
+        """Returns the canonical value; raises ValueError if `value` can't be interpreted."""
+        if self.kind == "select":
+            if not self.options: return str(value)
+            lookup = {str(o).upper(): o for o in self.options}
+            key = str(value).strip().upper()
+            if key not in lookup: raise ValueError(f"{value!r} not one of {self.options}")
+            return lookup[key]
+        if self.kind == "str":
+            return str(value).strip()
+
+        number = float(str(value).strip()) if isinstance(value, str) else float(value)
+        if not math.isfinite(number): raise ValueError(f"{value!r} is not a finite number")
+        if self.min is not None: number = max(number, float(self.min))
+        if self.max is not None: number = min(number, float(self.max))
+        if self.kind == "int":
+            step = int(self.step or 1)
+            base = int(self.min) if self.min is not None else 0
+            snapped = int(base + round((number - base) / step) * step)
+            if self.max is not None and snapped > self.max: snapped -= step
+            return snapped
+        if self.step:
+            # Snap to the step grid and drop float noise (0.30000000000000004 -> 0.3)
+            step = Decimal(str(self.step))
+            base = Decimal(str(self.min)) if self.min is not None else Decimal(0)
+            snapped = base + ((Decimal(repr(number)) - base) / step).to_integral_value() * step
+            if self.max is not None and snapped > Decimal(str(self.max)): snapped -= step
+            number = float(snapped)
+        return round(number, 12)
+
+
+class ParamsSchema:
+    """Ordered collection of ParamSpec built from STRATEGY_PARAMS_UI."""
+
+    def __init__(self, params_ui: Dict[str, Dict[str, Any]]):
+        self.specs: Dict[str, ParamSpec] = {name: ParamSpec(name, cfg) for name, cfg in (params_ui or {}).items()}
+
+    def defaults(self) -> Dict[str, Any]:
+        return {name: spec.default for name, spec in self.specs.items()}
+
+    def normalize(self, raw: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Coerces, clamps and step-snaps every known param; missing or invalid values fall back
+        to the default and unknown keys are dropped (they must not affect the hash).
+        """
+        raw = raw or {}
+        out = {}
+        for name, spec in self.specs.items():
+            value = raw.get(name)
+            if value is None or value == "":
+                out[name] = spec.default
+                continue
+            try:
+                out[name] = spec.coerce(value)
+            except (TypeError, ValueError) as e:
+                print(f"!!! Param '{name}': {e}. Using default {spec.default!r}.")
+                out[name] = spec.default
+        return out
+
+
+def canonical_json(params: Dict[str, Any]) -> str:
+    return json.dumps(params or {}, sort_keys=True, default=str, separators=(",", ":"))
+
+
+def params_hash(params: Dict[str, Any]) -> str:
+    """Stable short hash of a (normalized) params dict, key-order independent."""
+    return hashlib.sha1(canonical_json(params).encode("utf-8")).hexdigest()[:16]
+
+
+def schema_for(module) -> ParamsSchema:
+    """Schema for a loaded strategy module, cached on the module itself."""
+    schema = getattr(module, "_PARAMS_SCHEMA", None)
+    if schema is None:
+        schema = ParamsSchema(getattr(module, "STRATEGY_PARAMS_UI", {}))
+        setattr(module, "_PARAMS_SCHEMA", schema)
+    return schema
+
+
+def normalize_params(module, raw: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return schema_for(module).normalize(raw)
@@ -0,0 +1,139 @@
+# api/patterns.py
+"""
+All-patterns-at-once candlestick detection.
+
+detect_all() runs every supported pattern over the OHLC arrays in one vectorized pass and
+returns a uint16 bitmask per bar, with one bit per (pattern, direction). A strategy that
+needs one pattern reads its bit (pattern_value() gives TA-Lib style +100/-100/0), and a
+cross-symbol PatternIndex keeps the last bar's mask of every market. "Bullish engulfing
+in an uptrend" is then a bitwise AND over that index rather than a recomputation per symbol.
+
+The definitions follow TA-Lib's candle settings: body and range sizes are compared with
+the average of the previous AVG_PERIOD bars. pandas_ta's cdl_* functions wrap TA-Lib, so
+without TA-Lib installed they are not available at all.
+"""
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+
+PATTERNS = ("ENGULFING", "HAMMER", "SHOOTINGSTAR", "MORNINGSTAR", "EVENINGSTAR", "DOJI")
+AVG_PERIOD = 10        # bars averaged for "long/short body" and "range" references
+DOJI_BODY = 0.1        # doji: body <= 10% of the average range
+SHADOW_VERY_SHORT = 0.1
+NEAR = 0.2
+STAR_PENETRATION = 0.3
+
+# Bit layout: one bit per pattern direction (single-direction patterns have one bit)
+BULLISH_BITS = {"ENGULFING": 1 << 0, "HAMMER": 1 << 2, "MORNINGSTAR": 1 << 4, "DOJI": 1 << 6}
+BEARISH_BITS = {"ENGULFING": 1 << 1, "SHOOTINGSTAR": 1 << 3, "EVENINGSTAR": 1 << 5}
+LOOKBACK = AVG_PERIOD + 2  # bars before the current one that detect_all() reads
+
+
+def _prior_mean(x: np.ndarray, period: int) -> np.ndarray:
+    """Mean of the `period` values before each bar (NaN until there are enough)."""
+    csum = np.concatenate([[0.0], np.cumsum(x)])
+    out = np.full(len(x), np.nan)
+    if len(x) > period:
+        out[period:] = (csum[period:-1] - csum[:-period - 1]) / period
+    return out
+
+
+def _shift(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if n < len(x): out[n:] = x[:len(x) - n]
+    return out
+
+
+def detect_all(open_, high, low, close) -> np.ndarray:
+    """uint16 bitmask per bar with every pattern in BULLISH_BITS/BEARISH_BITS that completes on that bar."""
+    o, h, l, c = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    n = len(c)
+    body = np.abs(c - o)
+    rng = h - l
+    top, bottom = np.maximum(o, c), np.minimum(o, c)
+    upper, lower = h - top, bottom - l
+    avg_body, avg_range = _prior_mean(body, AVG_PERIOD), _prior_mean(rng, AVG_PERIOD)
+    white, black = c > o, c < o
+    o1, c1, l1, h1 = _shift(o, 1), _shift(c, 1), _shift(l, 1), _shift(h, 1)
+    o2, c2 = _shift(o, 2), _shift(c, 2)
+    body1, body2 = _shift(body, 1), _shift(body, 2)
+    top1, bottom1 = np.maximum(o1, c1), np.minimum(o1, c1)
+    avg_body1, avg_body2 = _shift(avg_body, 1), _shift(avg_body, 2)
+
+    with np.errstate(invalid="ignore"):
+        short_body = body < avg_body
+        found = {
+            ("ENGULFING", 1): white & (c1 < o1) & (c >= o1) & (o <= c1) & ((c > o1) | (o < c1)),
+            ("ENGULFING", -1): black & (c1 > o1) & (o >= c1) & (c <= o1) & ((o > c1) | (c < o1)),
+            ("HAMMER", 1): short_body & (lower > body) & (upper < SHADOW_VERY_SHORT * avg_range)
+                           & (bottom <= l1 + NEAR * avg_range),
+            ("SHOOTINGSTAR", -1): short_body & (upper > body) & (lower < SHADOW_VERY_SHORT * avg_range)
+                                  & (bottom > top1),
+            ("MORNINGSTAR", 1): (c2 < o2) & (body2 > avg_body2) & (body1 <= avg_body1) & (top1 < c2)
+                                & white & (c > c2 + STAR_PENETRATION * body2),
+            ("EVENINGSTAR", -1): (c2 > o2) & (body2 > avg_body2) & (body1 <= avg_body1) & (bottom1 > c2)
+                                 & black & (c < c2 - STAR_PENETRATION * body2),
+            ("DOJI", 1): body <= DOJI_BODY * avg_range,
+        }
+    mask = np.zeros(n, dtype=np.uint16)
+    for (name, direction), hit in found.items():
+        bit = (BULLISH_BITS if direction > 0 else BEARISH_BITS)[name]
+        mask |= np.where(hit, bit, 0).astype(np.uint16)
+    return mask
+
+
+def pattern_bits(name: str, direction: Optional[str] = None) -> int:
+    """Bits of `name` (both directions unless direction is 'bullish'/'bearish')."""
+    name = name.upper()
+    if name not in PATTERNS: raise ValueError(f"Unknown candlestick pattern '{name}'")
+    bull = BULLISH_BITS.get(name, 0) if direction in (None, "bullish") else 0
+    bear = BEARISH_BITS.get(name, 0) if direction in (None, "bearish") else 0
+    return bull | bear
+
+
+def pattern_value(mask: np.ndarray, name: str) -> np.ndarray:
+    """TA-Lib style output for one pattern: +100 bullish, -100 bearish, 0 none."""
+    mask = np.asarray(mask, dtype=np.uint16)
+    bull, bear = pattern_bits(name, "bullish"), pattern_bits(name, "bearish")
+    return np.where(mask & bull, 100, np.where(mask & bear, -100, 0)).astype(np.int16)
+
+
+def describe(mask_value: int) -> List[str]:
+    """['bullish ENGULFING', ...] for one bar's mask."""
+    out = [f"bullish {n}" for n, b in BULLISH_BITS.items() if mask_value & b]
+    return out + [f"bearish {n}" for n, b in BEARISH_BITS.items() if mask_value & b]
+
+
+class PatternIndex:
+    """Last-bar pattern mask and trend (+1 above / -1 below the trend EMA) of every market, per timeframe."""
+
+    def __init__(self):
+        self._rows: Dict[str, Dict[Tuple[str, str], int]] = {}
+        self._keys: Dict[str, List[Tuple[str, str]]] = {}
+        self._data: Dict[str, np.ndarray] = {}  # timeframe -> structured array (bar_ts, mask, trend)
+
+    def record(self, exchange: str, symbol: str, timeframe: str, bar_ts: int, mask: int, trend: int):
+        rows = self._rows.setdefault(timeframe, {})
+        key = (exchange.lower(), symbol)
+        if key not in rows:
+            rows[key] = len(rows)
+            self._keys.setdefault(timeframe, []).append(key)
+            data = self._data.get(timeframe)
+            grown = np.zeros(len(rows), dtype=[('bar_ts', np.int64), ('mask', np.uint16), ('trend', np.int8)])
+            if data is not None: grown[:len(data)] = data
+            self._data[timeframe] = grown
+        self._data[timeframe][rows[key]] = (bar_ts, mask, trend)
+
+    def query(self, timeframe: str, pattern: str, direction: Optional[str] = None, trend: Optional[int] = None,
+              exchange: Optional[str] = None) -> List[Dict[str, Any]]:
+        data = self._data.get(timeframe)
+        if data is None: return []
+        hit = (data['mask'] & pattern_bits(pattern, direction)) != 0
+        if trend is not None: hit &= data['trend'] == trend
+        keys = self._keys[timeframe]
+        return [{"exchange": keys[i][0], "symbol": keys[i][1], "bar_ts": int(data['bar_ts'][i]),
+                 "patterns": describe(int(data['mask'][i])), "trend": int(data['trend'][i])}
+                for i in np.flatnonzero(hit) if exchange is None or keys[i][0] == exchange.lower()]
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._keys.values())
@@ -0,0 +1,24 @@
+# api/plugins.py
+"""Loading of strategy plugin modules from api/strategies (shared by the API, sandbox workers and job workers)."""
+import importlib.util
+from typing import Optional
+
+REQUIRED_ATTRS = ['STRATEGY_NAME', 'calculate_strategy_indicators', 'run_strategy', 'STRATEGY_PARAMS_UI', 'get_chart_overlay_data']
+
+
+def load_strategy_module(name: str, filepath: str):
+    """exec_module()s one strategy file. Returns None if it can't be loaded or is incomplete."""
+    spec = importlib.util.spec_from_file_location(name, filepath)
+    if spec is None or spec.loader is None:
+        print(f"!!! Spec error for {filepath}")
+        return None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not all(hasattr(module, r) for r in REQUIRED_ATTRS):
+        print(f"!!! Incomplete strategy {filepath}")
+        return None
+    return module
+
+
+def strategy_slug(module, default: Optional[str] = None) -> str:
+    return getattr(module, 'STRATEGY_SLUG', default or module.__name__)
@@ -0,0 +1,301 @@
+# api/portfolio.py
+"""
+Portfolio backtest: several strategy sleeves over many symbols.
+
+One job per symbol loads the market once and builds every sleeve's signal table with
+api/backtest.py: indicator columns from the plugin's get_streaming_indicators() when it has
+them (one pass of api/indicators.py instead of pandas_ta), then its vectorized
+get_signal_table() where it has one, else run_strategy bar by bar. Jobs run in a process pool (inline with one worker). The results are placed
+on a common timestamp grid as (bars x symbols) float32 prices and one (bars x symbols x 3)
+int8 table per sleeve.
+
+From there everything is matrix maths over (bars x symbols):
+- The position state machine steps all symbols at once.
+- Exposure is sum(sleeve weight * symbol allocation * position).
+- Each bar's P&L, fees + slippage on turnover, and perpetual funding (the 8h rate accrued
+  pro rata over each bar held, so any timeframe pays the same per day) are computed in
+  bar chunks, so temporaries stay bounded for 200 symbols x 5y of 1h bars.
+
+    python -m api.portfolio --sleeve supertrend_following --sleeve rsi_mean_reversion:rsi_length=10 \\
+        --sleeve donchian_channels --symbols BTC-USDT-SWAP ETH-USDT-SWAP --timeframe 1h
+"""
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple, Callable, Union
+
+import numpy as np
+import pandas as pd
+
+from api.plugins import load_strategy_module
+from api.params import normalize_params, schema_for
+from api.backtest import prepare, compute_signal_table, performance, POSITION_STATES, _NEXT_STATE, _POSITION_VALUE
+from api.indicators import run_once
+from api.exchanges import timeframe_to_ms
+
+STRATEGY_DIR = Path(__file__).resolve().parent / "strategies"
+DEFAULT_FEE_BPS = 5.0
+DEFAULT_SLIPPAGE_BPS = 2.0
+DEFAULT_FUNDING_BPS_PER_8H = 1.0
+FUNDING_INTERVAL_MS = 8 * 3600 * 1000
+DEFAULT_CHUNK_BARS = 20000
+_STATE_VALUES = np.array([_POSITION_VALUE[p] for p in POSITION_STATES], dtype=np.int8)
+
+
+class Sleeve:
+    """One strategy with fixed params and a share of the portfolio's capital."""
+    __slots__ = ("strategy", "params", "weight")
+
+    def __init__(self, strategy: str, params: Optional[Dict[str, Any]] = None, weight: float = 1.0):
+        self.strategy, self.params, self.weight = strategy, params or {}, weight
+
+    @classmethod
+    def parse(cls, spec: str) -> "Sleeve":
+        """'module[:k=v,k=v][@weight]' (e.g. 'rsi_mean_reversion:rsi_length=10@0.5')."""
+        spec, _, weight = spec.partition("@")
+        name, _, raw = spec.partition(":")
+        params = dict(kv.split("=", 1) for kv in raw.split(",") if kv)
+        return cls(name, params, float(weight) if weight else 1.0)
+
+
+class StoreLoader:
+    """Picklable market loader reading from the local candle store (one symbol at a time)."""
+
+    def __init__(self, db_path: str, exchange: str, timeframe: str, since: Optional[int] = None,
+                 until: Optional[int] = None):
+        self.db_path, self.exchange, self.timeframe, self.since, self.until = db_path, exchange, timeframe, since, until
+
+    def __call__(self, symbol: str) -> pd.DataFrame:
+        from api.candle_store import CandleStore
+        from api.market_data import ohlcv_to_dataframe
+        store = CandleStore(self.db_path)
+        try:
+            return ohlcv_to_dataframe(store.read(self.exchange, symbol, self.timeframe, self.since, self.until))
+        finally:
+            store.close()
+
+
+Loader = Union[Callable[[str], pd.DataFrame], Dict[str, pd.DataFrame]]
+
+
+def _load(loader: Loader, symbol: str) -> pd.DataFrame:
+    return loader[symbol] if isinstance(loader, dict) else loader(symbol)
+
+
+def is_perpetual(symbol: str) -> bool:
+    return symbol.upper().endswith("-SWAP") or ":" in symbol
+
+
+# --- Worker side ---
+_MODULES: Dict[str, Any] = {}
+
+
+def _module(strategy: str):
+    if strategy not in _MODULES:
+        _MODULES[strategy] = load_strategy_module(strategy, str(STRATEGY_DIR / f"{strategy}.py"))
+    return _MODULES[strategy]
+
+
+def _signal_table(module, df: pd.DataFrame, params: Dict[str, Any]) -> np.ndarray:
+    streaming = None
+    if hasattr(module, 'get_streaming_indicators'):
+        try:
+            streaming = module.get_streaming_indicators(params)
+        except ValueError:  # no streaming form for these params
+            pass
+    if streaming is None: return prepare(module, df, params)[0]
+    chunk = {c: df[c].to_numpy(np.float64) for c in ('open', 'high', 'low', 'close', 'volume')}
+    chunk['timestamp'] = df['timestamp'].to_numpy(np.int64)
+    return compute_signal_table(module, df.assign(**run_once(streaming, chunk)), params)
+
+
+def _market_job(sleeves: List[Tuple[str, Dict[str, Any]]], symbol: str, source: Union[Loader, pd.DataFrame]):
+    """Loads one market and builds every sleeve's table: (symbol, timestamps, open, close, [table per sleeve])."""
+    df = source if isinstance(source, pd.DataFrame) else _load(source, symbol)
+    if df is None or df.empty:
+        return symbol, np.empty(0, np.int64), np.empty(0, np.float32), np.empty(0, np.float32), []
+    tables = []
+    for strategy, params in sleeves:
+        module = _module(strategy)
+        if module is None:
+            tables.append(np.zeros((len(df), len(POSITION_STATES)), np.int8))
+            continue
+        tables.append(_signal_table(module, df, normalize_params(module, params)))
+    return (symbol, df['timestamp'].to_numpy(np.int64), df['open'].to_numpy(np.float32),
+            df['close'].to_numpy(np.float32), tables)
+
+
+# --- Parent side ---
+def load_markets(sleeves: List[Sleeve], symbols: List[str], loader: Loader, workers: Optional[int] = None):
+    """Yields _market_job() results, one per symbol; each market is loaded exactly once."""
+    spec = [(sl.strategy, sl.params) for sl in sleeves]
+    # An in-memory loader ships each worker its own frame, not the whole dict
+    sources = [(sym, loader.get(sym) if isinstance(loader, dict) else loader) for sym in symbols]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for sym, source in sources:
+            yield _market_job(spec, sym, source)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_market_job, spec, sym, source) for sym, source in sources]
+        for fut in futures:
+            yield fut.result()
+
+
+def build_grid(markets, symbols: List[str], n_sleeves: int
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[np.ndarray]]:
+    """
+    Union timestamp grid, float32 (bars x symbols) open/close matrices (NaN where a symbol has
+    no bar) and one (bars x symbols x 3) int8 table per sleeve (HOLD where a symbol has no bar).
+    """
+    results = {symbol: (ts, o, c, tables) for symbol, ts, o, c, tables in markets}
+    stamps = [results[s][0] for s in symbols if s in results]
+    grid = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, np.int64)
+    opens = np.full((len(grid), len(symbols)), np.nan, dtype=np.float32)
+    closes = np.full_like(opens, np.nan)
+    tables = [np.zeros((len(grid), len(symbols), len(POSITION_STATES)), dtype=np.int8) for _ in range(n_sleeves)]
+    for k, symbol in enumerate(symbols):
+        ts, o, c, symbol_tables = results.pop(symbol, (np.empty(0, np.int64), None, None, []))
+        if not len(ts): continue
+        rows = np.searchsorted(grid, ts)
+        opens[rows, k], closes[rows, k] = o, c
+        for table, symbol_table in zip(tables, symbol_tables):
+            table[rows, k] = symbol_table
+    return grid, opens, closes, tables
+
+
+def held_positions(table: np.ndarray, tradable: np.ndarray) -> np.ndarray:
+    """
+    (bars x symbols) int8 position held from each bar's open, stepping every symbol's state
+    machine at once. A signal at bar j's close is filled at bar j+1's open; bars without
+    data force the symbol flat.
+    """
+    n_bars, n_symbols, _ = table.shape
+    held = np.zeros((n_bars, n_symbols), dtype=np.int8)
+    state = np.zeros(n_symbols, dtype=np.int8)
+    cols = np.arange(n_symbols)
+    for j in range(n_bars):
+        state[~tradable[j]] = 0
+        held[j] = _STATE_VALUES[state]
+        state = _NEXT_STATE[state, table[j, cols, state]]
+    return held
+
+
+def simulate_portfolio(grid: np.ndarray, opens: np.ndarray, closes: np.ndarray, sleeves: List[Sleeve],
+                       tables: List[np.ndarray], symbols: List[str], allocation: Optional[Dict[str, float]] = None,
+                       fee_bps: float = DEFAULT_FEE_BPS, slippage_bps: float = DEFAULT_SLIPPAGE_BPS,
+                       funding_bps_per_8h: Union[float, Dict[str, float]] = DEFAULT_FUNDING_BPS_PER_8H,
+                       chunk_bars: int = DEFAULT_CHUNK_BARS, bar_ms: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Vectorized accounting over the (bars x symbols) matrices, in chunks of `chunk_bars`.
+    `bar_ms` (default: the grid's median step) sets the share of the 8h funding rate each bar pays.
+    """
+    n_bars, n_symbols = opens.shape
+    if bar_ms is None: bar_ms = int(np.median(np.diff(grid))) if n_bars > 1 else FUNDING_INTERVAL_MS
+    tradable = np.isfinite(opens) & np.isfinite(closes)
+    alloc = np.array([(allocation or {}).get(s, 1.0) for s in symbols], dtype=np.float64)
+    alloc = alloc / alloc.sum() if alloc.sum() > 0 else alloc
+    sleeve_w = np.array([s.weight for s in sleeves], dtype=np.float64)
+    sleeve_w = sleeve_w / sleeve_w.sum() if sleeve_w.sum() > 0 else sleeve_w
+
+    exposure = np.zeros((n_bars, n_symbols), dtype=np.float32)
+    trades = 0
+    for weight, table in zip(sleeve_w, tables):
+        held = held_positions(table, tradable)
+        trades += int(np.count_nonzero(np.diff(held, axis=0, prepend=0)))
+        exposure += (weight * held).astype(np.float32)
+    exposure *= alloc.astype(np.float32)
+
+    funding = np.array([(funding_bps_per_8h.get(s, 0.0) if isinstance(funding_bps_per_8h, dict) else funding_bps_per_8h)
+                        if is_perpetual(s) else 0.0 for s in symbols], dtype=np.float64) / 10000.0
+    funding *= bar_ms / FUNDING_INTERVAL_MS  # per bar held
+    cost_rate = (fee_bps + slippage_bps) / 10000.0
+
+    returns = np.zeros(n_bars, dtype=np.float64)
+    pnl_by_symbol = np.zeros(n_symbols, dtype=np.float64)
+    fees_paid = funding_paid = turnover = 0.0
+    prev_exposure = np.zeros(n_symbols, dtype=np.float64)
+    prev_close = np.full(n_symbols, np.nan, dtype=np.float64)
+    for lo in range(0, n_bars, max(1, chunk_bars)):
+        hi = min(n_bars, lo + chunk_bars)
+        e = exposure[lo:hi].astype(np.float64)
+        o, c = opens[lo:hi].astype(np.float64), closes[lo:hi].astype(np.float64)
+        e_prev = np.vstack([prev_exposure, e[:-1]])
+        c_prev = np.vstack([prev_close, c[:-1]])
+        # Carry the last known close over missing bars so a symbol's first bar after a hole has a gap reference
+        c_prev = pd.DataFrame(c_prev).ffill().to_numpy()
+        gap = np.nan_to_num(o / c_prev - 1.0)
+        intrabar = np.nan_to_num(c / o - 1.0)
+        pnl = (1 + e_prev * gap) * (1 + e * intrabar) - 1
+        trade = np.abs(e - e_prev)
+        fund = e * funding  # longs pay positive funding, shorts receive it
+        net = pnl - trade * cost_rate - fund
+        returns[lo:hi] = net.sum(axis=1)
+        pnl_by_symbol += net.sum(axis=0)
+        fees_paid += float((trade * cost_rate).sum())
+        funding_paid += float(fund.sum())
+        turnover += float(trade.sum())
+        prev_exposure = e[-1]
+        last = pd.DataFrame(c).ffill().to_numpy()[-1]
+        prev_close = np.where(np.isfinite(last), last, prev_close)
+
+    return {"returns": returns, "trades": trades, "pnl_by_symbol": dict(zip(symbols, pnl_by_symbol.round(6).tolist())),
+            "fees_paid": round(fees_paid, 6), "funding_paid": round(funding_paid, 6), "turnover": round(turnover, 4),
+            "gross_exposure_mean": round(float(np.abs(exposure).sum(axis=1).mean()), 4) if n_bars else 0.0}
+
+
+def check_sleeves(sleeves: List[Sleeve]):
+    """Raises ValueError for an unknown strategy or param (normalize_params would silently drop the param)."""
+    for sleeve in sleeves:
+        module = _module(sleeve.strategy) if (STRATEGY_DIR / f"{sleeve.strategy}.py").is_file() else None
+        if module is None: raise ValueError(f"Sleeve {sleeve.strategy}: no such strategy in {STRATEGY_DIR}")
+        specs = schema_for(module).specs
+        unknown = sorted(set(sleeve.params) - set(specs))
+        if unknown:
+            raise ValueError(f"Sleeve {sleeve.strategy}: unknown param(s) {', '.join(unknown)} "
+                             f"(expected {', '.join(specs) or 'none'})")
+
+
+def run_portfolio(sleeves: List[Sleeve], symbols: List[str], loader: Loader, timeframe: str,
+                  workers: Optional[int] = None, **kwargs) -> Dict[str, Any]:
+    check_sleeves(sleeves)
+    grid, opens, closes, tables = build_grid(load_markets(sleeves, symbols, loader, workers), symbols, len(sleeves))
+    if not len(grid): raise ValueError("No candles for any symbol.")
+    sim = simulate_portfolio(grid, opens, closes, sleeves, tables, symbols, bar_ms=timeframe_to_ms(timeframe), **kwargs)
+    returns, trades = sim.pop("returns"), sim.pop("trades")
+    return {"sleeves": [{"strategy": s.strategy, "params": s.params, "weight": s.weight} for s in sleeves],
+            "symbols": len(symbols), "bars": int(len(grid)), "from": int(grid[0]), "to": int(grid[-1]),
+            "performance": performance(returns, timeframe, trades), **sim}
+
+
+if __name__ == "__main__":
+    from api.candle_store import DEFAULT_CANDLE_DB
+    parser = argparse.ArgumentParser(description="Multi-strategy, multi-symbol portfolio backtest from the candle store.")
+    parser.add_argument("--sleeve", action="append", required=True, help="module[:k=v,...][@weight]")
+    parser.add_argument("--symbols", nargs="+", required=True)
+    parser.add_argument("--exchange", default="okx")
+    parser.add_argument("--timeframe", default="1h")
+    parser.add_argument("--since", type=int)
+    parser.add_argument("--until", type=int)
+    parser.add_argument("--db", default=DEFAULT_CANDLE_DB)
+    parser.add_argument("--fee-bps", type=float, default=DEFAULT_FEE_BPS)
+    parser.add_argument("--slippage-bps", type=float, default=DEFAULT_SLIPPAGE_BPS)
+    parser.add_argument("--funding-bps", type=float, default=DEFAULT_FUNDING_BPS_PER_8H, help="Per 8h, perpetuals only.")
+    parser.add_argument("--chunk-bars", type=int, default=DEFAULT_CHUNK_BARS)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+    sleeves = [Sleeve.parse(s) for s in args.sleeve]
+    try:
+        check_sleeves(sleeves)
+    except ValueError as e:
+        parser.error(str(e))
+    report = run_portfolio(sleeves, args.symbols,
+                           StoreLoader(args.db, args.exchange, args.timeframe, args.since, args.until), args.timeframe,
+                           workers=args.workers, fee_bps=args.fee_bps, slippage_bps=args.slippage_bps,
+                           funding_bps_per_8h=args.funding_bps, chunk_bars=args.chunk_bars)
+    print(json.dumps(report, indent=2))
+    sys.exit(0)
@@ -0,0 +1,150 @@
+# api/positions.py
+"""
+In-memory position state per (account, strategy, symbol, timeframe).
+
+Feeds `current_position_type` into run_strategy() and applies the returned signal,
+so CLOSE_LONG / CLOSE_SHORT are emitted without the caller tracking anything.
+Every operation is a dict lookup plus a few attribute writes (O(1) per bar), and
+the whole book can be snapshotted to / restored from a JSON file.
+"""
+import os
+import json
+import time
+import threading
+from typing import Dict, Any, Optional, Tuple, List
+
+PositionKey = Tuple[str, str, str, str]  # (account, strategy, symbol, timeframe)
+
+# (position before the bar, signal) -> position after the bar. Unlisted pairs keep the position.
+# Strategies that ignore current_position_type still emit BUY/SELL while in a trade;
+# an opposite entry is treated as a reversal.
+TRANSITIONS: Dict[Tuple[Optional[str], str], Optional[str]] = {
+    (None, "BUY"): "LONG",
+    (None, "SELL"): "SHORT",
+    ("LONG", "CLOSE_LONG"): None,
+    ("LONG", "SELL"): "SHORT",
+    ("SHORT", "CLOSE_SHORT"): None,
+    ("SHORT", "BUY"): "LONG",
+}
+
+
+class _Slot:
+    __slots__ = ("position", "position_before_bar", "bar_ts", "entry_ts", "entry_ts_before_bar", "last_signal",
+                 "updated_at")
+
+    def __init__(self):
+        self.position: Optional[str] = None
+        self.position_before_bar: Optional[str] = None
+        self.bar_ts: Optional[int] = None
+        self.entry_ts: Optional[int] = None
+        self.entry_ts_before_bar: Optional[int] = None
+        self.last_signal: Optional[str] = None
+        self.updated_at: float = 0.0
+
+
+class PositionBook:
+    """Tracks the open position of every market a strategy is evaluated on."""
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        self.snapshot_path = snapshot_path
+        self._slots: Dict[PositionKey, _Slot] = {}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._last_snapshot = time.time()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def position_for(self, key: PositionKey, bar_ts: Optional[int] = None) -> Optional[str]:
+        """
+        Position to pass as current_position_type when evaluating `bar_ts`.
+        Re-evaluating the still-open bar uses the position held before that bar, so the
+        same bar is never applied twice.
+        """
+        slot = self._slots.get(key)
+        if slot is None: return None
+        if bar_ts is not None and slot.bar_ts == bar_ts: return slot.position_before_bar
+        return slot.position
+
+    def apply(self, key: PositionKey, bar_ts: int, signal: str) -> Optional[str]:
+        """Applies one run_strategy() signal for bar `bar_ts` and returns the resulting position."""
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = _Slot()
+            if slot.bar_ts is not None and bar_ts < slot.bar_ts:
+                return slot.position  # Stale bar, ignore
+            if slot.bar_ts != bar_ts:
+                slot.position_before_bar, slot.entry_ts_before_bar = slot.position, slot.entry_ts
+                slot.bar_ts = bar_ts
+            before = slot.position_before_bar
+            after = TRANSITIONS.get((before, signal), before)
+            # Re-evaluations of the open bar start over from the pre-bar state, entry time included
+            if after == before:
+                slot.entry_ts = slot.entry_ts_before_bar
+            else:
+                slot.entry_ts = bar_ts if after is not None else None
+            slot.position = after
+            slot.last_signal = signal
+            slot.updated_at = time.time()
+            self._dirty += 1
+            return after
+
+    def reset(self, key: PositionKey):
+        with self._lock:
+            if self._slots.pop(key, None) is not None: self._dirty += 1
+
+    def positions(self, account: Optional[str] = None, open_only: bool = True) -> List[Dict[str, Any]]:
+        out = []
+        for (acc, strategy, symbol, timeframe), slot in list(self._slots.items()):
+            if account is not None and acc != account: continue
+            if open_only and slot.position is None: continue
+            out.append({"account": acc, "strategy": strategy, "symbol": symbol, "timeframe": timeframe,
+                        "position": slot.position, "entry_ts": slot.entry_ts, "bar_ts": slot.bar_ts,
+                        "last_signal": slot.last_signal})
+        return out
+
+    # --- Persistence ---
+    def snapshot(self, path: Optional[str] = None) -> Optional[str]:
+        """Atomically writes the book to disk (write temp file, then rename)."""
+        path = path or self.snapshot_path
+        if not path: return None
+        with self._lock:
+            rows = [[*key, s.position, s.position_before_bar, s.bar_ts, s.entry_ts, s.last_signal, s.entry_ts_before_bar]
+                    for key, s in self._slots.items()]
+            self._dirty = 0
+            self._last_snapshot = time.time()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": 2, "saved_at": int(time.time() * 1000), "slots": rows}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+        return path
+
+    def maybe_snapshot(self, min_interval_s: float = 30.0) -> Optional[str]:
+        """Snapshots only if something changed and `min_interval_s` has passed since the last one."""
+        if self._dirty and time.time() - self._last_snapshot >= min_interval_s:
+            return self.snapshot()
+        return None
+
+    def load(self, path: Optional[str] = None) -> int:
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path): return 0
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"!!! Could not read position snapshot {path}: {e}")
+            return 0
+        with self._lock:
+            self._slots.clear()
+            for row in data.get("slots", []):
+                account, strategy, symbol, timeframe, pos, pos_before, bar_ts, entry_ts, last_signal = row[:9]
+                slot = _Slot()
+                slot.position, slot.position_before_bar = pos, pos_before
+                slot.bar_ts, slot.entry_ts, slot.last_signal = bar_ts, entry_ts, last_signal
+                # version 1 snapshots have no pre-bar entry time; it is only known if the bar didn't change the position
+                slot.entry_ts_before_bar = row[9] if len(row) > 9 else (entry_ts if pos == pos_before else None)
+                self._slots[(account, strategy, symbol, timeframe)] = slot
+            self._dirty = 0
+        return len(self._slots)
@@ -0,0 +1,254 @@
+# api/sandbox.py
+"""
+Out-of-process strategy execution.
+
+Each strategy gets its own "lane": a small multiprocessing pool whose workers exec the
+plugin file themselves. A lane enforces a wall-clock timeout per evaluation, an RSS budget
+(workers over budget are recycled) and an optional hard address-space limit. A hung or
+crashed worker only takes down its own lane, which is rebuilt on the next call, so one
+slow plugin can't stall the API process or the other strategies. Every pool a lane builds is
+a new generation: calls still in flight on a killed generation fail at once (SandboxAborted)
+rather than waiting out their own deadlines, and never kill the pool that replaced it.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import multiprocessing
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+from api.plugins import load_strategy_module
+
+SANDBOX_TIMEOUT_S = float(os.getenv("SANDBOX_TIMEOUT_S", "10"))
+SANDBOX_WORKERS_PER_STRATEGY = int(os.getenv("SANDBOX_WORKERS_PER_STRATEGY", "1"))
+SANDBOX_MAX_RSS_MB = int(os.getenv("SANDBOX_MAX_RSS_MB", "1024"))
+# Hard RLIMIT_AS per worker; 0 disables it (pandas/numpy reserve a lot of virtual memory)
+SANDBOX_ADDRESS_SPACE_MB = int(os.getenv("SANDBOX_ADDRESS_SPACE_MB", "0"))
+SANDBOX_START_METHOD = os.getenv("SANDBOX_START_METHOD", "spawn")
+
+# --- Worker side ---
+_WORKER_MODULE = None
+
+
+def _worker_init(name: str, filepath: str, address_space_mb: int):
+    global _WORKER_MODULE
+    if resource is not None and address_space_mb > 0:
+        limit = address_space_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _WORKER_MODULE = load_strategy_module(name, filepath)
+
+
+def _worker_rss_mb() -> float:
+    if resource is None: return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def _worker_evaluate(df, params: Dict[str, Any], current_position_type: Optional[str], return_df: bool):
+    if _WORKER_MODULE is None:
+        raise RuntimeError("Strategy module failed to load in sandbox worker.")
+    started = time.perf_counter()
+    df = _WORKER_MODULE.calculate_strategy_indicators(df, params)
+    result = _WORKER_MODULE.run_strategy(df, params, current_position_type=current_position_type)
+    return (df if return_df else None), result, time.perf_counter() - started, _worker_rss_mb()
+
+
+# --- Parent side ---
+class SandboxError(RuntimeError):
+    pass
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class SandboxAborted(SandboxError):
+    """The call's workers were killed because of another call (timeout, crash or RSS recycle)."""
+
+
+class LaneStats:
+    __slots__ = ("calls", "ok", "errors", "timeouts", "crashes", "aborted", "recycles", "latencies", "peak_rss_mb")
+
+    def __init__(self):
+        self.calls = self.ok = self.errors = self.timeouts = self.crashes = self.aborted = self.recycles = 0
+        self.latencies = deque(maxlen=2000)
+        self.peak_rss_mb = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        def pct(p): return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2) if lat else None
+        return {"calls": self.calls, "ok": self.ok, "errors": self.errors, "timeouts": self.timeouts,
+                "crashes": self.crashes, "aborted": self.aborted, "recycles": self.recycles,
+                "failure_rate": round((self.errors + self.timeouts + self.crashes + self.aborted) / self.calls, 4)
+                if self.calls else 0.0,
+                "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "peak_rss_mb": round(self.peak_rss_mb, 1)}
+
+
+class _Lane:
+    def __init__(self, name: str, filepath: str, workers: int, address_space_mb: int, ctx):
+        self.name, self.filepath = name, filepath
+        self.workers, self.address_space_mb, self.ctx = workers, address_space_mb, ctx
+        self.pool = None
+        self.pids = set()
+        self.generation = 0
+        self.waiters: Dict[int, Dict[int, Any]] = {}  # generation -> {ticket: error callback}
+        self._tickets = 0
+        self.lock = threading.Lock()
+
+    def _ensure_pool(self):
+        if self.pool is None:
+            self.pool = self.ctx.Pool(self.workers, initializer=_worker_init,
+                                      initargs=(self.name, self.filepath, self.address_space_mb))
+            self.pids = self._current_pids()
+        return self.pool
+
+    def get_pool(self):
+        with self.lock:
+            return self._ensure_pool()
+
+    def submit(self, args: tuple, callback, error_callback) -> Tuple[int, int]:
+        """apply_async()s one evaluation. Returns (pool generation, ticket) for kill() and done()."""
+        with self.lock:
+            pool = self._ensure_pool()
+            self._tickets += 1
+            self.waiters.setdefault(self.generation, {})[self._tickets] = error_callback
+            pool.apply_async(_worker_evaluate, args, callback=callback, error_callback=error_callback)
+            return self.generation, self._tickets
+
+    def done(self, generation: int, ticket: int):
+        with self.lock:
+            waiting = self.waiters.get(generation)
+            if waiting is not None:
+                waiting.pop(ticket, None)
+                if not waiting and generation != self.generation: del self.waiters[generation]
+
+    def _current_pids(self):
+        return {p.pid for p in getattr(self.pool, "_pool", [])}
+
+    def kill(self, generation: Optional[int] = None) -> bool:
+        """
+        Terminates every worker of the lane (used after timeouts, crashes and RSS overruns) and fails
+        the calls still waiting on them. With `generation`, only if that is still the current pool.
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation: return False
+            pool, self.pool = self.pool, None
+            waiting = self.waiters.pop(self.generation, {})
+            self.generation += 1
+        if pool is not None:
+            pool.terminate()
+            threading.Thread(target=pool.join, daemon=True).start()
+        for fail in waiting.values():
+            fail(SandboxAborted(f"Strategy '{self.name}': its sandbox workers were recycled during the call."))
+        return pool is not None
+
+    def crashed(self, generation: int) -> bool:
+        """True if a worker of `generation`'s pool died since it was built (Pool silently replaces dead workers)."""
+        pool = self.pool
+        if pool is None or generation != self.generation: return False
+        return self._current_pids() != self.pids or not all(p.is_alive() for p in getattr(pool, "_pool", []))
+
+
+class StrategySandbox:
+    """Per-strategy process pools with timeout, RSS budget, crash isolation and latency stats."""
+
+    def __init__(self, strategy_files: Dict[str, str], timeout_s: float = SANDBOX_TIMEOUT_S,
+                 workers_per_strategy: int = SANDBOX_WORKERS_PER_STRATEGY, max_rss_mb: int = SANDBOX_MAX_RSS_MB,
+                 address_space_mb: int = SANDBOX_ADDRESS_SPACE_MB, start_method: str = SANDBOX_START_METHOD):
+        self.strategy_files = dict(strategy_files)
+        self.timeout_s = timeout_s
+        self.workers_per_strategy = max(1, workers_per_strategy)
+        self.max_rss_mb = max_rss_mb
+        self.address_space_mb = address_space_mb
+        self._ctx = multiprocessing.get_context(start_method)
+        self._lanes: Dict[str, _Lane] = {}
+        self._stats: Dict[str, LaneStats] = {}
+
+    def _lane(self, name: str) -> _Lane:
+        lane = self._lanes.get(name)
+        if lane is None:
+            if name not in self.strategy_files:
+                raise SandboxError(f"Strategy '{name}' is not registered with the sandbox.")
+            lane = self._lanes[name] = _Lane(name, self.strategy_files[name], self.workers_per_strategy,
+                                             self.address_space_mb, self._ctx)
+            self._stats[name] = LaneStats()
+        return lane
+
+    async def evaluate(self, name: str, df, params: Dict[str, Any], current_position_type: Optional[str] = None,
+                       return_df: bool = True) -> Tuple[Any, Dict[str, Any]]:
+        """Runs calculate_strategy_indicators + run_strategy for `name` in its lane. Returns (df or None, result)."""
+        lane = self._lane(name)
+        stats = self._stats[name]
+        stats.calls += 1
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def _done(value):
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(value))
+
+        def _failed(exc):
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_exception(exc))
+
+        started = time.perf_counter()
+        generation, ticket = lane.submit((df, params, current_position_type, return_df), _done, _failed)
+        deadline = started + self.timeout_s
+        try:
+            while True:
+                # Poll so a dead worker (which never calls back) is noticed well before the timeout
+                try:
+                    out_df, result, _, rss_mb = await asyncio.wait_for(
+                        asyncio.shield(future), timeout=max(0.0, min(0.25, deadline - time.perf_counter())))
+                    break
+                except asyncio.TimeoutError:
+                    if generation != lane.generation:
+                        continue  # our pool was killed by another call; its SandboxAborted is on the way
+                    if lane.crashed(generation):
+                        stats.crashes += 1
+                        print(f"!!! Sandbox: worker for {name} died, recycling its workers.")
+                        lane.done(generation, ticket)
+                        lane.kill(generation)
+                        raise SandboxError(f"Strategy '{name}' crashed its sandbox worker.")
+                    if time.perf_counter() >= deadline:
+                        stats.timeouts += 1
+                        print(f"!!! Sandbox: {name} exceeded {self.timeout_s}s, recycling its workers.")
+                        lane.done(generation, ticket)
+                        lane.kill(generation)
+                        raise SandboxTimeout(f"Strategy '{name}' did not finish within {self.timeout_s}s.")
+        except SandboxAborted:
+            stats.aborted += 1
+            raise
+        except SandboxError:
+            raise
+        except Exception as e:
+            stats.errors += 1
+            raise SandboxError(f"Strategy '{name}' failed in sandbox: {e}") from e
+        finally:
+            lane.done(generation, ticket)
+        stats.ok += 1
+        stats.latencies.append(time.perf_counter() - started)
+        stats.peak_rss_mb = max(stats.peak_rss_mb, rss_mb)
+        if self.max_rss_mb and rss_mb > self.max_rss_mb:
+            stats.recycles += 1
+            print(f"!!! Sandbox: {name} worker RSS {rss_mb:.0f}MB > {self.max_rss_mb}MB budget, recycling.")
+            lane.kill(generation)
+        return out_df, result
+
+    def warm(self):
+        """Starts every lane's workers up front so the first request doesn't pay the spawn cost."""
+        for name in self.strategy_files:
+            self._lane(name).get_pool()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: s.as_dict() for name, s in self._stats.items()}
+
+    def shutdown(self):
+        for lane in self._lanes.values():
+            lane.kill()
+        self._lanes.clear()
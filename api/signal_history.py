@@ -0,0 +1,162 @@
+# api/signal_history.py
+"""
+Log of run_strategy() results, one row per bar.
+
+Rows are keyed by (strategy slug, params hash, exchange, symbol, timeframe, bar timestamp)
+and stored in SQLite (WAL mode). Re-evaluating a bar that is still open rewrites its row,
+and `changed` always compares with the previous bar's final signal, so BUY -> HOLD -> BUY
+on one open bar does not log any change. The alerting pipeline can ask things like
+"last 100 signal changes" or "which symbols flipped to BUY on the last bar"
+without recomputing anything.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+from api.params import params_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    strategy     TEXT    NOT NULL,
+    params_hash  TEXT    NOT NULL,
+    exchange     TEXT    NOT NULL,
+    symbol       TEXT    NOT NULL,
+    timeframe    TEXT    NOT NULL,
+    bar_ts       INTEGER NOT NULL,
+    signal       TEXT    NOT NULL,
+    prev_signal  TEXT,
+    changed      INTEGER NOT NULL DEFAULT 0,
+    details      TEXT,
+    params       TEXT,
+    recorded_at  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_signals_series
+    ON signals (strategy, params_hash, exchange, symbol, timeframe, bar_ts);
+CREATE INDEX IF NOT EXISTS idx_signals_changes
+    ON signals (bar_ts DESC) WHERE changed = 1;
+CREATE INDEX IF NOT EXISTS idx_signals_tf_bar
+    ON signals (timeframe, bar_ts);
+"""
+
+SeriesKey = Tuple[str, str, str, str, str]
+
+
+class SignalHistory:
+    """SQLite-backed signal log with an in-memory head per series."""
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        # Latest (bar_ts, signal, row id, previous bar's signal) per series, so writes never need a read query
+        self._heads: Dict[SeriesKey, Tuple[int, str, int, Optional[str]]] = {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _head(self, key: SeriesKey) -> Optional[Tuple[int, str, int, Optional[str]]]:
+        if key in self._heads:
+            return self._heads[key]
+        row = self._conn.execute(
+            "SELECT id, bar_ts, signal, prev_signal FROM signals WHERE strategy=? AND params_hash=? AND exchange=? "
+            "AND symbol=? AND timeframe=? ORDER BY bar_ts DESC, id DESC LIMIT 1", key
+        ).fetchone()
+        head = (row["bar_ts"], row["signal"], row["id"], row["prev_signal"]) if row else None
+        if head:
+            self._heads[key] = head
+        return head
+
+    def record(self, strategy: str, params: Dict[str, Any], exchange: str, symbol: str, timeframe: str,
+               bar_ts: int, result: Dict[str, Any], p_hash: Optional[str] = None) -> bool:
+        """
+        Logs one run_strategy() result. A new bar appends a row; a re-evaluation of the latest
+        bar with a different signal updates that row in place (unchanged ones and bars older
+        than the latest are skipped). Returns True if a row was written.
+        """
+        signal = str(result.get("signal", "HOLD"))
+        p_hash = p_hash or params_hash(params)
+        key = (strategy, p_hash, exchange, symbol, timeframe)
+        bar_ts = int(bar_ts)
+        details = str(result.get("details", ""))
+        params_json = json.dumps(params or {}, sort_keys=True, default=str)
+        now = int(time.time() * 1000)
+        with self._lock:
+            head = self._head(key)
+            if head and (bar_ts < head[0] or (bar_ts == head[0] and head[1] == signal)):
+                return False
+            # The previous bar's closing signal: the head's own prev when re-evaluating its bar
+            prev_signal = (head[3] if bar_ts == head[0] else head[1]) if head else None
+            changed = 1 if prev_signal is not None and prev_signal != signal else 0
+            if head and bar_ts == head[0]:
+                row_id = head[2]
+                self._conn.execute(
+                    "UPDATE signals SET signal=?, prev_signal=?, changed=?, details=?, params=?, recorded_at=? WHERE id=?",
+                    (signal, prev_signal, changed, details, params_json, now, row_id))
+            else:
+                row_id = self._conn.execute(
+                    "INSERT INTO signals (strategy, params_hash, exchange, symbol, timeframe, bar_ts, signal, "
+                    "prev_signal, changed, details, params, recorded_at) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (*key, bar_ts, signal, prev_signal, changed, details, params_json, now)
+                ).lastrowid
+            self._conn.commit()
+            self._heads[key] = (bar_ts, signal, row_id, prev_signal)
+        return True
+
+    def last_changes(self, limit: int = 100, timeframe: Optional[str] = None,
+                     strategy: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent signal changes across all symbols, newest bar first."""
+        sql = "SELECT * FROM signals WHERE changed = 1"
+        args: List[Any] = []
+        if timeframe: sql += " AND timeframe = ?"; args.append(timeframe)
+        if strategy: sql += " AND strategy = ?"; args.append(strategy)
+        sql += " ORDER BY bar_ts DESC, id DESC LIMIT ?"; args.append(int(limit))
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, args).fetchall()]
+
+    def flipped_to(self, signal: str, timeframe: str, strategy: Optional[str] = None,
+                   bar_ts: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Series whose signal changed to `signal` on `bar_ts` (defaults to the latest logged bar)."""
+        with self._lock:
+            if bar_ts is None:
+                row = self._conn.execute("SELECT MAX(bar_ts) AS b FROM signals WHERE timeframe = ?",
+                                         (timeframe,)).fetchone()
+                if not row or row["b"] is None:
+                    return []
+                bar_ts = row["b"]
+            sql = "SELECT * FROM signals WHERE changed = 1 AND timeframe = ? AND bar_ts = ?"
+            args: List[Any] = [timeframe, int(bar_ts)]
+            if strategy: sql += " AND strategy = ?"; args.append(strategy)
+            sql += " ORDER BY id DESC"
+            rows = [dict(r) for r in self._conn.execute(sql, args).fetchall()]
+        # Logs written before rows were updated in place can hold several rows per bar; the latest counts
+        seen, latest = set(), []
+        for r in rows:
+            k = (r["strategy"], r["params_hash"], r["exchange"], r["symbol"])
+            if k not in seen:
+                seen.add(k)
+                if r["signal"] == signal: latest.append(r)
+        return latest
+
+    def series(self, strategy: str, p_hash: str, exchange: str, symbol: str, timeframe: str,
+               since: Optional[int] = None, limit: int = 500) -> List[Dict[str, Any]]:
+        """Range query over one series, oldest first."""
+        sql = ("SELECT * FROM signals WHERE strategy=? AND params_hash=? AND exchange=? AND symbol=? "
+               "AND timeframe=?")
+        args: List[Any] = [strategy, p_hash, exchange, symbol, timeframe]
+        if since is not None: sql += " AND bar_ts >= ?"; args.append(int(since))
+        sql += " ORDER BY bar_ts DESC, id DESC LIMIT ?"; args.append(int(limit))
+        with self._lock:
+            rows = [dict(r) for r in self._conn.execute(sql, args).fetchall()]
+        return rows[::-1]
@@ -16,6 +16,10 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before AO is valid: the slow SMA of the median price."""
+    return {"window": int(params.get('ao_slow_length', STRATEGY_PARAMS_UI['ao_slow_length']['default'])), "recursive": 0}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates Awesome Oscillator and adds it to the DataFrame."""
     fast_length = params.get('ao_fast_length', STRATEGY_PARAMS_UI['ao_fast_length']['default'])
@@ -13,6 +13,10 @@ STRATEGY_PARAMS_UI = {
     "bbands_std_dev": {"label": "BBands Std Deviation", "default": 2.0, "type": "number", "min": 0.1, "max": 5.0, "step": 0.1}
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before the bands are valid (one rolling window)."""
+    return {"window": int(params.get('bbands_length', STRATEGY_PARAMS_UI['bbands_length']['default'])), "recursive": 0}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     length = params.get('bbands_length', STRATEGY_PARAMS_UI['bbands_length']['default'])
     std_dev = params.get('bbands_std_dev', STRATEGY_PARAMS_UI['bbands_std_dev']['default'])
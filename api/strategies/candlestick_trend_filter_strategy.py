@@ -18,6 +18,10 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for the trend EMA plus the longest pattern lookback (star patterns over the body average)."""
+    return {"window": 12, "recursive": int(params.get('trend_ema_length', STRATEGY_PARAMS_UI['trend_ema_length']['default']))}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     trend_ema_length = params.get('trend_ema_length', STRATEGY_PARAMS_UI['trend_ema_length']['default'])
     pattern_code = params.get('candlestick_pattern', STRATEGY_PARAMS_UI['candlestick_pattern']['default'])
@@ -41,33 +45,19 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
         df[f'EMA_{trend_ema_length}'] = pd.NA
 
 
+    # All supported patterns come from one pass (api/patterns.py); CDL_MASK keeps every pattern's bit
+    # so scans can look up other patterns without recomputing. pandas_ta's cdl_* need TA-Lib.
     pattern_col_name = f"pattern_{pattern_code.lower()}"
-    pattern_series = None # Initialize
     try:
-        # Call candlestick functions directly via df.ta
-        cdl_function_name = f"cdl_{pattern_code.lower()}"
-        
-        if hasattr(df.ta, cdl_function_name):
-            # Most cdl functions in pandas_ta take open, high, low, close as keyword arguments
-            # if not specified, they default to the df's columns named 'open', 'high', 'low', 'close'
-            pattern_series = getattr(df.ta, cdl_function_name)(
-                open=df['open'], 
-                high=df['high'], 
-                low=df['low'], 
-                close=df['close'], 
-                append=False
-            )
-        else:
-            print(f"!!! {STRATEGY_NAME}: Candlestick function 'ta.{cdl_function_name}()' not found in pandas-ta.")
-            # Create a series of 0s with the same index as df if pattern not found
-            pattern_series = pd.Series(0, index=df.index, name=pattern_col_name) 
-            
-        df[pattern_col_name] = pattern_series if pattern_series is not None else 0
+        from api.patterns import detect_all, pattern_value
+        mask = detect_all(df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())
+        df['CDL_MASK'] = mask
+        df[pattern_col_name] = pattern_value(mask, pattern_code)
     except Exception as e:
         print(f"!!! {STRATEGY_NAME}: Error calculating candlestick pattern '{pattern_code}': {e}")
-        traceback.print_exc() 
+        traceback.print_exc()
         df[pattern_col_name] = 0 # Default to 0 on error
-    
+
     return df
 
 def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
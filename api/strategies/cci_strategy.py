@@ -20,6 +20,10 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before CCI is valid (SMA + mean deviation window)."""
+    return {"window": int(params.get('cci_length', STRATEGY_PARAMS_UI['cci_length']['default'])), "recursive": 0}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates CCI and adds it to the DataFrame."""
     length = params.get('cci_length', STRATEGY_PARAMS_UI['cci_length']['default'])
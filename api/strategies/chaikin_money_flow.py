@@ -16,6 +16,10 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before CMF is valid (one rolling window)."""
+    return {"window": int(params.get('cmf_length', STRATEGY_PARAMS_UI['cmf_length']['default'])), "recursive": 0}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates Chaikin Money Flow and adds it to the DataFrame."""
     length = params.get('cmf_length', STRATEGY_PARAMS_UI['cmf_length']['default'])
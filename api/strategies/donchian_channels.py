@@ -1,7 +1,7 @@
 # strategies/donchian_channels_strategy.py
 import pandas as pd
 import pandas_ta as ta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import traceback
 
 STRATEGY_NAME = "Donchian Channel Breakout"
@@ -13,6 +13,39 @@ STRATEGY_PARAMS_UI = {
     "donchian_lower_length": {"label": "Donchian Lower Period", "default": 20, "type": "number", "min": 2, "max": 100}
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before both channel bands are valid."""
+    upper_length = int(params.get('donchian_upper_length', STRATEGY_PARAMS_UI['donchian_upper_length']['default']))
+    lower_length = int(params.get('donchian_lower_length', STRATEGY_PARAMS_UI['donchian_lower_length']['default']))
+    return {"window": max(upper_length, lower_length), "recursive": 0}
+
+def get_streaming_indicators(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Stateful equivalents of the channel columns, for chunked backtests (api/chunked.py)."""
+    from api import indicators as ind
+    upper_length = params.get('donchian_upper_length', STRATEGY_PARAMS_UI['donchian_upper_length']['default'])
+    lower_length = params.get('donchian_lower_length', STRATEGY_PARAMS_UI['donchian_lower_length']['default'])
+    lower = ind.Rolling(int(lower_length), "min", source="low")
+    upper = ind.Rolling(int(upper_length), "max", source="high")
+    middle_col = f'DCM_{lower_length}_{upper_length}' if lower_length != upper_length else f'DCM_{lower_length}'
+    return {f'DCL_{lower_length}': lower, middle_col: ind.Midpoint(lower, upper), f'DCU_{upper_length}': upper}
+
+def get_sweep_columns(df: pd.DataFrame, params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Channel columns for many param sets at once, from one sparse table per band."""
+    from api import indicators as ind
+    d = {k: v['default'] for k, v in STRATEGY_PARAMS_UI.items()}
+    uppers = sorted({p.get('donchian_upper_length', d['donchian_upper_length']) for p in params_list})
+    lowers = sorted({p.get('donchian_lower_length', d['donchian_lower_length']) for p in params_list})
+    upper_rows = dict(zip(uppers, ind.rolling_max_many(df['high'].to_numpy(), [int(n) for n in uppers])))
+    lower_rows = dict(zip(lowers, ind.rolling_min_many(df['low'].to_numpy(), [int(n) for n in lowers])))
+    out = []
+    for p in params_list:
+        upper_length = p.get('donchian_upper_length', d['donchian_upper_length'])
+        lower_length = p.get('donchian_lower_length', d['donchian_lower_length'])
+        middle_col = f'DCM_{lower_length}_{upper_length}' if lower_length != upper_length else f'DCM_{lower_length}'
+        upper, lower = upper_rows[upper_length], lower_rows[lower_length]
+        out.append({f'DCL_{lower_length}': lower, middle_col: 0.5 * (lower + upper), f'DCU_{upper_length}': upper})
+    return out
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     upper_length = params.get('donchian_upper_length', STRATEGY_PARAMS_UI['donchian_upper_length']['default'])
     lower_length = params.get('donchian_lower_length', STRATEGY_PARAMS_UI['donchian_lower_length']['default'])
@@ -20,11 +53,16 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
     if not all(c in df.columns for c in ['high', 'low']): return df
 
     try:
-        # Let pandas-ta append its default column names
-        df.ta.donchian(high=df['high'], low=df['low'], 
-                      upper_length=upper_length, lower_length=lower_length, 
-                      append=True)
-        print(f"--- DEBUG: Columns after pandas-ta.donchian: {df.columns.tolist()} ---")
+        # pandas-ta names all three bands DC?_{lower}_{upper}; take them by position and store
+        # them under the names run_strategy/get_chart_overlay_data use.
+        dc_output = df.ta.donchian(high=df['high'], low=df['low'],
+                                   upper_length=upper_length, lower_length=lower_length,
+                                   append=False)
+        if dc_output is None or dc_output.empty or dc_output.shape[1] < 3:
+            raise ValueError("donchian returned no data")
+        df[f'DCL_{lower_length}'] = dc_output.iloc[:, 0]
+        df[f'DCM_{lower_length}_{upper_length}' if lower_length != upper_length else f'DCM_{lower_length}'] = dc_output.iloc[:, 1]
+        df[f'DCU_{upper_length}'] = dc_output.iloc[:, 2]
     except Exception as e:
         print(f"!!! {STRATEGY_NAME}: Error during donchian calc: {e}"); traceback.print_exc()
         # Ensure columns exist with NaNs if calc fails
@@ -33,6 +71,14 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
         return df
     return df
 
+def get_signal_table(df: pd.DataFrame, params: Dict[str, Any]):
+    """run_strategy for every bar at once (api/backtest.py); breakouts of the current bar, whatever the position."""
+    from api.backtest import crossover_table, indicator_values
+    close = indicator_values(df, 'close')
+    upper = indicator_values(df, f"DCU_{params.get('donchian_upper_length')}")
+    lower = indicator_values(df, f"DCL_{params.get('donchian_lower_length')}")
+    return crossover_table(close > upper, close < lower, exits=False)
+
 def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
     upper_length = params.get('donchian_upper_length'); lower_length = params.get('donchian_lower_length')
     
@@ -0,0 +1,89 @@
+# strategies/dsl_rule_strategy.py
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, Optional, List
+
+STRATEGY_NAME = "Rule Expression (DSL)"
+STRATEGY_SLUG = "dsl_rule"
+STRATEGY_DESCRIPTION = ("Entries and exits written as rule expressions (api/dsl.py), e.g. "
+                        "cross_above(ema(close,12), ema(close,26)) & rsi(close,14) < 70. Use 0 to disable a rule.")
+
+STRATEGY_PARAMS_UI = {
+    "long_entry": {"label": "Long Entry Rule", "default": "cross_above(ema(close, 12), ema(close, 26)) & rsi(close, 14) < 70", "type": "text"},
+    "long_exit": {"label": "Long Exit Rule", "default": "cross_below(ema(close, 12), ema(close, 26))", "type": "text"},
+    "short_entry": {"label": "Short Entry Rule", "default": "0", "type": "text"},
+    "short_exit": {"label": "Short Exit Rule", "default": "0", "type": "text"}
+}
+
+RULES = ("long_entry", "long_exit", "short_entry", "short_exit")
+# Signal codes as in api/backtest.py SIGNALS
+_HOLD, _BUY, _SELL, _CLOSE_LONG, _CLOSE_SHORT = range(5)
+
+def _rules(params: Dict[str, Any]):
+    from api.dsl import compile_rule
+    return {name: compile_rule(str(params.get(name, STRATEGY_PARAMS_UI[name]['default']))) for name in RULES}
+
+def _rule_col(name: str) -> str:
+    return f"DSL_{name.upper()}"
+
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Longest window / recursive length used by any of the four rules (+1 bar for crosses)."""
+    try:
+        rules = _rules(params).values()
+    except ValueError:
+        return {"window": 0, "recursive": 0}
+    return {"window": max(r.lookback["window"] for r in rules) + 1, "recursive": max(r.lookback["recursive"] for r in rules)}
+
+def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
+    """Evaluates every rule over the whole series (0/1 columns) plus the price-level terms used for the chart."""
+    from api.dsl import DSLError, compile_rule, evaluate_bool
+    if 'close' not in df.columns: return df
+    data = {c: df[c].to_numpy(np.float64) for c in ('open', 'high', 'low', 'close', 'volume') if c in df.columns}
+    try:
+        rules = _rules(params)
+    except DSLError as e:
+        print(f"!!! {STRATEGY_NAME}: {e}")
+        for name in RULES: df[_rule_col(name)] = 0
+        return df
+    for name, rule in rules.items():
+        df[_rule_col(name)] = evaluate_bool(rule.text, data).astype(np.int8)
+        for term in rule.price_terms:
+            if f"DSL[{term}]" not in df.columns: df[f"DSL[{term}]"] = compile_rule(term).evaluate(data)
+    return df
+
+def get_signal_table(df: pd.DataFrame, params: Dict[str, Any]) -> np.ndarray:
+    """Whole-history signal table (bars x flat/LONG/SHORT) straight from the rule columns, same logic as run_strategy."""
+    n = len(df)
+    le, lx, se, sx = (df[_rule_col(name)].to_numpy() != 0 if _rule_col(name) in df.columns else np.zeros(n, bool) for name in RULES)
+    table = np.zeros((n, 3), dtype=np.int8)
+    table[:, 0] = np.where(le, _BUY, np.where(se, _SELL, _HOLD))
+    table[:, 1] = np.where(lx, _CLOSE_LONG, np.where(se, _SELL, _HOLD))
+    table[:, 2] = np.where(sx, _CLOSE_SHORT, np.where(le, _BUY, _HOLD))
+    table[:1] = _HOLD  # run_strategy needs two bars
+    return table
+
+def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
+    if len(df) < 2 or not all(_rule_col(name) in df.columns for name in RULES):
+        return {"signal": "HOLD", "details": "Rule columns missing or not enough data."}
+    hit = {name: bool(df[_rule_col(name)].iloc[-1]) for name in RULES}
+    rule = lambda name: str(params.get(name, STRATEGY_PARAMS_UI[name]['default']))
+    if current_position_type is None:
+        if hit["long_entry"]: return {"signal": "BUY", "details": f"Long entry: {rule('long_entry')}"}
+        if hit["short_entry"]: return {"signal": "SELL", "details": f"Short entry: {rule('short_entry')}"}
+    elif current_position_type == "LONG":
+        if hit["long_exit"]: return {"signal": "CLOSE_LONG", "details": f"Long exit: {rule('long_exit')}"}
+        if hit["short_entry"]: return {"signal": "SELL", "details": f"Short entry (reversal): {rule('short_entry')}"}
+    elif current_position_type == "SHORT":
+        if hit["short_exit"]: return {"signal": "CLOSE_SHORT", "details": f"Short exit: {rule('short_exit')}"}
+        if hit["long_entry"]: return {"signal": "BUY", "details": f"Long entry (reversal): {rule('long_entry')}"}
+    return {"signal": "HOLD", "details": "No rule fired on the latest bar."}
+
+def get_chart_overlay_data(df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Price-level terms of the rules (e.g. ema(close, 12)) as lines."""
+    chart_data = {}
+    if 'timestamp' not in df.columns: return chart_data
+    for col in df.columns:
+        if not (col.startswith("DSL[") and col.endswith("]")): continue
+        series = df[['timestamp', col]].dropna()
+        chart_data[col[4:-1]] = [{"time": int(t), "value": float(v)} for t, v in zip(series['timestamp'], series[col])]
+    return chart_data
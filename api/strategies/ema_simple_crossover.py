@@ -1,7 +1,7 @@
 # strategies/ema_simple_crossover.py
 import pandas as pd
 import pandas_ta as ta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 STRATEGY_NAME = "Simple EMA Crossover"
 STRATEGY_SLUG = "ema_simple_cross"
@@ -11,6 +11,28 @@ STRATEGY_PARAMS_UI = {
     "ema_slow_period": {"label": "Slow EMA Period", "default": 21, "type": "number", "min": 2, "max": 200}
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for both EMAs to converge (recursive)."""
+    fast_period = int(params.get('ema_fast_period', STRATEGY_PARAMS_UI['ema_fast_period']['default']))
+    slow_period = int(params.get('ema_slow_period', STRATEGY_PARAMS_UI['ema_slow_period']['default']))
+    return {"window": 0, "recursive": max(fast_period, slow_period)}
+
+def get_streaming_indicators(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Stateful equivalents of the EMA columns, for chunked backtests (api/chunked.py)."""
+    from api import indicators as ind
+    fast_period = params.get('ema_fast_period', STRATEGY_PARAMS_UI['ema_fast_period']['default'])
+    slow_period = params.get('ema_slow_period', STRATEGY_PARAMS_UI['ema_slow_period']['default'])
+    return {f'EMA_{fast_period}': ind.EMA(int(fast_period)), f'EMA_{slow_period}': ind.EMA(int(slow_period))}
+
+def get_sweep_columns(df: pd.DataFrame, params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """EMA columns for many param sets at once: every distinct period in one fused pass."""
+    from api import indicators as ind
+    d = {k: v['default'] for k, v in STRATEGY_PARAMS_UI.items()}
+    periods = sorted({p.get(k, d[k]) for p in params_list for k in ('ema_fast_period', 'ema_slow_period')})
+    rows = dict(zip(periods, ind.ema_many(df['close'].to_numpy(), [int(n) for n in periods])))
+    return [{f'EMA_{n}': rows[n] for n in (p.get('ema_fast_period', d['ema_fast_period']),
+                                            p.get('ema_slow_period', d['ema_slow_period']))} for p in params_list]
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     fast_period = params.get('ema_fast_period', STRATEGY_PARAMS_UI['ema_fast_period']['default'])
     slow_period = params.get('ema_slow_period', STRATEGY_PARAMS_UI['ema_slow_period']['default'])
@@ -22,6 +44,13 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
     if ema_slow_series is not None: df[f'EMA_{slow_period}'] = ema_slow_series
     return df
 
+def get_signal_table(df: pd.DataFrame, params: Dict[str, Any]):
+    """run_strategy for every bar at once (api/backtest.py); the signal doesn't depend on the position."""
+    from api.backtest import crossover_table, indicator_values, previous
+    fast = indicator_values(df, f"EMA_{params.get('ema_fast_period')}"); slow = indicator_values(df, f"EMA_{params.get('ema_slow_period')}")
+    prev_fast, prev_slow = previous(fast), previous(slow)
+    return crossover_table((prev_fast <= prev_slow) & (fast > slow), (prev_fast >= prev_slow) & (fast < slow), exits=False)
+
 def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
     # (Logic remains same as previously provided, ensure it uses correct column names)
     fast_period = params.get('ema_fast_period'); slow_period = params.get('ema_slow_period')
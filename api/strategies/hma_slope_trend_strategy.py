@@ -13,6 +13,11 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before HMA is valid: WMA(length) followed by WMA(sqrt(length))."""
+    length = int(params.get('hma_length', STRATEGY_PARAMS_UI['hma_length']['default']))
+    return {"window": length + int(length ** 0.5), "recursive": 0}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates Hull Moving Average (HMA) and adds it to the DataFrame."""
     length = params.get('hma_length', STRATEGY_PARAMS_UI['hma_length']['default'])
@@ -1,4 +1,4 @@
-# strategies/keltner_channel_breakout_strategy.py  needs fixing
+# strategies/keltner_channel_breakout_strategy.py
 import pandas as pd
 import pandas_ta as ta
 import traceback
@@ -14,8 +14,14 @@ STRATEGY_PARAMS_UI = {
     "kc_atr_multiplier": { "label": "KC ATR Multiplier", "default": 2.0, "type": "number", "min": 0.1, "max": 5.0, "step": 0.1 }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for the EMA basis and the ATR (RMA) to converge."""
+    ema_len = int(params.get('kc_ema_length', STRATEGY_PARAMS_UI['kc_ema_length']['default']))
+    atr_len = int(params.get('kc_atr_length', STRATEGY_PARAMS_UI['kc_atr_length']['default']))
+    return {"window": 1, "recursive": max(ema_len, atr_len)}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
-    """Calculates Keltner Channels and renames columns to a consistent internal format."""
+    """Calculates Keltner Channels and stores them under a consistent internal column format."""
     ema_len = params.get('kc_ema_length', STRATEGY_PARAMS_UI['kc_ema_length']['default'])
     atr_len = params.get('kc_atr_length', STRATEGY_PARAMS_UI['kc_atr_length']['default']) # Used for our desired col name
     atr_mult = params.get('kc_atr_multiplier', STRATEGY_PARAMS_UI['kc_atr_multiplier']['default'])
@@ -23,67 +29,36 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
     if not all(col in df.columns for col in ['high', 'low', 'close']):
         print(f"!!! {STRATEGY_NAME}: HLC columns missing for Keltner calculation."); return df
 
-    # Let pandas-ta append its default names first
+    desired_lower_col = f'KCLe_{ema_len}_{atr_len}_{atr_mult}'
+    desired_basis_col = f'KCBe_{ema_len}_{atr_len}_{atr_mult}'
+    desired_upper_col = f'KCUe_{ema_len}_{atr_len}_{atr_mult}'
+
     try:
         # Crucial: pandas-ta 'kc' uses 'length' for EMA, 'atr_length' for ATR, 'scalar' for multiplier
-        df.ta.kc(
+        kc_output = df.ta.kc(
             high=df['high'], low=df['low'], close=df['close'],
             length=ema_len,      # This is the EMA period for KC
             atr_length=atr_len,  # This is the ATR period for KC internal calc
             scalar=atr_mult,     # This is the ATR multiplier for KC
-            append=True          # Let pandas-ta add its default column names
+            append=False         # Take the columns by position instead of guessing pandas-ta's names
         )
-        print(f"--- DEBUG: Columns after pandas-ta.kc (params: EMA_L={ema_len}, ATR_L={atr_len}, Scalar={atr_mult}): {df.columns.tolist()} ---")
     except Exception as e:
         print(f"!!! {STRATEGY_NAME}: Error during pandas-ta.kc calculation: {e}")
         traceback.print_exc()
-        # Ensure our desired columns exist with NaNs if calculation failed
-        df[f'KCLe_{ema_len}_{atr_len}_{atr_mult}'] = pd.NA
-        df[f'KCBe_{ema_len}_{atr_len}_{atr_mult}'] = pd.NA
-        df[f'KCUe_{ema_len}_{atr_len}_{atr_mult}'] = pd.NA
-        return df
-
-    # --- Identify the columns pandas-ta created and RENAME them to our desired format ---
-    # pandas-ta for Keltner Channels with EMA: KCLe_EMA_SCALAR, KCBe_EMA_SCALAR, KCUe_EMA_SCALAR
-    # The scalar (atr_mult) might be int (e.g., "2") or float ("2.0", "2.1") in the name.
-
-    # Construct the multiplier string part as pandas-ta likely creates it
-    mult_str_pta = str(float(atr_mult)) # e.g., "2.0", "2.1"
-    if mult_str_pta.endswith(".0"):
-        mult_str_pta = str(int(float(atr_mult))) # "2"
-    # For floats like 2.1, pandas-ta might use "2.1" or sometimes "2_1". Let's check both.
-    
-    pta_generated_lower_options = [f'KCLe_{ema_len}_{mult_str_pta}', f'KCLe_{ema_len}_{str(atr_mult).replace(".","_")}']
-    pta_generated_basis_options = [f'KCBe_{ema_len}_{mult_str_pta}', f'KCBe_{ema_len}_{str(atr_mult).replace(".","_")}']
-    pta_generated_upper_options = [f'KCUe_{ema_len}_{mult_str_pta}', f'KCUe_{ema_len}_{str(atr_mult).replace(".","_")}']
-
-    actual_pta_lower_col = next((col for col in pta_generated_lower_options if col in df.columns), None)
-    actual_pta_basis_col = next((col for col in pta_generated_basis_options if col in df.columns), None)
-    actual_pta_upper_col = next((col for col in pta_generated_upper_options if col in df.columns), None)
-    
-    # Our desired consistent column names (which include atr_len for our internal clarity)
-    desired_lower_col = f'KCLe_{ema_len}_{atr_len}_{atr_mult}'
-    desired_basis_col = f'KCBe_{ema_len}_{atr_len}_{atr_mult}'
-    desired_upper_col = f'KCUe_{ema_len}_{atr_len}_{atr_mult}'
-
-    # Rename if found and different, otherwise ensure the desired column exists (even if with NaNs)
-    if actual_pta_lower_col:
-        if actual_pta_lower_col != desired_lower_col: df.rename(columns={actual_pta_lower_col: desired_lower_col}, inplace=True)
-    elif desired_lower_col not in df.columns: df[desired_lower_col] = pd.NA
-
-    if actual_pta_basis_col:
-        if actual_pta_basis_col != desired_basis_col: df.rename(columns={actual_pta_basis_col: desired_basis_col}, inplace=True)
-    elif desired_basis_col not in df.columns: df[desired_basis_col] = pd.NA
-        
-    if actual_pta_upper_col:
-        if actual_pta_upper_col != desired_upper_col: df.rename(columns={actual_pta_upper_col: desired_upper_col}, inplace=True)
-    elif desired_upper_col not in df.columns: df[desired_upper_col] = pd.NA
-    
-    if desired_lower_col not in df.columns or desired_basis_col not in df.columns or desired_upper_col not in df.columns:
-        print(f"!!! {STRATEGY_NAME}: Failed to map all Keltner columns to desired names. Current df columns: {df.columns.tolist()}")
-        # This indicates an issue with matching pandas-ta's output naming convention.
+        kc_output = None
+
+    if kc_output is not None and not kc_output.empty and kc_output.shape[1] >= 3:
+        # pandas-ta kc returns [lower, basis, upper]. Params are normalized by the caller
+        # (api/params.py), so these names are stable for identical logical params.
+        df[desired_lower_col] = kc_output.iloc[:, 0]
+        df[desired_basis_col] = kc_output.iloc[:, 1]
+        df[desired_upper_col] = kc_output.iloc[:, 2]
     else:
-        print(f"Successfully mapped Keltner columns: L->{desired_lower_col}, B->{desired_basis_col}, U->{desired_upper_col}")
+        print(f"!!! {STRATEGY_NAME}: Keltner calculation failed or returned empty.")
+        # Ensure our desired columns exist with NaNs if calculation failed
+        df[desired_lower_col] = pd.NA
+        df[desired_basis_col] = pd.NA
+        df[desired_upper_col] = pd.NA
 
     return df
 
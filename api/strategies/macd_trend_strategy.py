@@ -12,6 +12,12 @@ STRATEGY_PARAMS_UI = {
     "macd_signal_period": {"label": "MACD Signal EMA", "default": 9, "type": "number", "min": 1, "max": 50}
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for the slow EMA and then the signal EMA to converge."""
+    slow = int(params.get('macd_slow_period', STRATEGY_PARAMS_UI['macd_slow_period']['default']))
+    signal = int(params.get('macd_signal_period', STRATEGY_PARAMS_UI['macd_signal_period']['default']))
+    return {"window": 0, "recursive": slow + signal}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     fast=params.get('macd_fast_period'); slow=params.get('macd_slow_period'); signal=params.get('macd_signal_period')
     if 'close' not in df.columns: return df
@@ -16,6 +16,10 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before ROC is valid (close vs close `length` bars ago)."""
+    return {"window": int(params.get('roc_length', STRATEGY_PARAMS_UI['roc_length']['default'])) + 1, "recursive": 0}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates Rate of Change (ROC) and adds it to the DataFrame."""
     length = params.get('roc_length', STRATEGY_PARAMS_UI['roc_length']['default'])
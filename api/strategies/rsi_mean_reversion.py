@@ -12,6 +12,16 @@ STRATEGY_PARAMS_UI = {
     "rsi_overbought_level": {"label": "RSI Overbought", "default": 70, "type": "number", "min": 51, "max": 99}
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for RSI's Wilder (RMA) averages to converge."""
+    return {"window": 1, "recursive": int(params.get('rsi_length', STRATEGY_PARAMS_UI['rsi_length']['default']))}
+
+def get_streaming_indicators(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Stateful equivalent of the RSI column, for chunked backtests (api/chunked.py)."""
+    from api import indicators as ind
+    length = params.get('rsi_length', STRATEGY_PARAMS_UI['rsi_length']['default'])
+    return {f'RSI_{length}': ind.RSI(int(length))}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     length = params.get('rsi_length', STRATEGY_PARAMS_UI['rsi_length']['default'])
     if 'close' not in df.columns: return df
@@ -20,6 +30,13 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
     if rsi_series is not None: df[f'RSI_{length}'] = rsi_series
     return df
 
+def get_signal_table(df: pd.DataFrame, params: Dict[str, Any]):
+    """run_strategy for every bar at once (api/backtest.py); the signal doesn't depend on the position."""
+    from api.backtest import crossover_table, indicator_values, previous
+    length = params.get('rsi_length'); oversold = params.get('rsi_oversold_level'); overbought = params.get('rsi_overbought_level')
+    rsi = indicator_values(df, f'RSI_{length}'); prev = previous(rsi)
+    return crossover_table((prev <= oversold) & (rsi > oversold), (prev >= overbought) & (rsi < overbought), exits=False)
+
 def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
     # (Logic remains same, ensure it uses correct rsi_col_name)
     length=params.get('rsi_length');oversold=params.get('rsi_oversold_level');overbought=params.get('rsi_overbought_level')
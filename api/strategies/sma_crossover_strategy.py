@@ -1,7 +1,7 @@
 # strategies/sma_crossover_strategy.py
 import pandas as pd
 import pandas_ta as ta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 STRATEGY_NAME = "SMA Crossover"
 STRATEGY_SLUG = "sma_crossover"
@@ -16,6 +16,28 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed before both SMAs are valid."""
+    short_period = int(params.get('short_sma_period', STRATEGY_PARAMS_UI['short_sma_period']['default']))
+    long_period = int(params.get('long_sma_period', STRATEGY_PARAMS_UI['long_sma_period']['default']))
+    return {"window": max(short_period, long_period), "recursive": 0}
+
+def get_streaming_indicators(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Stateful equivalents of the SMA columns, for chunked backtests (api/chunked.py)."""
+    from api import indicators as ind
+    short_period = params.get('short_sma_period', STRATEGY_PARAMS_UI['short_sma_period']['default'])
+    long_period = params.get('long_sma_period', STRATEGY_PARAMS_UI['long_sma_period']['default'])
+    return {f'SMA_{short_period}': ind.SMA(int(short_period)), f'SMA_{long_period}': ind.SMA(int(long_period))}
+
+def get_sweep_columns(df: pd.DataFrame, params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """SMA columns for many param sets at once: every distinct period comes from one cumulative sum."""
+    from api import indicators as ind
+    d = {k: v['default'] for k, v in STRATEGY_PARAMS_UI.items()}
+    periods = sorted({p.get(k, d[k]) for p in params_list for k in ('short_sma_period', 'long_sma_period')})
+    rows = dict(zip(periods, ind.sma_many(df['close'].to_numpy(), [int(n) for n in periods])))
+    return [{f'SMA_{n}': rows[n] for n in (p.get('short_sma_period', d['short_sma_period']),
+                                            p.get('long_sma_period', d['long_sma_period']))} for p in params_list]
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates SMAs and adds them to the DataFrame."""
     short_period = params.get('short_sma_period', STRATEGY_PARAMS_UI['short_sma_period']['default'])
@@ -42,6 +64,14 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
     
     return df
 
+def get_signal_table(df: pd.DataFrame, params: Dict[str, Any]):
+    """run_strategy for every bar and position at once (api/backtest.py): crosses enter when flat, exit when in."""
+    from api.backtest import crossover_table, indicator_values, previous
+    short_sma = indicator_values(df, f"SMA_{params.get('short_sma_period', STRATEGY_PARAMS_UI['short_sma_period']['default'])}")
+    long_sma = indicator_values(df, f"SMA_{params.get('long_sma_period', STRATEGY_PARAMS_UI['long_sma_period']['default'])}")
+    prev_short, prev_long = previous(short_sma), previous(long_sma)
+    return crossover_table((prev_short <= prev_long) & (short_sma > long_sma), (prev_short >= prev_long) & (short_sma < long_sma))
+
 def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
     """Calculates a trading signal for the SMA Crossover strategy."""
     short_period = params.get('short_sma_period', STRATEGY_PARAMS_UI['short_sma_period']['default'])
@@ -25,6 +25,13 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for %K, its smoothing and %D."""
+    k_period = int(params.get('stoch_k_period', STRATEGY_PARAMS_UI['stoch_k_period']['default']))
+    d_period = int(params.get('stoch_d_period', STRATEGY_PARAMS_UI['stoch_d_period']['default']))
+    smooth_k = int(params.get('stoch_smooth_k_period', STRATEGY_PARAMS_UI['stoch_smooth_k_period']['default']))
+    return {"window": k_period + smooth_k + d_period, "recursive": 0}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates Stochastic Oscillator components and adds them to the DataFrame."""
     k_period = params.get('stoch_k_period', STRATEGY_PARAMS_UI['stoch_k_period']['default'])
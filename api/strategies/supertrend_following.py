@@ -16,6 +16,18 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for the ATR (RMA) behind the Supertrend bands to converge."""
+    return {"window": 1, "recursive": int(params.get('supertrend_atr_length', STRATEGY_PARAMS_UI['supertrend_atr_length']['default']))}
+
+def get_streaming_indicators(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Stateful equivalents of the Supertrend line and direction, for chunked backtests (api/chunked.py)."""
+    from api import indicators as ind
+    atr_length = params.get('supertrend_atr_length', STRATEGY_PARAMS_UI['supertrend_atr_length']['default'])
+    multiplier = params.get('supertrend_multiplier', STRATEGY_PARAMS_UI['supertrend_multiplier']['default'])
+    supertrend = ind.Supertrend(int(atr_length), float(multiplier))
+    return {f'SUPERT_{atr_length}_{multiplier}': supertrend, f'SUPERTd_{atr_length}_{multiplier}': supertrend.direction}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates Supertrend and adds its components to the DataFrame."""
     atr_length = params.get('supertrend_atr_length', STRATEGY_PARAMS_UI['supertrend_atr_length']['default'])
@@ -42,6 +54,14 @@ def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> p
     
     return df
 
+def get_signal_table(df: pd.DataFrame, params: Dict[str, Any]):
+    """run_strategy for every bar and position at once (api/backtest.py): flips enter when flat, exit when in."""
+    from api.backtest import crossover_table, indicator_values, previous
+    atr_length = params.get('supertrend_atr_length', STRATEGY_PARAMS_UI['supertrend_atr_length']['default'])
+    multiplier = params.get('supertrend_multiplier', STRATEGY_PARAMS_UI['supertrend_multiplier']['default'])
+    direction = indicator_values(df, f'SUPERTd_{atr_length}_{multiplier}'); prev = previous(direction)
+    return crossover_table((prev == -1) & (direction == 1), (prev == 1) & (direction == -1))
+
 def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
     """Calculates a trading signal for the Supertrend Following strategy."""
     atr_length = params.get('supertrend_atr_length', STRATEGY_PARAMS_UI['supertrend_atr_length']['default'])
@@ -16,6 +16,12 @@ STRATEGY_PARAMS_UI = {
     }
 }
 
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars needed for the triple EMA, its 1-bar ROC and the signal line."""
+    trix_length = int(params.get('trix_length', STRATEGY_PARAMS_UI['trix_length']['default']))
+    signal_length = int(params.get('trix_signal_length', STRATEGY_PARAMS_UI['trix_signal_length']['default']))
+    return {"window": 1 + signal_length, "recursive": 3 * trix_length}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
     """Calculates TRIX and its signal line and adds them to the DataFrame."""
     trix_length = params.get('trix_length', STRATEGY_PARAMS_UI['trix_length']['default'])
@@ -1,45 +1,97 @@
 # strategies/vwap_cross_strategy.py
 import pandas as pd
-import pandas_ta as ta
+import numpy as np
 from typing import Dict, Any, Optional
 
 STRATEGY_NAME = "VWAP Cross"
 STRATEGY_SLUG = "vwap_cross"
-STRATEGY_DESCRIPTION = "Signals when price crosses above (BUY) or below (SELL) the rolling VWAP."
+STRATEGY_DESCRIPTION = "Signals when price crosses above (BUY) or below (SELL) the session-anchored (or rolling) VWAP."
 
 STRATEGY_PARAMS_UI = {
+    "vwap_anchor": {
+        "label": "VWAP Anchor (D, W, M, 4h, D@13:30 or rolling)", "default": "D", "type": "text"
+    },
     "vwap_length": { # Matches 'oracle_vwap_length'
         "label": "VWAP Period (Rolling)", "default": 20, "type": "number", "min": 1, "max": 200
+    },
+    "vwap_band_mult": {
+        "label": "Band Std Dev Multiplier (0 = off)", "default": 2.0, "type": "number", "min": 0.0, "max": 5.0, "step": 0.5
     }
-    # Note: True intraday VWAP often resets daily. pandas-ta's 'vwap' with a length
-    # calculates a rolling VWAP. If a daily reset is needed, the logic becomes more complex
-    # (e.g., grouping by day or using an anchor 'A' if pandas-ta supports it easily for rolling context).
-    # For simplicity, this uses rolling VWAP.
+    # Anchored VWAP restarts every session (api/vwap.py); 'rolling' averages the last vwap_length bars instead.
 }
 
+def _settings(params: Dict[str, Any]):
+    anchor = str(params.get('vwap_anchor', STRATEGY_PARAMS_UI['vwap_anchor']['default'])).strip()
+    length = int(params.get('vwap_length', STRATEGY_PARAMS_UI['vwap_length']['default']))
+    mult = float(params.get('vwap_band_mult', STRATEGY_PARAMS_UI['vwap_band_mult']['default']))
+    return anchor, length, mult
+
+def _columns(params: Dict[str, Any]):
+    """(vwap, upper band, lower band) column names; bands only exist for anchored VWAP."""
+    anchor, length, mult = _settings(params)
+    if anchor.lower() == 'rolling': return f'VWAP_{length}', None, None
+    return f'VWAP_{anchor}', f'VWAPU_{anchor}_{mult}', f'VWAPL_{anchor}_{mult}'
+
+def get_required_lookback(params: Dict[str, Any]) -> Dict[str, int]:
+    """Bars for the rolling window, or the span of one full session for anchored VWAP."""
+    from api.vwap import required_lookback
+    anchor, length, _ = _settings(params)
+    if anchor.lower() == 'rolling': return {"window": length, "recursive": 0}
+    try:
+        return required_lookback(anchor)
+    except ValueError:
+        return {"window": 1, "recursive": 0}
+
+def get_streaming_indicators(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Running session sums for chunked backtests (api/chunked.py); anchored VWAP only."""
+    from api.vwap import AnchoredVWAP
+    anchor, _, _ = _settings(params)
+    if anchor.lower() == 'rolling': raise ValueError(f"{STRATEGY_NAME}: rolling VWAP has no streaming form; use an anchor.")
+    return {_columns(params)[0]: AnchoredVWAP(anchor)}
+
 def calculate_strategy_indicators(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
-    """Calculates rolling VWAP and adds it to the DataFrame."""
-    length = params.get('vwap_length', STRATEGY_PARAMS_UI['vwap_length']['default'])
+    """Adds the anchored VWAP with its std-dev bands (or the rolling VWAP) to the DataFrame."""
+    from api import indicators as ind
+    from api.vwap import anchored_vwap
+    anchor, length, mult = _settings(params)
+    vwap_col, upper_col, lower_col = _columns(params)
 
     if not all(col in df.columns for col in ['high', 'low', 'close', 'volume']):
         print(f"!!! {STRATEGY_NAME}: HLCV columns missing.")
         return df
 
-    # pandas-ta vwap appends VWAP_length
-    vwap_output = df.ta.vwap(
-        high=df['high'], low=df['low'], close=df['close'], volume=df['volume'],
-        length=length, # For rolling VWAP
-        append=False 
-    )
-    if vwap_output is not None and not vwap_output.empty:
-        df[f'VWAP_{length}'] = vwap_output
-    
+    high, low, close, volume = (df[c].to_numpy(np.float64) for c in ('high', 'low', 'close', 'volume'))
+    if upper_col is None:
+        typical = (high + low + close) / 3.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df[vwap_col] = ind.sma_many(typical * volume, [length])[0] / ind.sma_many(volume, [length])[0]
+        return df
+
+    if 'timestamp' in df.columns: ts = df['timestamp'].to_numpy(np.int64)
+    elif isinstance(df.index, pd.DatetimeIndex): ts = np.array([int(t.timestamp() * 1000) for t in df.index], dtype=np.int64)
+    else:
+        print(f"!!! {STRATEGY_NAME}: anchored VWAP needs timestamps.")
+        return df
+    try:
+        vwap, stdev = anchored_vwap(ts, high, low, close, volume, anchor)
+    except ValueError as e:
+        print(f"!!! {STRATEGY_NAME}: {e}")
+        return df
+    df[vwap_col] = vwap
+    if mult > 0:
+        df[upper_col], df[lower_col] = vwap + mult * stdev, vwap - mult * stdev
     return df
 
+def get_signal_table(df: pd.DataFrame, params: Dict[str, Any]) -> np.ndarray:
+    """run_strategy for every bar and position at once (api/backtest.py): crosses enter when flat, exit when in."""
+    from api.backtest import crossover_table, indicator_values, previous
+    close, vwap = indicator_values(df, 'close'), indicator_values(df, _columns(params)[0])
+    prev_close, prev_vwap = previous(close), previous(vwap)
+    return crossover_table((prev_close <= prev_vwap) & (close > vwap), (prev_close >= prev_vwap) & (close < vwap))
+
 def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type: Optional[str] = None) -> Dict[str, Any]:
-    """Calculates a trading signal based on price crossing a rolling VWAP."""
-    length = params.get('vwap_length', STRATEGY_PARAMS_UI['vwap_length']['default'])
-    vwap_col_name = f'VWAP_{length}'
+    """Calculates a trading signal based on price crossing the VWAP."""
+    vwap_col_name = _columns(params)[0]
     signal_output = {"signal": "HOLD", "details": "Conditions not met or price neutral vs VWAP."}
 
     if not all(col in df.columns for col in [vwap_col_name, 'close']):
@@ -85,16 +137,14 @@ def run_strategy(df: pd.DataFrame, params: Dict[str, Any], current_position_type
     return signal_output
 
 def get_chart_overlay_data(df: pd.DataFrame, params: Dict[str, Any]) -> Dict[str, Any]:
-    """Prepares VWAP line data for plotting."""
+    """Prepares VWAP line (and band) data for plotting."""
     chart_data = {}
-    length = params.get('vwap_length', STRATEGY_PARAMS_UI['vwap_length']['default'])
-    vwap_col_name = f'VWAP_{length}'
-    
-    df_for_chart = df.copy()
-    if not isinstance(df_for_chart.index, pd.DatetimeIndex): return {}
-
-    if vwap_col_name in df_for_chart.columns:
-        series = df_for_chart[[vwap_col_name]].dropna()
-        chart_data['vwap_line'] = [{"time": int(idx.timestamp()*1000), "value": row[vwap_col_name]} for idx,row in series.iterrows()]
-        
-    return chart_data
\ No newline at end of file
+    vwap_col, upper_col, lower_col = _columns(params)
+    if not isinstance(df.index, pd.DatetimeIndex): return {}
+
+    for key, col in (('vwap_line', vwap_col), ('vwap_upper', upper_col), ('vwap_lower', lower_col)):
+        if col is None or col not in df.columns: continue
+        series = df[col].dropna()
+        chart_data[key] = [{"time": int(idx.timestamp()*1000), "value": float(v)} for idx, v in series.items()]
+
+    return chart_data
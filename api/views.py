@@ -0,0 +1,197 @@
+# api/views.py
+"""
+Materialized signal views.
+
+A view is the finished analysis of one (exchange, symbol, timeframe, strategy, params)
+combination: indicator columns, run_strategy's result (flat position), latest indicator
+values and the chart payload. ViewScheduler rebuilds the configured views at every bar
+boundary, so request handlers can serve them as they are instead of fetching and
+computing again.
+
+Refreshes are spread over the first VIEWS_SPREAD fraction of the bar so they don't all hit
+the exchange at the boundary. The most important views go first: configured priority plus
+log(1 + requests served). A view is fresh while its last bar is the market's current bar.
+After that, handlers fall back to computing live, and metrics() reports the age and bar lag
+of every view.
+
+Views come from VIEWS_CONFIG, a JSON list of
+    {"exchange": "okx", "symbol": "BTC-USDT-SWAP", "timeframe": "1h",
+     "strategy": "sma_crossover_strategy", "params": {...}, "priority": 5}
+Popular markets requested through the UI can also be added automatically (VIEWS_AUTO_REGISTER).
+"""
+import os
+import json
+import math
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+
+from api.exchanges import timeframe_to_ms
+
+# Fraction of the bar period over which a boundary's refreshes are spread (capped at VIEWS_SPREAD_MAX_S)
+VIEWS_SPREAD = float(os.getenv("VIEWS_SPREAD", "0.05"))
+VIEWS_SPREAD_MAX_S = float(os.getenv("VIEWS_SPREAD_MAX_S", "120"))
+VIEWS_CLOSE_DELAY_S = float(os.getenv("VIEWS_CLOSE_DELAY_S", "2"))
+
+ViewKey = Tuple[str, str, str, str, str]  # (exchange, symbol, timeframe, strategy module, params hash)
+
+
+class ViewSpec:
+    __slots__ = ('exchange', 'symbol', 'timeframe', 'strategy', 'params', 'priority', 'limit', 'auto')
+
+    def __init__(self, exchange: str, symbol: str, timeframe: str, strategy: str, params: Dict[str, Any],
+                 priority: float = 0.0, limit: int = 500, auto: bool = False):
+        self.exchange, self.symbol, self.timeframe, self.strategy = exchange.lower(), symbol, timeframe, strategy
+        self.params, self.priority, self.limit, self.auto = params, float(priority), int(limit), auto
+
+
+class View:
+    __slots__ = ('analysis', 'signal', 'bar_ts', 'bars', 'refreshed_at', 'compute_ms')
+
+    def __init__(self, analysis: Dict[str, Any], signal: Dict[str, Any], bar_ts: int, bars: int, compute_ms: float):
+        self.analysis, self.signal, self.bar_ts, self.bars = analysis, signal, bar_ts, bars
+        self.refreshed_at, self.compute_ms = time.time(), compute_ms
+
+
+class ViewStore:
+    """Specs and their latest views, with per-view request counters."""
+
+    def __init__(self, now_ms: Callable[[str, str, str], int], max_auto: int = 0):
+        self.now_ms = now_ms  # (exchange, symbol, timeframe) -> the market's current time in ms
+        self.max_auto = max_auto
+        self.specs: Dict[ViewKey, ViewSpec] = {}
+        self.views: Dict[ViewKey, View] = {}
+        self.hits: Dict[ViewKey, int] = {}
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def key(exchange: str, symbol: str, timeframe: str, strategy: str, p_hash: str) -> ViewKey:
+        return (exchange.lower(), symbol, timeframe, strategy, p_hash)
+
+    def add(self, key: ViewKey, spec: ViewSpec):
+        self.specs[key] = spec
+
+    def maybe_auto_register(self, key: ViewKey, spec: ViewSpec) -> bool:
+        """Adds a requested-but-unconfigured combination while there is auto-view budget left."""
+        if key in self.specs: return True
+        if sum(s.auto for s in self.specs.values()) >= self.max_auto: return False
+        spec.auto = True
+        self.specs[key] = spec
+        return True
+
+    def put(self, key: ViewKey, view: View):
+        if key in self.specs: self.views[key] = view
+
+    def bar_lag(self, key: ViewKey, view: View) -> int:
+        ex, symbol, tf = key[:3]
+        tf_ms = timeframe_to_ms(tf)
+        return max(0, (self.now_ms(ex, symbol, tf) - 1) // tf_ms - view.bar_ts // tf_ms)
+
+    def get(self, key: ViewKey, min_bars: int = 0) -> Optional[View]:
+        """The view if it exists, covers `min_bars` and still shows the current bar; else None (compute live)."""
+        view = self.views.get(key)
+        if view is None or view.bars < min_bars:
+            self.misses += 1
+            return None
+        try:
+            lag = self.bar_lag(key, view)
+        except Exception:
+            lag = 1
+        if lag > 0:
+            self.stale += 1
+            return None
+        self.hits[key] = self.hits.get(key, 0) + 1
+        return view
+
+    def score(self, key: ViewKey) -> float:
+        return self.specs[key].priority + math.log1p(self.hits.get(key, 0))
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.time()
+        rows, ages = [], []
+        for key, spec in self.specs.items():
+            view = self.views.get(key)
+            row = {"exchange": key[0], "symbol": key[1], "timeframe": key[2], "strategy": key[3], "params_hash": key[4],
+                   "priority": spec.priority, "auto": spec.auto, "hits": self.hits.get(key, 0), "ready": view is not None}
+            if view is not None:
+                try:
+                    lag = self.bar_lag(key, view)
+                except Exception:
+                    lag = None
+                ages.append(now - view.refreshed_at)
+                row.update(bar_ts=view.bar_ts, age_s=round(now - view.refreshed_at, 3), bar_lag=lag,
+                           compute_ms=round(view.compute_ms, 2))
+            rows.append(row)
+        ages.sort()
+        served = sum(self.hits.values())
+        return {"views": len(self.specs), "ready": len(self.views), "served": served, "misses": self.misses,
+                "stale_misses": self.stale, "stale_views": sum(1 for r in rows if r.get("bar_lag")),
+                "max_age_s": round(ages[-1], 3) if ages else None,
+                "p95_age_s": round(ages[min(len(ages) - 1, int(0.95 * len(ages)))], 3) if ages else None,
+                "entries": sorted(rows, key=lambda r: -r["hits"])}
+
+
+def load_specs(path: str, normalize: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+               p_hash: Callable[[Dict[str, Any]], str], default_limit: int) -> Dict[ViewKey, ViewSpec]:
+    """Reads VIEWS_CONFIG; `normalize(strategy, params)` canonicalizes params (unknown strategies are skipped)."""
+    specs = {}
+    for item in json.loads(Path(path).read_text()):
+        try:
+            params = normalize(item["strategy"], item.get("params") or {})
+        except Exception as e:
+            print(f"!!! Skipping view {item}: {e}"); continue
+        spec = ViewSpec(item.get("exchange", "okx"), item["symbol"], item["timeframe"], item["strategy"], params,
+                        item.get("priority", 0), item.get("limit", default_limit))
+        specs[ViewStore.key(spec.exchange, spec.symbol, spec.timeframe, spec.strategy, p_hash(params))] = spec
+    return specs
+
+
+class ViewScheduler:
+    """One loop per timeframe: at each boundary, refresh that timeframe's views by score, spread over the bar."""
+
+    def __init__(self, store: ViewStore, refresh: Callable[[ViewSpec], Awaitable[View]]):
+        self.store, self.refresh = store, refresh
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.errors = 0
+
+    def start(self):
+        for tf in sorted({key[2] for key in self.store.specs}):
+            self.ensure(tf)
+
+    def ensure(self, timeframe: str):
+        if timeframe not in self._tasks:
+            self._tasks[timeframe] = asyncio.create_task(self._loop(timeframe))
+
+    async def stop(self):
+        for task in self._tasks.values(): task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    async def refresh_key(self, key: ViewKey):
+        spec = self.store.specs.get(key)
+        if spec is None: return
+        try:
+            self.store.put(key, await self.refresh(spec))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            print(f"!!! View refresh failed for {key[:4]}: {e}")
+
+    async def _refresh_spread(self, timeframe: str, start: float, spread_s: float):
+        keys = sorted((k for k in self.store.specs if k[2] == timeframe), key=self.store.score, reverse=True)
+        for i, key in enumerate(keys):
+            delay = start + i * spread_s / max(1, len(keys)) - time.time()
+            if delay > 0: await asyncio.sleep(delay)
+            await self.refresh_key(key)
+
+    async def _loop(self, timeframe: str):
+        tf_ms = timeframe_to_ms(timeframe)
+        spread_s = min(VIEWS_SPREAD * tf_ms / 1000, VIEWS_SPREAD_MAX_S)
+        await self._refresh_spread(timeframe, time.time(), 0.0)  # warm every view right away
+        while True:
+            boundary = (int(time.time() * 1000) // tf_ms + 1) * tf_ms / 1000
+            await asyncio.sleep(max(0.0, boundary - time.time()))
+            await self._refresh_spread(timeframe, boundary + VIEWS_CLOSE_DELAY_S, spread_s)
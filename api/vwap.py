@@ -0,0 +1,178 @@
+# api/vwap.py
+"""
+Session-anchored VWAP with standard-deviation bands.
+
+The VWAP of the typical price p = (high + low + close) / 3 restarts at every session anchor:
+    D        UTC day              W   week from Monday 00:00 UTC
+    M        calendar month       4h, 8h, 2d ...  fixed sessions of that length
+Any anchor can be moved with @HH:MM, e.g. 'D@13:30' for sessions that start at 13:30 UTC.
+
+Each session keeps running sums of v, (p - p0)v and (p - p0)^2 v, where p0 is the session's
+first price. Then VWAP = p0 + S1/S0 and stdev = sqrt(S2/S0 - (S1/S0)^2). Working relative to
+p0 keeps the variance from cancelling catastrophically at BTC-sized prices. A new candle adds
+three terms, so a live update is O(1), and the sums carry across chunks the same way the
+indicators in api/indicators.py do.
+
+If the first bar seen does not open its session, that session's values are NaN rather than
+a VWAP of a partial session. required_lookback() gives the history span a full session needs.
+"""
+import copy
+import re
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from api.exchanges import timeframe_to_ms
+from api.indicators import Indicator, Chunk, _View
+
+DAY_MS = 86_400_000
+WEEK_MS = 7 * DAY_MS
+_MONDAY_MS = 4 * DAY_MS  # 1970-01-01 was a Thursday
+ANCHORS = ("D", "W", "M")
+
+
+@lru_cache(maxsize=64)
+def parse_anchor(anchor: str) -> Tuple[str, int]:
+    """'D@13:30' -> ('D', 48600000). Raises ValueError for anything that isn't an anchor."""
+    base, _, at = str(anchor).strip().partition("@")
+    base = base.upper() if base.upper() in ANCHORS else base
+    offset = 0
+    if at:
+        m = re.fullmatch(r"(\d{1,2}):(\d{2})", at)
+        if not m or int(m[1]) > 23 or int(m[2]) > 59: raise ValueError(f"Bad session time '{at}' (use HH:MM UTC)")
+        offset = (int(m[1]) * 60 + int(m[2])) * 60_000
+    if base not in ANCHORS:
+        try:
+            if timeframe_to_ms(base) <= 0: raise ValueError
+        except (KeyError, ValueError, IndexError):
+            raise ValueError(f"Unknown VWAP anchor '{anchor}' (D, W, M or a duration like 4h, optionally @HH:MM)")
+    return base, offset
+
+
+def session_ids(timestamps, anchor: str) -> np.ndarray:
+    """Session number of every millisecond timestamp (equal ids = same session)."""
+    base, offset = parse_anchor(anchor)
+    ts = np.asarray(timestamps, dtype=np.int64) - offset
+    if base == "D": return ts // DAY_MS
+    if base == "W": return (ts - _MONDAY_MS) // WEEK_MS
+    if base == "M": return ts.astype("datetime64[ms]").astype("datetime64[M]").astype(np.int64)
+    return ts // timeframe_to_ms(base)
+
+
+def session_start(timestamp: int, anchor: str) -> int:
+    """Millisecond start of the session containing `timestamp`."""
+    base, offset = parse_anchor(anchor)
+    sid = int(session_ids([timestamp], anchor)[0])
+    if base == "D": return sid * DAY_MS + offset
+    if base == "W": return sid * WEEK_MS + _MONDAY_MS + offset
+    if base == "M": return int(np.datetime64(sid, "M").astype("datetime64[ms]").astype(np.int64)) + offset
+    return sid * timeframe_to_ms(base) + offset
+
+
+def session_span_ms(anchor: str) -> int:
+    """Longest possible session, i.e. the history a full current session can need."""
+    base, _ = parse_anchor(anchor)
+    return {"D": DAY_MS, "W": WEEK_MS, "M": 31 * DAY_MS}.get(base) or timeframe_to_ms(base)
+
+
+class AnchoredVWAP(Indicator):
+    """Session VWAP of hlc3 (needs 'timestamp' in the chunk); .stdev is the matching volume-weighted stdev."""
+
+    def __init__(self, anchor: str = "D", bar_ms: Optional[int] = None):
+        super().__init__()
+        parse_anchor(anchor)
+        self.anchor, self.bar_ms = anchor, bar_ms
+        self._session: Optional[int] = None
+        self._complete = True
+        self._p0 = self._s0 = self._s1 = self._s2 = 0.0
+        self._stdev = np.empty(0)
+        self.stdev = _View(self, "_stdev")
+
+    def update(self, chunk: Chunk) -> np.ndarray:
+        ts = np.asarray(chunk["timestamp"], dtype=np.int64)
+        high, low, close, volume = (np.asarray(chunk[k], dtype=np.float64) for k in ("high", "low", "close", "volume"))
+        n = len(ts)
+        vwap, stdev = np.full(n, np.nan), np.full(n, np.nan)
+        self._stdev = stdev
+        if n == 0: return vwap
+        price = (high + low + close) / 3.0
+        sid = session_ids(ts, self.anchor)
+        if self._session is None:
+            # Did the first bar open its session? (unknown bar size: assume it did)
+            step = self.bar_ms or (int(ts[1] - ts[0]) if n > 1 else 0)
+            self._complete = step <= 0 or session_ids(ts[:1] - step, self.anchor)[0] != sid[0]
+        bounds = np.concatenate([np.flatnonzero(np.diff(sid) != 0) + 1, [n]])
+        lo = 0
+        for hi in bounds.tolist():
+            if sid[lo] != self._session:
+                if self._session is not None: self._complete = True
+                self._session, self._p0 = int(sid[lo]), float(price[lo])
+                self._s0 = self._s1 = self._s2 = 0.0
+            d, w = price[lo:hi] - self._p0, volume[lo:hi]
+            s0 = np.cumsum(np.concatenate([[self._s0], w]))[1:]
+            s1 = np.cumsum(np.concatenate([[self._s1], d * w]))[1:]
+            s2 = np.cumsum(np.concatenate([[self._s2], d * d * w]))[1:]
+            self._s0, self._s1, self._s2 = float(s0[-1]), float(s1[-1]), float(s2[-1])
+            if self._complete:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    mean = s1 / s0
+                    vwap[lo:hi] = self._p0 + mean
+                    stdev[lo:hi] = np.sqrt(np.maximum(s2 / s0 - mean * mean, 0.0))
+            lo = hi
+        return vwap
+
+    def peek(self, chunk: Chunk) -> Tuple[float, float]:
+        """(vwap, stdev) after the last row of `chunk` without keeping it (e.g. the still-open bar)."""
+        probe = copy.copy(self)
+        vwap = probe.update(chunk)
+        return float(vwap[-1]), float(probe._stdev[-1])
+
+
+def anchored_vwap(timestamp, high, low, close, volume, anchor: str = "D",
+                  bar_ms: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Whole-series (vwap, stdev) arrays."""
+    vw = AnchoredVWAP(anchor, bar_ms)
+    vwap = vw({"timestamp": timestamp, "high": high, "low": low, "close": close, "volume": volume})
+    return vwap, vw._stdev
+
+
+def required_lookback(anchor: str) -> Dict[str, int]:
+    """get_required_lookback() entry for an anchored VWAP: the span of one full session."""
+    return {"window": 1, "recursive": 0, "span_ms": session_span_ms(anchor)}
+
+
+class VWAPBook:
+    """One running AnchoredVWAP per (exchange, symbol, timeframe, anchor), fed only the closed bars it hasn't seen."""
+
+    def __init__(self):
+        self._states: Dict[Tuple[str, str, str, str], AnchoredVWAP] = {}
+        self._last_ts: Dict[Tuple[str, str, str, str], int] = {}
+        self.bars_fed = 0
+
+    def last_ts(self, exchange: str, symbol: str, timeframe: str, anchor: str) -> Optional[int]:
+        return self._last_ts.get((exchange.lower(), symbol, timeframe, anchor))
+
+    def update(self, exchange: str, symbol: str, timeframe: str, anchor: str, candles: Chunk) -> Dict[str, Any]:
+        """Feeds the new closed bars of `candles` (the last row is treated as the open bar) and returns the current value."""
+        key = (exchange.lower(), symbol, timeframe, anchor)
+        tf_ms = timeframe_to_ms(timeframe)
+        ts = np.asarray(candles["timestamp"], dtype=np.int64)
+        if len(ts) == 0: raise ValueError("No candles")
+        vw, last = self._states.get(key), self._last_ts.get(key)
+        if vw is None or last is None or ts[0] > last + tf_ms or ts[-1] <= last:  # new market, gap or older candles
+            vw, last = AnchoredVWAP(anchor, tf_ms), None
+        closed = len(ts) - 1
+        lo = 0 if last is None else int(np.searchsorted(ts[:closed], last, side="right"))
+        cols = ("timestamp", "high", "low", "close", "volume")
+        if lo < closed:
+            vw.update({k: np.asarray(candles[k])[lo:closed] for k in cols})
+            last = int(ts[closed - 1])
+            self.bars_fed += closed - lo
+        self._states[key] = vw
+        if last is not None: self._last_ts[key] = last
+        value, stdev = vw.peek({k: np.asarray(candles[k])[closed:] for k in cols})
+        return {"vwap": value, "stdev": stdev, "bar_ts": int(ts[-1]), "session_start": session_start(int(ts[-1]), anchor)}
+
+    def __len__(self) -> int:
+        return len(self._states)
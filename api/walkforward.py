@@ -0,0 +1,207 @@
+# api/walkforward.py
+"""
+Walk-forward evaluation of a strategy plugin.
+
+The series is cut into rolling (or anchored) in-sample windows, each followed by an
+out-of-sample window. For every window the params grid from STRATEGY_PARAMS_UI is scored
+in-sample, and the best combination is then run out-of-sample. The OOS segments are
+stitched together into one OOS equity curve.
+
+Work is split across a process pool in batches of param combinations. Each worker computes
+the indicators and signal table of each combination once over the full series (see
+api/backtest.py) and then simulates every window from that table. Overlapping windows
+therefore never recompute indicators, and modules with get_sweep_columns() compute a
+batch's indicators for all its lengths in one pass.
+
+    python -m api.walkforward sma_crossover_strategy --symbol BTC-USDT-SWAP --timeframe 1h \\
+        --is-bars 1000 --oos-bars 250 --workers 8
+"""
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from api.plugins import load_strategy_module
+from api.params import normalize_params, params_hash
+from api.backtest import prepare_many, simulate, performance, DEFAULT_FEE_BPS
+from api.market_data import required_bars
+
+STRATEGY_DIR = Path(__file__).resolve().parent / "strategies"
+MAX_COMBINATIONS = 200
+OBJECTIVES = ("sharpe", "total_return")
+
+Window = Tuple[int, int, int]  # (in-sample start, out-of-sample start, out-of-sample end)
+
+
+def param_grid(params_ui: Dict[str, Dict[str, Any]], max_combinations: int = MAX_COMBINATIONS,
+               seed: int = 1) -> List[Dict[str, Any]]:
+    """Every min..max/step (or option) combination, randomly subsampled down to max_combinations."""
+    axes = {}
+    for name, cfg in params_ui.items():
+        if cfg.get("options"):
+            axes[name] = list(cfg["options"])
+        elif cfg.get("type", "number") == "number" and cfg.get("min") is not None and cfg.get("max") is not None:
+            step = cfg.get("step") or 1
+            count = int(round((cfg["max"] - cfg["min"]) / step)) + 1
+            axes[name] = [cfg["min"] + k * step for k in range(count)]
+        else:
+            axes[name] = [cfg.get("default")]
+    total = 1
+    for values in axes.values(): total *= len(values)
+    names = list(axes)
+    if total <= max_combinations:
+        return [dict(zip(names, combo)) for combo in itertools.product(*axes.values())]
+    rng = random.Random(seed)
+    picks = set()
+    while len(picks) < max_combinations:
+        picks.add(tuple(rng.randrange(len(axes[n])) for n in names))
+    return [{n: axes[n][i] for n, i in zip(names, pick)} for pick in sorted(picks)]
+
+
+def make_windows(n_bars: int, is_bars: int, oos_bars: int, step: Optional[int] = None, anchored: bool = False,
+                 warmup: int = 0) -> List[Window]:
+    """Windows over [warmup, n_bars); the OOS windows tile the tail of the series without overlap by default."""
+    step = step or oos_bars
+    windows = []
+    is_start = warmup
+    oos_start = warmup + is_bars
+    while oos_start + oos_bars <= n_bars:
+        windows.append((warmup if anchored else is_start, oos_start, oos_start + oos_bars))
+        is_start += step
+        oos_start += step
+    return windows
+
+
+# --- Worker side ---
+_WF_MODULE = None
+_WF_DF: Optional[pd.DataFrame] = None
+
+
+def _worker_init(name: str, filepath: str, df: pd.DataFrame):
+    global _WF_MODULE, _WF_DF
+    _WF_MODULE = load_strategy_module(name, filepath)
+    _WF_DF = df
+
+
+def _evaluate_combos(params_list: List[Dict[str, Any]], windows: List[Window], timeframe: str, fee_bps: float):
+    """Scores a batch of param combinations on every window: per combo [(IS metrics, OOS metrics, OOS returns)]."""
+    results = []
+    for table, open_, close in prepare_many(_WF_MODULE, _WF_DF, params_list):
+        out = []
+        for is_start, oos_start, oos_end in windows:
+            is_ret, is_trades = simulate(table, open_, close, is_start, oos_start, fee_bps)
+            oos_ret, oos_trades = simulate(table, open_, close, oos_start, oos_end, fee_bps)
+            out.append((performance(is_ret, timeframe, is_trades), performance(oos_ret, timeframe, oos_trades),
+                        oos_ret.astype(np.float32)))
+        results.append(out)
+    return results
+
+
+# --- Parent side ---
+def _score(metrics: Dict[str, Any], objective: str) -> Tuple[float, float]:
+    return metrics.get(objective, 0.0), metrics.get("total_return", 0.0)
+
+
+def walk_forward(strategy: str, df: pd.DataFrame, timeframe: str, is_bars: int, oos_bars: int,
+                 step: Optional[int] = None, anchored: bool = False, objective: str = "sharpe",
+                 max_combinations: int = MAX_COMBINATIONS, fee_bps: float = DEFAULT_FEE_BPS,
+                 workers: Optional[int] = None, warmup: Optional[int] = None, seed: int = 1) -> Dict[str, Any]:
+    """Runs the walk-forward for api/strategies/<strategy>.py over `df` (OHLCV + 'timestamp') and returns a JSON-able report."""
+    if objective not in OBJECTIVES: raise ValueError(f"objective must be one of {OBJECTIVES}")
+    filepath = str(STRATEGY_DIR / f"{strategy}.py")
+    module = load_strategy_module(strategy, filepath)
+    if module is None: raise ValueError(f"Strategy '{strategy}' could not be loaded.")
+
+    # Normalize and dedupe the grid (several raw points can snap to the same params)
+    combos: Dict[str, Dict[str, Any]] = {}
+    for raw in param_grid(module.STRATEGY_PARAMS_UI, max_combinations, seed):
+        params = normalize_params(module, raw)
+        combos.setdefault(params_hash(params), params)
+    if warmup is None:
+        warmup = max(required_bars(module, p, margin=0, timeframe=timeframe) for p in combos.values())
+    windows = make_windows(len(df), is_bars, oos_bars, step, anchored, warmup)
+    if not windows: raise ValueError(f"{len(df)} bars is not enough for warm-up {warmup} + {is_bars} IS + {oos_bars} OOS.")
+
+    workers = workers or os.cpu_count() or 1
+    hashes = list(combos)
+    print(f"--- Walk-forward {strategy}: {len(hashes)} param sets x {len(windows)} windows on {workers} workers")
+    ctx = multiprocessing.get_context("spawn")
+    size = max(1, -(-len(hashes) // (workers * 4)))  # a few batches per worker keeps the pool balanced
+    batches = [hashes[i:i + size] for i in range(0, len(hashes), size)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_worker_init,
+                             initargs=(strategy, filepath, df)) as pool:
+        done = pool.map(_evaluate_combos, [[combos[h] for h in batch] for batch in batches],
+                        itertools.repeat(windows), itertools.repeat(timeframe), itertools.repeat(fee_bps))
+        results = {h: r for batch, res in zip(batches, done) for h, r in zip(batch, res)}
+
+    report_windows, oos_segments = [], []
+    timestamps = df['timestamp'].to_numpy()
+    for w, (is_start, oos_start, oos_end) in enumerate(windows):
+        best = max(hashes, key=lambda h: _score(results[h][w][0], objective))
+        is_metrics, oos_metrics, oos_ret = results[best][w]
+        oos_segments.append(oos_ret.astype(np.float64))
+        report_windows.append({"is_from": int(timestamps[is_start]), "oos_from": int(timestamps[oos_start]),
+                               "oos_to": int(timestamps[oos_end - 1]), "params": combos[best], "params_hash": best,
+                               "in_sample": is_metrics, "out_of_sample": oos_metrics})
+    oos_all = np.concatenate(oos_segments)
+    chosen = [w["params_hash"] for w in report_windows]
+    return {"strategy": strategy, "timeframe": timeframe, "bars": len(df), "warmup": warmup,
+            "is_bars": is_bars, "oos_bars": oos_bars, "anchored": anchored, "objective": objective,
+            "param_sets": len(hashes), "windows": report_windows,
+            "out_of_sample": performance(oos_all, timeframe, sum(w["out_of_sample"]["trades"] for w in report_windows)),
+            "param_stability": round(max(chosen.count(h) for h in set(chosen)) / len(chosen), 4)}
+
+
+async def _load_df(args) -> pd.DataFrame:
+    from api.market_data import ohlcv_to_dataframe, fetch_ohlcv_df, close_exchanges
+    if args.source == "store":
+        from api.candle_store import CandleStore, DEFAULT_CANDLE_DB
+        store = CandleStore(args.db or DEFAULT_CANDLE_DB)
+        try:
+            return ohlcv_to_dataframe(store.read(args.exchange, args.symbol, args.timeframe, limit=args.bars))
+        finally:
+            store.close()
+    try:
+        return await fetch_ohlcv_df(args.exchange, args.symbol, args.timeframe, args.bars)
+    finally:
+        await close_exchanges()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation of a strategy module.")
+    parser.add_argument("strategy", help="Module name in api/strategies (without .py).")
+    parser.add_argument("--exchange", default="okx")
+    parser.add_argument("--symbol", default="BTC-USDT-SWAP")
+    parser.add_argument("--timeframe", default="1h")
+    parser.add_argument("--bars", type=int, default=5000)
+    parser.add_argument("--source", choices=("store", "fetch"), default="store",
+                        help="Read from the local candle store (see api.backfill) or fetch from the exchange backend.")
+    parser.add_argument("--db")
+    parser.add_argument("--is-bars", type=int, default=1000)
+    parser.add_argument("--oos-bars", type=int, default=250)
+    parser.add_argument("--step", type=int)
+    parser.add_argument("--anchored", action="store_true")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="sharpe")
+    parser.add_argument("--max-combinations", type=int, default=MAX_COMBINATIONS)
+    parser.add_argument("--fee-bps", type=float, default=DEFAULT_FEE_BPS)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    frame = asyncio.run(_load_df(args))
+    report = walk_forward(args.strategy, frame, args.timeframe, args.is_bars, args.oos_bars, step=args.step,
+                          anchored=args.anchored, objective=args.objective, max_combinations=args.max_combinations,
+                          fee_bps=args.fee_bps, workers=args.workers)
+    text = json.dumps(report, indent=2)
+    if args.output: Path(args.output).write_text(text)
+    print(text if not args.output else f"--- Report written to {args.output}: OOS {report['out_of_sample']}")
+    sys.exit(0)
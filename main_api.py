@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 print("--- Starting Crypto Analysis API with Pluggable Strategies ---")
 
-import sys, os, json, traceback, glob, importlib.util
+import sys, os, json, time, asyncio, traceback, glob
 from pathlib import Path
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Query, Request
-from fastapi.responses import HTMLResponse
+from typing import Dict, Any, Optional
+from fastapi import FastAPI, Query, Request, HTTPException
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv; load_dotenv()
@@ -38,26 +39,87 @@ ENABLED_STRATEGIES = [
     "sma_crossover_strategy","ema_simple_crossover","bollinger_band_mean_reversion",
     "macd_trend_strategy","rsi_mean_reversion","awesome_oscillator_zero_cross",
     "cci_strategy","chaikin_money_flow","hma_slope_trend_strategy",
-    "rate_of_change_rocstrategy","stochastic_oscilator","trix_signal_line","vwap_cross_strategy"
+    "rate_of_change_rocstrategy","stochastic_oscilator","trix_signal_line","vwap_cross_strategy",
+    "dsl_rule_strategy"
 ]
 
 LOADED_STRATEGIES_FOR_UI = {}
 _INTERNAL_STRATEGY_MODULES = {}
+SIGNAL_HISTORY = None
+POSITION_BOOK = None
+STRATEGY_SANDBOX = None
+ALERT_ENGINE = None
+_ALERT_TASKS = []
+VIEW_STORE = None
+VIEW_SCHEDULER = None
+JOB_QUEUE = None
+JOB_RUNNER = None
 
 # Absolute paths
 BASE_DIR = Path(__file__).resolve().parent
 TEMPLATES_DIR = BASE_DIR / "api" / "templates"
 STRATEGY_DIR = BASE_DIR / "api" / "strategies"
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
+SIGNAL_HISTORY_DB = os.getenv("SIGNAL_HISTORY_DB", str(DATA_DIR / "signal_history.db"))
+POSITIONS_SNAPSHOT = os.getenv("POSITIONS_SNAPSHOT", str(DATA_DIR / "positions.json"))
+CHART_HISTORY_BARS = int(os.getenv("CHART_HISTORY_BARS", "500"))
+# /api/chart/delta clients further behind than this many bars are told to reload the full chart
+CHART_DELTA_MAX_BARS = int(os.getenv("CHART_DELTA_MAX_BARS", "200"))
+# Downsampled chart prefixes kept per (chart, zoom level) for ?resolution= requests
+CHART_LOD_CACHE_SIZE = int(os.getenv("CHART_LOD_CACHE_SIZE", "256"))
+# Run strategy plugins in per-strategy worker processes (api/sandbox.py) instead of in-process
+USE_STRATEGY_SANDBOX = os.getenv("STRATEGY_SANDBOX", "0").lower() in ("1", "true", "yes")
+# Bar-close alert rules (api/alerts.py); disabled unless ALERT_RULES points at a rules JSON file
+ALERT_RULES = os.getenv("ALERT_RULES")
+ALERT_EXCHANGE = os.getenv("ALERT_EXCHANGE", "okx")
+ALERT_SYMBOLS = [s.strip() for s in os.getenv("ALERT_SYMBOLS", "BTC-USDT-SWAP,ETH-USDT-SWAP").split(",") if s.strip()]
+ALERT_TIMEFRAMES = [t.strip() for t in os.getenv("ALERT_TIMEFRAMES", "1h").split(",") if t.strip()]
+ALERT_FILE = os.getenv("ALERT_FILE", str(DATA_DIR / "alerts.jsonl"))
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+# Materialized views (api/views.py): JSON list of combinations refreshed at every bar boundary
+VIEWS_CONFIG = os.getenv("VIEWS_CONFIG")
+# Max number of extra views created for combinations requested through the UI (0 = configured views only)
+VIEWS_AUTO_REGISTER = int(os.getenv("VIEWS_AUTO_REGISTER", "0"))
+# Batch jobs (api/jobs.py): in-process workers draining the job queue (0 = the API only enqueues; run worker.py)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Max tasks accepted in one POST /api/jobs
+JOB_MAX_TASKS = int(os.getenv("JOB_MAX_TASKS", "100000"))
+
+from api.plugins import load_strategy_module
+from api.signal_history import SignalHistory
+from api.positions import PositionBook
+from api.params import normalize_params, params_hash, schema_for
+from api.sandbox import StrategySandbox, SandboxError, SandboxTimeout
+from api.alerts import AlertEngine, RuleSet, FileNotifier, WebhookNotifier, alert_loop
+from api.views import View, ViewSpec, ViewStore, ViewScheduler, load_specs
+from api.patterns import PatternIndex, detect_all, pattern_bits, LOOKBACK as PATTERN_LOOKBACK
+from api.vwap import VWAPBook, session_start, parse_anchor
+from api.exchanges import timeframe_to_ms
+from api.downsample import LODCache
+from api.jobs import JobQueue, JobRunner, TASK_KINDS
+if DATA_LIBS_AVAILABLE:
+    from api.market_data import (fetch_for_strategy, fetch_ohlcv_df, required_bars, trim_to_lookback, close_exchanges,
+                                 fetch_stats, get_exchange, OHLCV_COLUMNS, MAX_HISTORY_BARS)
+    from api import indicators
+    from api.export import (PYARROW_AVAILABLE, FORMATS as EXPORT_FORMATS, DEFAULT_EXPORT_CHUNK_BARS, iter_store_chunks,
+                            iter_frame_chunks, iter_indicator_frames, stream_export)
+
+PATTERN_INDEX = PatternIndex()  # last-bar candlestick masks filled by /api/patterns/scan
+VWAP_BOOK = VWAPBook()  # running session sums per market for /api/vwap
+CHART_LOD = LODCache(CHART_LOD_CACHE_SIZE)  # downsampled chart prefixes for ?resolution=
 
 print("TEMPLATE DIR:", TEMPLATES_DIR)
 print("STRATEGY DIR:", STRATEGY_DIR)
 
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
+_STRATEGY_FILES = {}
+
 def load_strategies():
-    global LOADED_STRATEGIES_FOR_UI, _INTERNAL_STRATEGY_MODULES
+    global LOADED_STRATEGIES_FOR_UI, _INTERNAL_STRATEGY_MODULES, _STRATEGY_FILES
     LOADED_STRATEGIES_FOR_UI = {}
     _INTERNAL_STRATEGY_MODULES = {}
+    _STRATEGY_FILES = {}
 
     files = glob.glob(str(STRATEGY_DIR / "*.py"))
     print("Found strategy files:", files)
@@ -67,19 +129,13 @@ def load_strategies():
         if name.startswith("__") or name not in ENABLED_STRATEGIES:
             continue
         try:
-            spec = importlib.util.spec_from_file_location(name, filepath)
-            if spec is None or spec.loader is None:
-                print(f"!!! Spec error for {filepath}")
-                continue
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-
-            required = ['STRATEGY_NAME','calculate_strategy_indicators','run_strategy','STRATEGY_PARAMS_UI','get_chart_overlay_data']
-            if not all(hasattr(module, r) for r in required):
-                print(f"!!! Incomplete strategy {filepath}")
+            module = load_strategy_module(name, filepath)
+            if module is None:
                 continue
 
+            schema_for(module)  # Validate STRATEGY_PARAMS_UI up front
             _INTERNAL_STRATEGY_MODULES[name] = module
+            _STRATEGY_FILES[name] = filepath
             LOADED_STRATEGIES_FOR_UI[name] = {
                 "name": module.STRATEGY_NAME,
                 "slug": getattr(module, 'STRATEGY_SLUG', name),
@@ -91,13 +147,209 @@ def load_strategies():
             print(f"!!! Error loading {filepath}: {e}")
             traceback.print_exc()
 
+def _last_bar_ts(df) -> Optional[int]:
+    """Millisecond timestamp of the last row (from 'timestamp' column or DatetimeIndex)."""
+    if df is None or len(df) == 0: return None
+    if 'timestamp' in df.columns: return int(df['timestamp'].iloc[-1])
+    if isinstance(df.index, pd.DatetimeIndex): return int(df.index[-1].timestamp() * 1000)
+    return None
+
+def _prepare_analysis(module_name: str, df, params: Dict[str, Any], symbol: str, timeframe: str,
+                      current_position_type: Optional[str], account: Optional[str], lookback_only: bool):
+    """Normalizes params, trims to the lookback and resolves the position to feed run_strategy."""
+    module = _INTERNAL_STRATEGY_MODULES[module_name]
+    params = normalize_params(module, params)
+    if lookback_only:
+        df = trim_to_lookback(df, required_bars(module, params, timeframe=timeframe))
+    bar_ts = _last_bar_ts(df)
+    if account and current_position_type is not None:
+        # the book's position is what gets applied and reported as position_before; a second source would diverge
+        raise ValueError("Pass either current_position_type or account, not both.")
+    # keyed by slug, like the signal log, so both stores name a strategy the same way
+    strategy = getattr(module, 'STRATEGY_SLUG', module_name)
+    position_key = (account, strategy, symbol, timeframe) if account and POSITION_BOOK is not None else None
+    if position_key and current_position_type is None:
+        current_position_type = POSITION_BOOK.position_for(position_key, bar_ts)
+    return module, params, df, bar_ts, position_key, current_position_type
+
+def _finish_analysis(module_name: str, module, params: Dict[str, Any], result: Dict[str, Any], exchange: str, symbol: str,
+                     timeframe: str, bar_ts: Optional[int], position_key, current_position_type: Optional[str],
+                     record: bool = True):
+    """Applies the signal to the position book and (unless `record` is False) appends it to the signal log."""
+    if position_key and bar_ts is not None:
+        result["position_before"] = current_position_type
+        result["position"] = POSITION_BOOK.apply(position_key, bar_ts, result.get("signal", "HOLD"))
+        POSITION_BOOK.maybe_snapshot()
+    if record and SIGNAL_HISTORY is not None and bar_ts is not None:
+        try:
+            SIGNAL_HISTORY.record(getattr(module, 'STRATEGY_SLUG', module_name), params, exchange, symbol, timeframe, bar_ts, result,
+                                  p_hash=params_hash(params))
+        except Exception as e:
+            print(f"!!! Signal history write failed for {module_name}: {e}")
+    return result
+
+def run_analysis(module_name: str, df, params: Dict[str, Any], exchange: str, symbol: str, timeframe: str,
+                 current_position_type: Optional[str] = None, account: Optional[str] = None, lookback_only: bool = False,
+                 record: bool = True):
+    """
+    Runs indicators + run_strategy for one loaded module (in-process) and appends the result to the signal log.
+    Params are normalized against the module's schema first, so column names and keys are canonical.
+    With an `account`, the position is read from / written back to POSITION_BOOK instead of being passed in
+    (passing both raises ValueError).
+    With `lookback_only`, indicators are computed on just the bars the module needs for a signal.
+    With record=False (display-only refreshes such as chart polling) nothing is written to the signal log.
+    Returns (df with indicator columns, signal result).
+    """
+    module, params, df, bar_ts, position_key, current_position_type = _prepare_analysis(
+        module_name, df, params, symbol, timeframe, current_position_type, account, lookback_only)
+    df = module.calculate_strategy_indicators(df, params)
+    result = module.run_strategy(df, params, current_position_type=current_position_type)
+    _finish_analysis(module_name, module, params, result, exchange, symbol, timeframe, bar_ts, position_key, current_position_type,
+                     record=record)
+    return df, result
+
+async def run_analysis_async(module_name: str, df, params: Dict[str, Any], exchange: str, symbol: str, timeframe: str,
+                             current_position_type: Optional[str] = None, account: Optional[str] = None,
+                             lookback_only: bool = False, return_df: bool = True, record: bool = True):
+    """run_analysis() for request handlers: uses the strategy sandbox when enabled."""
+    if STRATEGY_SANDBOX is None:
+        return run_analysis(module_name, df, params, exchange, symbol, timeframe, current_position_type=current_position_type,
+                            account=account, lookback_only=lookback_only, record=record)
+    module, params, df, bar_ts, position_key, current_position_type = _prepare_analysis(
+        module_name, df, params, symbol, timeframe, current_position_type, account, lookback_only)
+    out_df, result = await STRATEGY_SANDBOX.evaluate(module_name, df, params, current_position_type, return_df=return_df)
+    _finish_analysis(module_name, module, params, result, exchange, symbol, timeframe, bar_ts, position_key, current_position_type,
+                     record=record)
+    return (out_df if out_df is not None else df), result
+
+def evaluate_strategy(module_name: str, df, params: Dict[str, Any], exchange: str, symbol: str, timeframe: str,
+                      current_position_type: Optional[str] = None, account: Optional[str] = None,
+                      lookback_only: bool = True) -> Dict[str, Any]:
+    """Signal-only variant of run_analysis(): computes on the required lookback and returns the result."""
+    return run_analysis(module_name, df, params, exchange, symbol, timeframe, current_position_type=current_position_type,
+                        account=account, lookback_only=lookback_only)[1]
+
+def _latest_indicators(df) -> Dict[str, Any]:
+    """Last-row values of every non-OHLCV column, JSON friendly."""
+    out = {}
+    if df is None or df.empty: return out
+    for col in df.columns:
+        if col in OHLCV_COLUMNS: continue
+        val = df[col].iloc[-1]
+        if pd.isna(val): out[col] = None
+        elif isinstance(val, (int, float)) or hasattr(val, 'item'): out[col] = round(float(val), 6)
+        else: out[col] = str(val)
+    return out
+
+def _start_alerts():
+    """Compiles ALERT_RULES and starts one bar-close loop per alert timeframe over all loaded strategies."""
+    global ALERT_ENGINE
+    rules = RuleSet.from_file(ALERT_RULES)
+    notifiers = [FileNotifier(ALERT_FILE)] + ([WebhookNotifier(ALERT_WEBHOOK_URL)] if ALERT_WEBHOOK_URL else [])
+    ALERT_ENGINE = AlertEngine(rules, notifiers)
+    modules = dict(_INTERNAL_STRATEGY_MODULES)
+    params = {name: normalize_params(m, {}) for name, m in modules.items()}
+    for tf in ALERT_TIMEFRAMES:
+        fetch_bars = max((required_bars(m, params[name], timeframe=tf) for name, m in modules.items()), default=2)
+        _ALERT_TASKS.append(asyncio.create_task(alert_loop(ALERT_ENGINE, modules, params, ALERT_EXCHANGE,
+                                                           ALERT_SYMBOLS, tf, fetch_bars)))
+    print(f"Alerts: {len(rules)} rules on {len(ALERT_SYMBOLS)} symbols x {ALERT_TIMEFRAMES} -> {ALERT_FILE}"
+          + (f" + {ALERT_WEBHOOK_URL}" if ALERT_WEBHOOK_URL else ""))
+
+def _analysis_payload(module, exchange: str, symbol: str, timeframe: str, df, signal: Dict[str, Any],
+                      params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "strategy_name": module.STRATEGY_NAME,
+        "asset_analyzed": symbol, "exchange": exchange, "timeframe": timeframe,
+        "strategy_signal": signal,
+        "latest_indicators": _latest_indicators(df),
+        "raw_ohlcv_data_for_chart": df[OHLCV_COLUMNS].to_dict(orient='records'),
+        "strategy_specific_chart_data": module.get_chart_overlay_data(df, params),
+        "llm_analysis": None
+    }
+
+def _signal_payload(module_name: str, module, params: Dict[str, Any], exchange: str, symbol: str, timeframe: str,
+                    bars_used: int, bar_ts: int, result: Dict[str, Any]) -> Dict[str, Any]:
+    return {"strategy": getattr(module, 'STRATEGY_SLUG', module_name), "params": params, "params_hash": params_hash(params),
+            "exchange": exchange, "symbol": symbol, "timeframe": timeframe, "bars_used": bars_used,
+            "bar_ts": bar_ts, **result}
+
+def _view_key(exchange: str, symbol: str, timeframe: str, module_name: str, params: Dict[str, Any]):
+    return ViewStore.key(exchange, symbol, timeframe, module_name, params_hash(params))
+
+def _make_view(module_name: str, module, params: Dict[str, Any], exchange: str, symbol: str, timeframe: str,
+               df, signal: Dict[str, Any], compute_ms: float) -> View:
+    bar_ts = int(df['timestamp'].iloc[-1])
+    return View(_analysis_payload(module, exchange, symbol, timeframe, df, signal, params),
+                _signal_payload(module_name, module, params, exchange, symbol, timeframe,
+                                min(len(df), required_bars(module, params, timeframe=timeframe)), bar_ts, signal),
+                bar_ts, len(df), compute_ms)
+
+async def _refresh_view(spec: ViewSpec) -> View:
+    """Fetch + full analysis for one view spec (what /analyze_ui_with_strategy would do on a miss)."""
+    t0 = time.perf_counter()
+    module = _resolve_module(spec.strategy)
+    df = await fetch_for_strategy(module, spec.params, spec.exchange, spec.symbol, spec.timeframe, min_bars=spec.limit)
+    if df.empty: raise RuntimeError(f"No OHLCV data for {spec.symbol} on {spec.exchange} ({spec.timeframe}).")
+    df, signal = await run_analysis_async(spec.strategy, df, spec.params, spec.exchange, spec.symbol, spec.timeframe)
+    return _make_view(spec.strategy, module, spec.params, spec.exchange, spec.symbol, spec.timeframe, df, signal,
+                      (time.perf_counter() - t0) * 1000)
+
+def _start_views():
+    global VIEW_STORE, VIEW_SCHEDULER
+    VIEW_STORE = ViewStore(lambda ex, sym, tf: get_exchange(ex).milliseconds(sym, tf), max_auto=VIEWS_AUTO_REGISTER)
+    if VIEWS_CONFIG:
+        specs = load_specs(VIEWS_CONFIG, lambda name, p: normalize_params(_resolve_module(name), p),
+                           params_hash, CHART_HISTORY_BARS)
+        for key, spec in specs.items(): VIEW_STORE.add(key, spec)
+    VIEW_SCHEDULER = ViewScheduler(VIEW_STORE, _refresh_view)
+    VIEW_SCHEDULER.start()
+    print(f"Materialized views: {len(VIEW_STORE.specs)} configured, up to {VIEWS_AUTO_REGISTER} auto-registered.")
+
+def _resolve_module(strategy_module_name: str):
+    module = _INTERNAL_STRATEGY_MODULES.get(strategy_module_name)
+    if module is None: raise HTTPException(404, f"Strategy '{strategy_module_name}' not loaded.")
+    return module
+
+def _start_jobs():
+    global JOB_QUEUE, JOB_RUNNER
+    JOB_QUEUE = JobQueue()
+    if JOB_WORKERS > 0 and DATA_LIBS_AVAILABLE:
+        JOB_RUNNER = JobRunner(JOB_QUEUE, dict(_INTERNAL_STRATEGY_MODULES), fetch_ohlcv_df, JOB_WORKERS)
+        JOB_RUNNER.start()
+    print(f"Job queue: {JOB_QUEUE.db_path} ({JOB_WORKERS if JOB_RUNNER else 0} in-process workers)")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global SIGNAL_HISTORY, POSITION_BOOK, STRATEGY_SANDBOX
     load_strategies()
     if not LOADED_STRATEGIES_FOR_UI:
         print("!!! WARNING: No strategies loaded.")
+    SIGNAL_HISTORY = SignalHistory(SIGNAL_HISTORY_DB)
+    print("Signal history:", SIGNAL_HISTORY_DB)
+    POSITION_BOOK = PositionBook(POSITIONS_SNAPSHOT)
+    print(f"Position book: {POSITION_BOOK.load()} tracked markets restored from {POSITIONS_SNAPSHOT}")
+    if USE_STRATEGY_SANDBOX:
+        STRATEGY_SANDBOX = StrategySandbox(_STRATEGY_FILES)
+        STRATEGY_SANDBOX.warm()
+        print(f"Strategy sandbox enabled (timeout {STRATEGY_SANDBOX.timeout_s}s, RSS budget {STRATEGY_SANDBOX.max_rss_mb}MB).")
+    if ALERT_RULES and DATA_LIBS_AVAILABLE:
+        _start_alerts()
+    if (VIEWS_CONFIG or VIEWS_AUTO_REGISTER) and DATA_LIBS_AVAILABLE:
+        _start_views()
+    _start_jobs()
     yield
     print("--- Shutdown cleanup ---")
+    if JOB_RUNNER is not None: await JOB_RUNNER.stop()
+    if JOB_QUEUE is not None: JOB_QUEUE.close()
+    if VIEW_SCHEDULER is not None: await VIEW_SCHEDULER.stop()
+    for task in _ALERT_TASKS: task.cancel()
+    _ALERT_TASKS.clear()
+    if ALERT_ENGINE is not None: await ALERT_ENGINE.close()
+    POSITION_BOOK.snapshot()
+    SIGNAL_HISTORY.close()
+    if STRATEGY_SANDBOX is not None: STRATEGY_SANDBOX.shutdown()
+    if DATA_LIBS_AVAILABLE: await close_exchanges()
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
@@ -122,17 +374,393 @@ async def analyze_ui_with_strategy(
     exchange: str = Query("okx"),
     symbol: str = Query("BTC-USDT-SWAP"),
     timeframe: str = Query("4h"),
-    strategy_module_name: str = Query(...)
+    strategy_module_name: str = Query(...),
+    limit: int = Query(CHART_HISTORY_BARS, ge=10, le=5000),
+    resolution: Optional[int] = Query(None, ge=50, le=10000, description="Chart width in px: downsample to about one candle per px")
 ):
-    # Paste all your existing fetch, indicator, LLM and strategy logic here
+    request_params = dict(request.query_params)
+    analysis_results, error_message = None, None
+    try:
+        if not DATA_LIBS_AVAILABLE: raise RuntimeError("Data libraries (pandas, pandas-ta, ccxt) are not installed.")
+        module = _resolve_module(strategy_module_name)
+        params = normalize_params(module, request_params)
+        request_params.update(params)
+        key = _view_key(exchange, symbol, timeframe, strategy_module_name, params)
+        view = VIEW_STORE.get(key, min_bars=limit) if VIEW_STORE is not None else None
+        if view is not None:
+            analysis_results = view.analysis
+        else:
+            t0 = time.perf_counter()
+            df = await fetch_for_strategy(module, params, exchange, symbol, timeframe, min_bars=limit)
+            if df.empty: raise RuntimeError(f"No OHLCV data returned for {symbol} on {exchange} ({timeframe}).")
+            df, signal = await run_analysis_async(strategy_module_name, df, params, exchange, symbol, timeframe)
+            analysis_results = _analysis_payload(module, exchange, symbol, timeframe, df, signal, params)
+            if VIEW_STORE is not None and VIEW_STORE.maybe_auto_register(
+                    key, ViewSpec(exchange, symbol, timeframe, strategy_module_name, params, limit=limit)):
+                VIEW_STORE.put(key, _make_view(strategy_module_name, module, params, exchange, symbol, timeframe, df, signal,
+                                               (time.perf_counter() - t0) * 1000))
+                VIEW_SCHEDULER.ensure(timeframe)
+        if resolution:
+            candles, overlays, level = CHART_LOD.get(key, analysis_results["raw_ohlcv_data_for_chart"],
+                                                     analysis_results["strategy_specific_chart_data"], resolution)
+            analysis_results = {**analysis_results, "raw_ohlcv_data_for_chart": candles,
+                                "strategy_specific_chart_data": overlays, "chart_zoom_level": level}
+    except HTTPException as e:
+        error_message = e.detail
+    except Exception as e:
+        print(f"!!! Analysis failed for {strategy_module_name} {symbol}: {e}"); traceback.print_exc()
+        error_message = str(e)
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "analysis_results": {},  # your analysis results
-        "error_message": None,
-        "request_params": {},
+        "analysis_results": analysis_results,
+        "error_message": error_message,
+        "request_params": request_params,
         "available_strategies": LOADED_STRATEGIES_FOR_UI
     })
 
+@app.get("/api/signal")
+async def api_signal(request: Request, strategy_module_name: str = Query(...), exchange: str = Query("okx"),
+                     symbol: str = Query("BTC-USDT-SWAP"), timeframe: str = Query("4h"), account: Optional[str] = Query(None)):
+    """Signal only: fetches and computes just the module's required lookback."""
+    if not DATA_LIBS_AVAILABLE: raise HTTPException(503, "Data libraries not installed.")
+    module = _resolve_module(strategy_module_name)
+    params = normalize_params(module, dict(request.query_params))
+    if VIEW_STORE is not None and account is None:  # views hold the flat-position signal
+        view = VIEW_STORE.get(_view_key(exchange, symbol, timeframe, strategy_module_name, params))
+        if view is not None: return view.signal
+    df = await fetch_for_strategy(module, params, exchange, symbol, timeframe)
+    if df.empty: raise HTTPException(502, f"No OHLCV data returned for {symbol} on {exchange}.")
+    try:
+        _, result = await run_analysis_async(strategy_module_name, df, params, exchange, symbol, timeframe, account=account,
+                                             lookback_only=True, return_df=False)
+    except SandboxError as e:
+        raise HTTPException(504 if isinstance(e, SandboxTimeout) else 500, str(e))
+    payload = _signal_payload(strategy_module_name, module, params, exchange, symbol, timeframe, len(df),
+                              int(df['timestamp'].iloc[-1]), result)
+    if df.attrs.get("stale"): payload["stale_age_ms"] = df.attrs["stale_age_ms"]  # exchange down: stored candles
+    return payload
+
+def _overlay_tail(overlays: Dict[str, Any], since: int) -> Dict[str, Any]:
+    """Points of every overlay series at or after `since` (ms); entries that aren't point lists pass through."""
+    out = {}
+    for key, series in (overlays or {}).items():
+        if isinstance(series, list): out[key] = [p for p in series if not isinstance(p, dict) or p.get("time", since) >= since]
+        else: out[key] = series
+    return out
+
+@app.get("/api/chart/delta")
+async def chart_delta(request: Request, strategy_module_name: str = Query(...), exchange: str = Query("okx"),
+                      symbol: str = Query("BTC-USDT-SWAP"), timeframe: str = Query("4h"), since: int = Query(..., ge=0)):
+    """
+    Candles and overlay points at or after `since`, the timestamp of the newest candle the client holds, so
+    the still-open bar is resent with its latest values. Indicators are computed on the strategy's lookback
+    plus the new bars only. Clients more than CHART_DELTA_MAX_BARS bars behind get "reset": true.
+    """
+    if not DATA_LIBS_AVAILABLE: raise HTTPException(503, "Data libraries not installed.")
+    module = _resolve_module(strategy_module_name)
+    params = normalize_params(module, dict(request.query_params))
+    behind = max(0, (get_exchange(exchange).milliseconds(symbol, timeframe) - since) // timeframe_to_ms(timeframe)) + 1
+    if behind > CHART_DELTA_MAX_BARS: return {"reset": True, "cursor": since}
+    df = await fetch_ohlcv_df(exchange, symbol, timeframe,
+                              min(required_bars(module, params, timeframe=timeframe) + behind, MAX_HISTORY_BARS))
+    if df.empty: raise HTTPException(502, f"No OHLCV data returned for {symbol} on {exchange}.")
+    try:
+        # Every open tab polls this; the signal log is written by real analyses, not chart refreshes
+        df, signal = await run_analysis_async(strategy_module_name, df, params, exchange, symbol, timeframe, record=False)
+    except SandboxError as e:
+        raise HTTPException(504 if isinstance(e, SandboxTimeout) else 500, str(e))
+    return {"reset": False, "cursor": int(df['timestamp'].iloc[-1]),
+            "candles": df.loc[df['timestamp'] >= since, OHLCV_COLUMNS].to_dict(orient='records'),
+            "overlays": _overlay_tail(module.get_chart_overlay_data(df, params), since),
+            "strategy_signal": signal, "latest_indicators": _latest_indicators(df)}
+
+def _sweep_values(values: str):
+    """'5,10,20' or 'start:stop:step' (stop inclusive)."""
+    if ":" in values:
+        start, stop, step = (float(v) for v in (values.split(":") + ["1"])[:3])
+        if step <= 0: raise ValueError("step must be > 0")
+        count = int(round((stop - start) / step)) + 1
+        return [start + i * step for i in range(min(max(count, 0), 500))]
+    return [v.strip() for v in values.split(",") if v.strip()]
+
+@app.get("/api/sweep")
+async def api_sweep(request: Request, strategy_module_name: str = Query(...), sweep: str = Query(...), values: str = Query(...),
+                    exchange: str = Query("okx"), symbol: str = Query("BTC-USDT-SWAP"), timeframe: str = Query("4h")):
+    """
+    Last-bar signal for every value of one param (other params from the query), on one fetch.
+    Modules with get_sweep_columns() compute the indicator for all values in a single pass.
+    A value whose run_strategy raises gets an "error" entry and no "signal" (it is not a HOLD).
+    """
+    if not DATA_LIBS_AVAILABLE: raise HTTPException(503, "Data libraries not installed.")
+    module = _resolve_module(strategy_module_name)
+    if sweep not in getattr(module, 'STRATEGY_PARAMS_UI', {}): raise HTTPException(400, f"Unknown param '{sweep}'.")
+    base = {k: v for k, v in request.query_params.items() if k not in ("sweep", "values")}
+    spec = schema_for(module).specs[sweep]
+    try:
+        # normalize_params falls back to the default on bad input; a swept value must be valid itself
+        swept = [spec.coerce(v) for v in _sweep_values(values)]
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, f"Invalid value for '{sweep}': {e}")
+    candidates = [normalize_params(module, {**base, sweep: v}) for v in swept]
+    params_list = list({params_hash(p): p for p in candidates}.values())
+    if not params_list: raise HTTPException(400, "No values to sweep.")
+    df = await fetch_ohlcv_df(exchange, symbol, timeframe, max(required_bars(module, p, timeframe=timeframe) for p in params_list))
+    if df.empty: raise HTTPException(502, f"No OHLCV data returned for {symbol} on {exchange}.")
+    if hasattr(module, 'get_sweep_columns'):
+        tail = df.iloc[-2:]  # run_strategy reads the last two rows
+        frames = [tail.assign(**{k: v[-2:] for k, v in cols.items()}) for cols in module.get_sweep_columns(df, params_list)]
+    else:
+        frames = [module.calculate_strategy_indicators(df.copy(), p) for p in params_list]
+    results, failed = [], 0
+    for frame, params in zip(frames, params_list):
+        try:
+            result = module.run_strategy(frame, params, current_position_type=None)
+        except Exception as e:
+            failed += 1
+            result = {"error": f"run_strategy failed: {type(e).__name__}: {e}"}
+        results.append({"params": params, "params_hash": params_hash(params), **result})
+    return {"strategy": getattr(module, 'STRATEGY_SLUG', strategy_module_name), "exchange": exchange, "symbol": symbol,
+            "timeframe": timeframe, "sweep": sweep, "bars_used": len(df), "bar_ts": int(df['timestamp'].iloc[-1]),
+            "failed": failed, "results": results}
+
+@app.get("/api/signals/changes")
+async def signal_changes(limit: int = Query(100, ge=1, le=5000), timeframe: Optional[str] = Query(None), strategy: Optional[str] = Query(None)):
+    if SIGNAL_HISTORY is None: raise HTTPException(503, "Signal history not initialised.")
+    return {"changes": SIGNAL_HISTORY.last_changes(limit=limit, timeframe=timeframe, strategy=strategy)}
+
+@app.get("/api/signals/flips")
+async def signal_flips(signal: str = Query("BUY"), timeframe: str = Query("4h"), strategy: Optional[str] = Query(None), bar_ts: Optional[int] = Query(None)):
+    if SIGNAL_HISTORY is None: raise HTTPException(503, "Signal history not initialised.")
+    return {"signal": signal.upper(), "timeframe": timeframe,
+            "flips": SIGNAL_HISTORY.flipped_to(signal.upper(), timeframe, strategy=strategy, bar_ts=bar_ts)}
+
+@app.get("/api/positions")
+async def list_positions(account: Optional[str] = Query(None), include_flat: bool = Query(False)):
+    if POSITION_BOOK is None: raise HTTPException(503, "Position book not initialised.")
+    return {"positions": POSITION_BOOK.positions(account=account, open_only=not include_flat)}
+
+@app.get("/api/sandbox/stats")
+async def sandbox_stats():
+    """Per-strategy latency percentiles and failure counts of the sandbox lanes."""
+    return {"enabled": STRATEGY_SANDBOX is not None, "strategies": STRATEGY_SANDBOX.stats() if STRATEGY_SANDBOX else {}}
+
+@app.get("/api/alerts/stats")
+async def alert_stats():
+    """Bar-close alert engine counters (rules, evaluations, fired alerts, last evaluation time)."""
+    if ALERT_ENGINE is None: return {"enabled": False}
+    return {"enabled": True, "rules": len(ALERT_ENGINE.rules), "symbols": ALERT_SYMBOLS,
+            "timeframes": ALERT_TIMEFRAMES, **ALERT_ENGINE.stats}
+
+async def _index_patterns(exchange: str, symbol: str, timeframe: str, trend_ema_length: int):
+    """Detects every candlestick pattern on the market's last bar and records it with its EMA trend."""
+    df = await fetch_ohlcv_df(exchange, symbol, timeframe, PATTERN_LOOKBACK + 4 * trend_ema_length + 2)
+    if len(df) < PATTERN_LOOKBACK + 1: return
+    mask = detect_all(df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())
+    close = df['close'].to_numpy()
+    ema = indicators.EMA(trend_ema_length)({'close': close})[-1]
+    trend = 0 if pd.isna(ema) or close[-1] == ema else (1 if close[-1] > ema else -1)
+    PATTERN_INDEX.record(exchange, symbol, timeframe, int(df['timestamp'].iloc[-1]), int(mask[-1]), trend)
+
+@app.get("/api/patterns/scan")
+async def pattern_scan(pattern: str = Query("ENGULFING"), direction: Optional[str] = Query(None, pattern="^(bullish|bearish)$"),
+                       trend: Optional[str] = Query(None, pattern="^(up|down)$"), timeframe: str = Query("4h"),
+                       exchange: str = Query("okx"), symbols: Optional[str] = Query(None),
+                       trend_ema_length: int = Query(20, ge=2, le=500)):
+    """
+    Markets whose last bar printed `pattern` (optionally only bullish/bearish, in an up/down trend vs the EMA).
+    With `symbols` (comma separated) those markets are fetched and re-indexed first; otherwise the index is queried as is.
+    """
+    if not DATA_LIBS_AVAILABLE: raise HTTPException(503, "Data libraries not installed.")
+    try:
+        pattern_bits(pattern, direction)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if symbols:
+        names = [s.strip() for s in symbols.split(",") if s.strip()]
+        for name, res in zip(names, await asyncio.gather(
+                *(_index_patterns(exchange, n, timeframe, trend_ema_length) for n in names), return_exceptions=True)):
+            if isinstance(res, Exception): print(f"!!! Pattern scan of {name} failed: {res}")
+    matches = PATTERN_INDEX.query(timeframe, pattern, direction, {"up": 1, "down": -1}.get(trend), exchange=exchange)
+    return {"pattern": pattern.upper(), "direction": direction, "trend": trend, "timeframe": timeframe,
+            "indexed": len(PATTERN_INDEX), "matches": matches}
+
+async def _session_vwap(exchange: str, symbol: str, timeframe: str, anchor: str) -> Dict[str, Any]:
+    """Fetches only the bars the market's running VWAP hasn't seen (at most the current session) and updates it."""
+    tf_ms = timeframe_to_ms(timeframe)
+    now = get_exchange(exchange).milliseconds(symbol, timeframe)
+    since = max(VWAP_BOOK.last_ts(exchange, symbol, timeframe, anchor) or 0, session_start(now, anchor))
+    df = await fetch_ohlcv_df(exchange, symbol, timeframe, min(-(-(now - since) // tf_ms) + 2, MAX_HISTORY_BARS))
+    if df.empty: raise ValueError("no candles")
+    return VWAP_BOOK.update(exchange, symbol, timeframe, anchor, {c: df[c].to_numpy() for c in OHLCV_COLUMNS})
+
+@app.get("/api/vwap")
+async def session_vwap(symbols: str = Query(..., description="Comma separated"), anchor: str = Query("D"),
+                       timeframe: str = Query("5m"), exchange: str = Query("okx"),
+                       band_mult: float = Query(2.0, ge=0, le=10)):
+    """Session-anchored VWAP and std-dev bands of many markets, updated incrementally from running session sums."""
+    if not DATA_LIBS_AVAILABLE: raise HTTPException(503, "Data libraries not installed.")
+    try:
+        parse_anchor(anchor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    names = [s.strip() for s in symbols.split(",") if s.strip()]
+    out = {}
+    for name, res in zip(names, await asyncio.gather(
+            *(_session_vwap(exchange, n, timeframe, anchor) for n in names), return_exceptions=True)):
+        if isinstance(res, Exception):
+            print(f"!!! VWAP of {name} failed: {res}")
+            out[name] = {"error": str(res)}
+            continue
+        vwap, stdev = res["vwap"], res["stdev"]
+        levels = {"vwap": vwap, "stdev": stdev, "upper": vwap + band_mult * stdev, "lower": vwap - band_mult * stdev}
+        out[name] = {**res, **{k: None if pd.isna(v) else v for k, v in levels.items()}}
+    return {"anchor": anchor, "timeframe": timeframe, "exchange": exchange, "markets": out,
+            "tracked": len(VWAP_BOOK), "bars_fed": VWAP_BOOK.bars_fed}
+
+@app.get("/api/export")
+async def export_data(exchange: str = Query("okx"), symbol: str = Query("BTC-USDT-SWAP"), timeframe: str = Query("1h"),
+                      strategies: str = Query("", description="Comma separated strategy modules"),
+                      params: Optional[str] = Query(None, description='JSON {"module": {params}}'),
+                      format: str = Query("arrow", pattern="^(arrow|parquet)$"),
+                      source: str = Query("store", pattern="^(store|exchange)$"),
+                      since: Optional[int] = Query(None), until: Optional[int] = Query(None),
+                      limit: int = Query(CHART_HISTORY_BARS, ge=1, le=100_000, description="Bars, for source=exchange"),
+                      chunk_bars: int = Query(DEFAULT_EXPORT_CHUNK_BARS if DATA_LIBS_AVAILABLE else 100_000, ge=1000, le=1_000_000)):
+    """
+    Candles plus the indicator columns of `strategies`, streamed as an Arrow IPC stream or a Parquet file.
+    source=store reads the local candle store in chunk_bars pieces; source=exchange fetches the latest `limit` bars.
+    """
+    if not DATA_LIBS_AVAILABLE: raise HTTPException(503, "Data libraries not installed.")
+    if not PYARROW_AVAILABLE: raise HTTPException(503, "pyarrow is not installed; install it to export Arrow/Parquet.")
+    try:
+        raw_params = json.loads(params) if params else {}
+    except ValueError as e:
+        raise HTTPException(400, f"params is not valid JSON: {e}")
+    modules = {}
+    for name in filter(None, (s.strip() for s in strategies.split(","))):
+        module = _resolve_module(name)
+        modules[name] = (module, normalize_params(module, raw_params.get(name)))
+    filename = f"{exchange}_{symbol}_{timeframe}.{format}".replace("/", "_")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if source == "exchange":
+        df = await fetch_ohlcv_df(exchange, symbol, timeframe, limit, since=since)
+        frames = iter_indicator_frames(modules, iter_frame_chunks(df, chunk_bars), timeframe)
+        return StreamingResponse(stream_export(frames, format), media_type=EXPORT_FORMATS[format], headers=headers)
+
+    from api.candle_store import CandleStore, DEFAULT_CANDLE_DB
+    store = CandleStore(DEFAULT_CANDLE_DB)
+
+    def body():
+        try:
+            chunks = iter_store_chunks(store, exchange, symbol, timeframe, since, until, chunk_bars)
+            yield from stream_export(iter_indicator_frames(modules, chunks, timeframe), format)
+        finally:
+            store.close()
+    return StreamingResponse(body(), media_type=EXPORT_FORMATS[format], headers=headers)
+
+def _job_tasks(body: Dict[str, Any]) -> list:
+    """
+    Task dicts of a POST /api/jobs body: explicit "tasks" (each merged over "defaults") and/or a "grid" whose
+    symbols x timeframes x strategies x params lists are expanded. Params are normalized per strategy.
+    """
+    defaults = {"exchange": "okx", "kind": "signal", **(body.get("defaults") or {})}
+    raw = [{**defaults, **t} for t in body.get("tasks") or []]
+    grid = body.get("grid")
+    if grid:
+        raw += [{**defaults, "symbol": sym, "timeframe": tf, "strategy": name, "params": p}
+                for sym in grid.get("symbols") or [] for tf in grid.get("timeframes") or [defaults.get("timeframe", "4h")]
+                for name in grid.get("strategies") or [] for p in grid.get("params") or [{}]]
+    if len(raw) > JOB_MAX_TASKS: raise HTTPException(400, f"Too many tasks ({len(raw)} > {JOB_MAX_TASKS}).")
+    tasks = []
+    for i, t in enumerate(raw):
+        missing = [k for k in ("symbol", "timeframe", "strategy") if not t.get(k)]
+        if missing: raise HTTPException(400, f"Task {i} is missing {missing}.")
+        if t["kind"] not in TASK_KINDS: raise HTTPException(400, f"Task {i}: kind must be one of {list(TASK_KINDS)}.")
+        try:
+            timeframe_to_ms(t["timeframe"])
+        except (KeyError, ValueError, IndexError):
+            raise HTTPException(400, f"Task {i}: bad timeframe '{t['timeframe']}'.")
+        try:
+            t["params"] = normalize_params(_resolve_module(t["strategy"]), t.get("params"))
+        except ValueError as e:
+            raise HTTPException(400, f"Task {i}: {e}")
+        tasks.append(t)
+    return tasks
+
+@app.post("/api/jobs")
+async def submit_job(request: Request):
+    """
+    Queues a batch of signal/backtest tasks and returns the job id. Body:
+    {"tasks": [{"symbol", "timeframe", "strategy", "params", "kind", "bars"}], "grid": {...}, "defaults": {...}, "meta": {...}}
+    """
+    if JOB_QUEUE is None: raise HTTPException(503, "Job queue not initialised.")
+    try:
+        body = await request.json()
+    except ValueError as e:
+        raise HTTPException(400, f"Body is not valid JSON: {e}")
+    if not isinstance(body, dict): raise HTTPException(400, "Body must be a JSON object.")
+    tasks = _job_tasks(body)
+    if not tasks: raise HTTPException(400, "No tasks.")
+    job_id = await asyncio.to_thread(JOB_QUEUE.submit, tasks, body.get("meta"))
+    return {"job_id": job_id, "tasks": len(tasks)}
+
+@app.get("/api/jobs")
+async def list_jobs(limit: int = Query(50, ge=1, le=1000)):
+    if JOB_QUEUE is None: raise HTTPException(503, "Job queue not initialised.")
+    return {"jobs": JOB_QUEUE.jobs(limit), "runner": JOB_RUNNER.stats() if JOB_RUNNER else None}
+
+def _get_job(job_id: str) -> Dict[str, Any]:
+    if JOB_QUEUE is None: raise HTTPException(503, "Job queue not initialised.")
+    job = JOB_QUEUE.job(job_id)
+    if job is None: raise HTTPException(404, f"Job '{job_id}' not found.")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def job_progress(job_id: str):
+    """Status, done/failed counts, throughput (tasks/s) and ETA of one job."""
+    return _get_job(job_id)
+
+@app.get("/api/jobs/{job_id}/results")
+async def job_results(job_id: str, after: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=5000),
+                      stream: bool = Query(False, description="NDJSON stream of results as they finish")):
+    """
+    Finished tasks in completion order after the `after` cursor; pass the returned next_after to page on.
+    With stream=true the response is NDJSON that follows the job until it is no longer queued/running.
+    """
+    _get_job(job_id)
+    if not stream:
+        results = JOB_QUEUE.results(job_id, after, limit)
+        return {"job_id": job_id, "results": results, "next_after": results[-1]["cursor"] if results else after}
+
+    async def body():
+        cursor = after
+        while True:
+            status = JOB_QUEUE.job(job_id)["status"]  # read before the results, so the last ones aren't missed
+            rows = JOB_QUEUE.results(job_id, cursor, limit)
+            for row in rows: yield json.dumps(row) + "\n"
+            if rows: cursor = rows[-1]["cursor"]
+            elif status not in ("queued", "running"): return
+            else: await asyncio.sleep(0.5)
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Drops the job's queued tasks; tasks already running finish."""
+    _get_job(job_id)
+    return {"job_id": job_id, "cancelled_tasks": JOB_QUEUE.cancel(job_id)}
+
+@app.get("/api/views/stats")
+async def view_stats():
+    """Materialized view staleness (age, bar lag), request counts and refresh cost."""
+    if VIEW_STORE is None: return {"enabled": False, "chart_lod": CHART_LOD.stats()}
+    return {"enabled": True, "refresh_errors": VIEW_SCHEDULER.errors, "chart_lod": CHART_LOD.stats(), **VIEW_STORE.metrics()}
+
+@app.get("/api/fetch/stats")
+async def market_fetch_stats():
+    """Single-flight counters of the fetch layer, stale fallbacks, and per-exchange breaker / hedging state."""
+    if not DATA_LIBS_AVAILABLE: raise HTTPException(503, "Data libraries not available.")
+    return fetch_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main_api:app", host="127.0.0.1", port=8000, reload=True)
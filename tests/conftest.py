@@ -0,0 +1,19 @@
+# tests/conftest.py
+import numpy as np
+import pytest
+
+from api.candles import CandleArray
+
+
+@pytest.fixture(scope="session")
+def candles() -> CandleArray:
+    """1500 hourly bars of a random walk, with a flat stretch (zero gains and losses)."""
+    n = 1500
+    rng = np.random.default_rng(7)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    close[n // 4:n // 4 + 30] = close[n // 4 - 1]
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) * (1 + rng.uniform(0.0005, 0.01, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0.0005, 0.01, n))
+    ts = 1_600_000_000_000 + 3_600_000 * np.arange(n, dtype=np.int64)
+    return CandleArray(ts, open_, high, low, close, rng.uniform(1, 100, n))
@@ -0,0 +1,93 @@
+# tests/test_jobs.py
+"""
+JobQueue lease/attempt/steal bookkeeping on a temp-file SQLite database (no network, no pandas).
+Run with: python -m pytest -q tests
+"""
+import time
+
+import pytest
+
+from api.jobs import JobQueue
+
+LEASE_S = 0.05
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(str(tmp_path / "jobs.db"), lease_s=LEASE_S, max_attempts=2)
+    yield q
+    q.close()
+
+
+def _tasks(n):
+    return [{"symbol": f"S{i}", "timeframe": "1h", "strategy": "x", "params": {}} for i in range(n)]
+
+
+def _expire():
+    time.sleep(LEASE_S * 2)
+
+
+def test_expired_lease_is_claimed_again(queue):
+    job = queue.submit(_tasks(1))
+    [(task_id, _)] = queue.claim("a")
+    assert queue.start(task_id, "a")
+    assert queue.claim("b") == []  # lease still held
+    _expire()
+    assert [t for t, _ in queue.claim("b")] == [task_id]
+    assert not queue.start(task_id, "a") and queue.start(task_id, "b")
+    assert queue.complete(task_id, {"signal": "BUY"})
+    assert not queue.fail(task_id, "a", "late")  # the first worker no longer holds it
+    assert queue.job(job)["status"] == "done"
+
+
+def test_lost_worker_on_last_attempt_fails_the_task(queue):
+    job = queue.submit(_tasks(1))
+    for owner in ("a", "b"):  # max_attempts=2; each worker dies mid-task
+        [(task_id, _)] = queue.claim(owner)
+        assert queue.start(task_id, owner)
+        _expire()
+    assert queue.claim("c") == []
+    info = queue.job(job)
+    assert (info["status"], info["failed"], info["tasks"]) == ("finished_with_errors", 1, {"failed": 1})
+    [row] = queue.results(job)
+    assert row["attempts"] == 2 and "worker lost" in row["error"]
+
+
+def test_steal_takes_only_unstarted_tasks(queue):
+    queue.submit(_tasks(3))
+    ids = [t for t, _ in queue.claim("a", n=3)]
+    assert queue.start(ids[0], "a")
+    assert [t for t, _ in queue.steal("b", n=5)] == [ids[2], ids[1]]  # newest first, never the running one
+    assert not queue.start(ids[2], "a")  # stolen before it started
+    assert queue.start(ids[2], "b")
+    assert queue.steal("c", n=5) == [(ids[1], _tasks(3)[1])]
+    assert queue.steal("a", n=5) == [(ids[1], _tasks(3)[1])]  # only ids[1] is still unstarted
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    job = queue.submit(_tasks(1))
+    [(task_id, _)] = queue.claim("a")
+    queue.start(task_id, "a")
+    assert queue.fail(task_id, "a", "boom 1")
+    assert queue.job(job)["tasks"] == {"queued": 1}
+    [(again, _)] = queue.claim("b")
+    assert again == task_id and queue.start(task_id, "b")
+    assert queue.fail(task_id, "b", "boom 2")
+    info = queue.job(job)
+    assert (info["status"], info["failed"]) == ("finished_with_errors", 1)
+    [row] = queue.results(job)
+    assert (row["status"], row["attempts"], row["error"]) == ("failed", 2, "boom 2")
+
+
+def test_results_cursor_follows_completion_order(queue):
+    job = queue.submit(_tasks(4))
+    ids = [t for t, _ in queue.claim("a", n=4)]
+    for task_id in ids: queue.start(task_id, "a")
+    for task_id in (ids[2], ids[0], ids[3], ids[1]):
+        queue.complete(task_id, {"id": task_id})
+    first = queue.results(job, limit=2)
+    assert [r["cursor"] for r in first] == [1, 2] and [r["seq"] for r in first] == [2, 0]
+    rest = queue.results(job, after=first[-1]["cursor"])
+    assert [r["cursor"] for r in rest] == [3, 4] and [r["seq"] for r in rest] == [3, 1]
+    assert queue.results(job, after=4) == []
+    assert queue.job(job)["status"] == "done"
@@ -0,0 +1,26 @@
+# tests/test_positions.py
+"""Position book: re-evaluating the open bar must start from the pre-bar state. Run with: python -m pytest -q tests"""
+from api.positions import PositionBook
+
+KEY = ("acct", "sma_crossover", "BTC-USDT-SWAP", "1h")
+K, N = 1_000, 5_000
+
+
+def test_reevaluated_bar_keeps_entry_time(tmp_path):
+    book = PositionBook(str(tmp_path / "positions.json"))
+    assert book.apply(KEY, K, "BUY") == "LONG"
+    assert book.apply(KEY, N, "CLOSE_LONG") is None
+    assert book.positions(open_only=False)[0]["entry_ts"] is None
+    assert book.apply(KEY, N, "HOLD") == "LONG"  # same bar, signal withdrawn
+    assert book.positions()[0]["entry_ts"] == K
+    assert book.apply(KEY, N, "SELL") == "SHORT"  # a real transition from the pre-bar position
+    assert book.positions()[0]["entry_ts"] == N
+
+    book.apply(KEY, N, "HOLD")
+    book.snapshot()
+    restored = PositionBook(book.snapshot_path)
+    assert restored.load() == 1
+    assert restored.position_for(KEY, N) == "LONG"
+    assert restored.apply(KEY, N, "CLOSE_LONG") is None
+    assert restored.apply(KEY, N, "HOLD") == "LONG"
+    assert restored.positions()[0]["entry_ts"] == K
@@ -0,0 +1,28 @@
+# tests/test_signal_tables.py
+"""A plugin's vectorized get_signal_table() must equal run_strategy() called on every bar and position."""
+import glob
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas_ta")
+
+from api.backtest import signal_table_by_bar
+from api.params import normalize_params
+from api.plugins import load_strategy_module
+
+STRATEGY_DIR = Path(__file__).resolve().parent.parent / "api" / "strategies"
+VECTORIZED = [m for m in (load_strategy_module(Path(f).stem, f) for f in sorted(glob.glob(str(STRATEGY_DIR / "*.py"))))
+              if m is not None and hasattr(m, "get_signal_table")]
+
+
+@pytest.mark.parametrize("module", VECTORIZED, ids=lambda m: m.__name__)
+def test_signal_table_matches_run_strategy(module, candles):
+    params = normalize_params(module, {})
+    df = module.calculate_strategy_indicators(candles.to_dataframe(dtype=np.float64), dict(params))
+    table = np.asarray(module.get_signal_table(df, params), dtype=np.int8)
+    expected = signal_table_by_bar(module, df, params)
+    assert table.shape == expected.shape
+    mismatch = np.argwhere(table != expected)
+    assert not len(mismatch), f"first mismatch at (bar, position) {tuple(mismatch[0])}"
@@ -0,0 +1,37 @@
+# tests/test_streaming_indicators.py
+"""
+Every column a plugin's get_streaming_indicators() produces must match what its own
+calculate_strategy_indicators() (pandas_ta) puts in the frame, whether the candles arrive
+at once or in chunks. Run with: python -m pytest -q tests
+"""
+import glob
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pandas_ta")
+
+from api.chunked import iter_indicator_chunks
+from api.params import normalize_params
+from api.plugins import load_strategy_module
+
+STRATEGY_DIR = Path(__file__).resolve().parent.parent / "api" / "strategies"
+STREAMING = [m for m in (load_strategy_module(Path(f).stem, f) for f in sorted(glob.glob(str(STRATEGY_DIR / "*.py"))))
+             if m is not None and hasattr(m, "get_streaming_indicators")]
+
+
+@pytest.mark.parametrize("chunk_bars", [100_000, 97, 5])
+@pytest.mark.parametrize("module", STREAMING, ids=lambda m: m.__name__)
+def test_streaming_matches_plugin(module, chunk_bars, candles):
+    params = normalize_params(module, {})
+    df = module.calculate_strategy_indicators(candles.to_dataframe(dtype=np.float64), dict(params))
+    indicators = module.get_streaming_indicators(params)
+    parts = {name: [] for name in indicators}
+    for _, _, cols in iter_indicator_chunks(candles, indicators, chunk_bars):
+        for name, values in cols.items(): parts[name].append(values)
+    for name, chunks in parts.items():
+        assert name in df.columns, f"{name} is not a column of calculate_strategy_indicators"
+        expected = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+        np.testing.assert_allclose(np.concatenate(chunks), expected, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=name)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Standalone job worker: runs batch job tasks (api/jobs.py) outside the uvicorn app.
+
+Every worker process loads the same strategy plugins as the API (main_api.load_strategies)
+and works on the shared job database. It claims tasks in batches, renews its leases with a
+heartbeat, and steals unstarted tasks from other workers once the queue runs dry. Start as
+many processes as there are cores, on this box or on others that share JOBS_DB (SQLite over a
+network filesystem isn't reliable). Run the API with JOB_WORKERS=0 to leave all the work here.
+
+    python worker.py                         # one process, 4 concurrent tasks
+    python worker.py --processes 4           # four worker processes
+    python worker.py --exit-idle 5           # stop after 5 s with nothing to do (batch runs, benchmarks)
+"""
+import os
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import multiprocessing
+
+from api.jobs import DEFAULT_JOBS_DB, JOB_LEASE_S, JobQueue, JobRunner
+
+
+async def run_worker(args, index: int = 0):
+    import main_api
+    if not main_api.DATA_LIBS_AVAILABLE: sys.exit("!!! Data libraries (pandas, pandas-ta, ccxt) are not installed.")
+    from api.market_data import fetch_ohlcv_df, close_exchanges
+    main_api.load_strategies()
+    queue = JobQueue(args.db, lease_s=args.lease_s)
+    runner = JobRunner(queue, dict(main_api._INTERNAL_STRATEGY_MODULES), fetch_ohlcv_df, args.concurrency,
+                       idle_s=args.idle_s, prefetch=args.prefetch, steal=not args.no_steal)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows
+            pass
+    runner.start()
+    print(f"--- Worker {index} ({runner.owner}): {len(runner.modules)} strategies, {args.concurrency} concurrent, "
+          f"prefetch {runner.prefetch}, queue {queue.db_path}")
+    t0 = time.time()
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            if args.exit_idle and runner.idle_since and time.time() - runner.idle_since >= args.exit_idle: break
+    finally:
+        await runner.stop()
+        queue.close()
+        await close_exchanges()
+    elapsed = time.time() - t0
+    print(f"--- Worker {index} done: {runner.completed} tasks ({runner.errors} errors, {runner.stolen} stolen) "
+          f"in {elapsed:.1f}s")
+    return runner.stats()
+
+
+def _process_main(args, index: int):
+    if sys.platform == 'win32': asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(run_worker(args, index))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch job worker (see api/jobs.py).")
+    parser.add_argument("--db", default=DEFAULT_JOBS_DB, help="Job database (JOBS_DB).")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("WORKER_PROCESSES", "1")))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", "4")),
+                        help="Tasks in flight per process (overlaps candle fetches; the computation holds the GIL).")
+    parser.add_argument("--prefetch", type=int, default=None, help="Tasks claimed per batch (default: --concurrency).")
+    parser.add_argument("--lease-s", type=float, default=JOB_LEASE_S)
+    parser.add_argument("--idle-s", type=float, default=0.5, help="Poll interval while the queue is empty.")
+    parser.add_argument("--exit-idle", type=float, default=0, help="Exit after this many idle seconds (0 = run forever).")
+    parser.add_argument("--no-steal", action="store_true", help="Don't take unstarted tasks leased to other workers.")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        asyncio.run(run_worker(args))
+        return
+    procs = [multiprocessing.Process(target=_process_main, args=(args, i), name=f"worker-{i}") for i in range(args.processes)]
+    for p in procs: p.start()
+    try:
+        for p in procs: p.join()
+    except KeyboardInterrupt:
+        print("--- Stopping workers ---")
+        for p in procs: p.terminate()
+        for p in procs: p.join()
+
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    main()